@@ -1 +1,2 @@
-from app.api.webhook import router as webhook_router 
\ No newline at end of file
+from app.api.webhook import router as webhook_router
+from app.api.monitoring import router as monitoring_router
\ No newline at end of file
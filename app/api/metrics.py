@@ -0,0 +1,65 @@
+from fastapi import APIRouter, Response
+
+from app.database.database import async_engine
+from app.services.event_scheduler import event_scheduler
+from app.services.outbox import outbox_sender
+from app.utils.metrics import metrics_registry
+
+router = APIRouter()
+
+def pool_status(name: str) -> float:
+    """
+    Read a figure of the async database connection pool.
+
+    Args:
+        name: Pool method, e.g. "checkedout", "size" or "overflow".
+
+    Returns:
+        float: The figure, or 0 for pools that do not keep connections (e.g. NullPool).
+    """
+    method = getattr(async_engine.pool, name, None)
+    return float(method()) if method else 0.0
+
+metrics_registry.gauge(
+    "makkaizou_line_events_in_flight",
+    "Mention events submitted to the scheduler and not finished",
+    function=lambda: event_scheduler.pending
+)
+metrics_registry.gauge(
+    "makkaizou_line_events_queued",
+    "Mention events waiting for their group or a free slot",
+    function=lambda: event_scheduler.queued
+)
+metrics_registry.gauge(
+    "makkaizou_line_outbox_sending",
+    "Outbox messages being sent",
+    function=lambda: outbox_sender.stats()["in_flight"]
+)
+metrics_registry.gauge(
+    "makkaizou_line_db_pool_size",
+    "Connections the database pool keeps open",
+    function=lambda: pool_status("size")
+)
+metrics_registry.gauge(
+    "makkaizou_line_db_pool_checked_out",
+    "Database connections in use",
+    function=lambda: pool_status("checkedout")
+)
+metrics_registry.gauge(
+    "makkaizou_line_db_pool_overflow",
+    "Database connections open beyond the pool size",
+    function=lambda: pool_status("overflow")
+)
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics endpoint.
+    
+    Returns:
+        Response: Metrics of all workers in the Prometheus text format.
+    """
+    return Response(
+        content=metrics_registry.render(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
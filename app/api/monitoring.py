@@ -0,0 +1,60 @@
+from fastapi import APIRouter
+
+from app.api.webhook import webhook_stats
+
+from app.services.admission import admission_controller, loop_lag_monitor
+from app.services.circuit_breaker import makkaizou_circuit_breaker
+from app.services.event_queue import event_queue
+from app.services.event_scheduler import event_scheduler
+from app.services.event_dedup import event_deduplicator
+from app.services.config_cache import config_cache
+from app.services.line_group_cache import line_group_cache
+from app.services.makkaizou_service import prompt_flights
+from app.services.message_service import mention_debouncer
+from app.services.line_service import delivery_stats
+from app.services.outbox import outbox_sender
+from app.services.rate_limiter import rate_limiter
+from app.services.http_client import makkaizou_http_client, line_http_client
+from app.services.response_cache import response_cache
+from app.services.retry import line_retry_policy, makkaizou_retry_policy, retry_budget
+from app.utils.log_sink import log_sink
+from app.utils.tracing import tracer
+from app.utils.webhook_capture import webhook_recorder
+
+router = APIRouter()
+
+@router.get("/stats")
+async def stats():
+    """
+    Runtime statistics endpoint.
+    
+    Returns:
+        dict: Statistics of the background components.
+    """
+    return {
+        "webhook": dict(webhook_stats),
+        "admission": admission_controller.stats(),
+        "event_loop": loop_lag_monitor.stats(),
+        "event_queue": event_queue.stats(),
+        "event_scheduler": event_scheduler.stats(),
+        "event_dedup": event_deduplicator.stats(),
+        "mention_debouncer": mention_debouncer.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "config_cache": config_cache.stats(),
+        "line_group_cache": line_group_cache.stats(),
+        "makkaizou_http_client": makkaizou_http_client.stats(),
+        "makkaizou_circuit_breaker": makkaizou_circuit_breaker.stats(),
+        "response_cache": response_cache.stats(),
+        "makkaizou_single_flight": prompt_flights.stats(),
+        "line_http_client": line_http_client.stats(),
+        "line_delivery": dict(delivery_stats),
+        "outbox": outbox_sender.stats(),
+        "retries": {
+            "makkaizou": makkaizou_retry_policy.stats(),
+            "line": line_retry_policy.stats(),
+            "budget": retry_budget.stats()
+        },
+        "log_sink": log_sink.stats(),
+        "tracing": tracer.stats(),
+        "webhook_capture": webhook_recorder.stats()
+    }
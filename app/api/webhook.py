@@ -1,21 +1,37 @@
 from fastapi import APIRouter, Depends, Request, Response, HTTPException, status, Header
-from sqlalchemy.orm import Session
-import json
-from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+import asyncio
+from functools import partial
+from typing import Any, Dict, Optional
 
-from app.database.database import get_db
+from app.config import settings
+from app.database.database import get_async_db
+from app.services.admission import admission_controller
 from app.services.message_service import MessageService
+from app.services.event_queue import event_queue, process_event
+from app.services.event_scheduler import event_scheduler, event_group_key
 from app.utils.auth import verify_line_signature
-from app.utils.validators import LineWebhookRequest
+from app.utils.validators import is_mention_event, may_mention_self, parse_webhook_request
 from app.utils.logging import log_error, get_exception_traceback, logger
+from app.utils.metrics import stage_duration
+from app.utils.tracing import tracer
+from app.utils.webhook_capture import webhook_recorder
 
 router = APIRouter()
 
+# Counters of the webhook fast path, reported by /stats
+webhook_stats: Dict[str, Any] = {
+    "requests": 0,
+    "skipped_requests": 0,
+    "events": 0,
+    "skipped_events": 0
+}
+
 @router.post("/webhook")
 async def line_webhook(
     request: Request,
-    x_line_signature: Optional[str] = Header(None, convert_underscores=False),
-    db: Session = Depends(get_db)
+    x_line_signature: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """
     Endpoint for LINE webhook events.
@@ -23,7 +39,7 @@ async def line_webhook(
     Args:
         request: FastAPI request object.
         x_line_signature: LINE signature header.
-        db: Database session.
+        db: Async database session.
         
     Returns:
         Response: FastAPI response object.
@@ -39,33 +55,70 @@ async def line_webhook(
     
     try:
         # Verify the signature for normal webhook events
-        if x_line_signature:
-            try:
+        try:
+            with stage_duration.time(stage="signature"), tracer.span("webhook.verify_signature"):
                 await verify_line_signature(body, x_line_signature)
-            except HTTPException as e:
-                # Log the error but continue processing
-                logger.error(f"Signature verification failed: {str(e)}")
-                # For LINE verification, we still want to return 200
-                if len(body) < 100:  # Likely a verification request
-                    return Response(status_code=status.HTTP_200_OK)
-                raise
+        except HTTPException as e:
+            # Log the error but continue processing
+            logger.error(f"Signature verification failed: {str(e)}")
+            # For LINE verification, we still want to return 200
+            if len(body) < 100:  # Likely a verification request
+                return Response(status_code=status.HTTP_200_OK)
+            raise
+        
+        webhook_stats["requests"] += 1
+        
+        # Keep a scrubbed copy of the traffic for replay in performance tests
+        if webhook_recorder.running:
+            webhook_recorder.record(body)
+        
+        # Ordinary chat cannot mention the bot, so skip parsing it altogether
+        if not may_mention_self(body):
+            webhook_stats["skipped_requests"] += 1
+            return Response(status_code=status.HTTP_200_OK)
         
         # Parse the request body
-        webhook_data = json.loads(body)
-        webhook_request = LineWebhookRequest(**webhook_data)
+        with stage_duration.time(stage="parse"), tracer.span("webhook.parse", body_bytes=len(body)):
+            webhook_request = parse_webhook_request(body, settings.WEBHOOK_JSON_BACKEND)
+        
+        # Drop events that would be ignored before building any services for them
+        events = [event for event in webhook_request.events if is_mention_event(event)]
+        webhook_stats["events"] += len(webhook_request.events)
+        webhook_stats["skipped_events"] += len(webhook_request.events) - len(events)
+        
+        # Under overload, answer mentions with a busy reply rather than let them wait
+        if settings.ADMISSION_CONTROL_ENABLED and events:
+            events, shed_events = admission_controller.admit(events)
+            if shed_events:
+                admission_controller.send_busy_replies(shed_events)
+        
+        # Process events in order per group and different groups in parallel
+        if event_scheduler.running:
+            
+            # In queue mode, acknowledge right away and let the scheduler process the events
+            if settings.WEBHOOK_PROCESSING_MODE == "queue" and event_queue.running:
+                events = [event for event in events if not event_queue.enqueue(event)]
+            
+            # Wait for the events that were not queued before responding
+            await asyncio.gather(*[
+                event_scheduler.submit(event_group_key(event), tracer.propagate(partial(process_event, event)))
+                for event in events
+            ])
+            
+            return Response(status_code=status.HTTP_200_OK)
         
         # Process each event
-        for event in webhook_request.events:
+        for event in events:
             try:
                 # Create a message service
-                message_service = MessageService(db)
+                message_service = await MessageService.create(db)
                 
                 # Process the event
                 await message_service.process_event(event)
             
             except Exception as e:
                 # Log the error but continue processing other events
-                log_error(
+                await log_error(
                     db,
                     "EventProcessingError",
                     str(e),
@@ -82,7 +135,7 @@ async def line_webhook(
     
     except Exception as e:
         # Log the error
-        log_error(
+        await log_error(
             db,
             "WebhookProcessingError",
             str(e),
@@ -19,15 +19,215 @@ class Settings(BaseModel):
     DB_PASSWORD: str = os.getenv("DB_PASSWORD", "postgres")
     DB_NAME: str = os.getenv("DB_NAME", "makkaizou_line")
     
+    # Database connection pool settings (PostgreSQL)
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "5"))
+    DB_MAX_OVERFLOW: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    DB_POOL_RECYCLE: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    DB_POOL_TIMEOUT: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    
+    # Log sink settings: MessageLog/ErrorLog rows are written in batches in the background
+    LOG_SINK_ENABLED: bool = os.getenv("LOG_SINK_ENABLED", "True").lower() == "true"
+    LOG_SINK_BATCH_SIZE: int = int(os.getenv("LOG_SINK_BATCH_SIZE", "100"))
+    LOG_SINK_FLUSH_INTERVAL_MS: int = int(os.getenv("LOG_SINK_FLUSH_INTERVAL_MS", "500"))
+    LOG_SINK_MAX_BUFFER: int = int(os.getenv("LOG_SINK_MAX_BUFFER", "10000"))
+    
+    # Cache of the active LineAccount and MakkaizouConfig rows
+    CONFIG_CACHE_TTL: float = float(os.getenv("CONFIG_CACHE_TTL", "300"))
+    CONFIG_CACHE_REFRESH_INTERVAL: float = float(os.getenv("CONFIG_CACHE_REFRESH_INTERVAL", "30"))
+    
+    # Maximum number of LINE groups whose talk_id is cached in memory
+    LINE_GROUP_CACHE_SIZE: int = int(os.getenv("LINE_GROUP_CACHE_SIZE", "10000"))
+    
+    # Webhook event deduplication settings
+    EVENT_DEDUP_ENABLED: bool = os.getenv("EVENT_DEDUP_ENABLED", "True").lower() == "true"
+    EVENT_DEDUP_TTL_SECONDS: float = float(os.getenv("EVENT_DEDUP_TTL_SECONDS", "86400"))
+    EVENT_DEDUP_MEMORY_SIZE: int = int(os.getenv("EVENT_DEDUP_MEMORY_SIZE", "10000"))
+    EVENT_DEDUP_PURGE_INTERVAL: float = float(os.getenv("EVENT_DEDUP_PURGE_INTERVAL", "3600"))
+    EVENT_DEDUP_CLAIM_TIMEOUT: float = float(os.getenv("EVENT_DEDUP_CLAIM_TIMEOUT", "120"))
+    
     # LINE settings
     LINE_CHANNEL_SECRET: str = os.getenv("LINE_CHANNEL_SECRET", "")
     LINE_CHANNEL_ACCESS_TOKEN: str = os.getenv("LINE_CHANNEL_ACCESS_TOKEN", "")
+    LINE_API_ENDPOINT: str = os.getenv("LINE_API_ENDPOINT", "https://api.line.me")
+    
+    # LINE HTTP client settings
+    LINE_HTTP2: bool = os.getenv("LINE_HTTP2", "False").lower() == "true"
+    LINE_MAX_CONNECTIONS: int = int(os.getenv("LINE_MAX_CONNECTIONS", "100"))
+    LINE_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("LINE_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    LINE_KEEPALIVE_EXPIRY: float = float(os.getenv("LINE_KEEPALIVE_EXPIRY", "30"))
+    LINE_CONNECT_TIMEOUT: float = float(os.getenv("LINE_CONNECT_TIMEOUT", "5"))
+    LINE_READ_TIMEOUT: float = float(os.getenv("LINE_READ_TIMEOUT", "5"))
+    LINE_WRITE_TIMEOUT: float = float(os.getenv("LINE_WRITE_TIMEOUT", "5"))
+    LINE_POOL_TIMEOUT: float = float(os.getenv("LINE_POOL_TIMEOUT", "5"))
     
     # Makkaizou settings
     MAKKAIZOU_API_KEY: str = os.getenv("MAKKAIZOU_API_KEY", "")
     MAKKAIZOU_API_URL: str = os.getenv("MAKKAIZOU_API_URL", "")
     MAKKAIZOU_LEARNING_MODEL_CODE: str = os.getenv("MAKKAIZOU_LEARNING_MODEL_CODE", "")
     
+    # Makkaizou HTTP client settings
+    MAKKAIZOU_HTTP2: bool = os.getenv("MAKKAIZOU_HTTP2", "False").lower() == "true"
+    MAKKAIZOU_MAX_CONNECTIONS: int = int(os.getenv("MAKKAIZOU_MAX_CONNECTIONS", "100"))
+    MAKKAIZOU_MAX_KEEPALIVE_CONNECTIONS: int = int(os.getenv("MAKKAIZOU_MAX_KEEPALIVE_CONNECTIONS", "20"))
+    MAKKAIZOU_KEEPALIVE_EXPIRY: float = float(os.getenv("MAKKAIZOU_KEEPALIVE_EXPIRY", "30"))
+    MAKKAIZOU_CONNECT_TIMEOUT: float = float(os.getenv("MAKKAIZOU_CONNECT_TIMEOUT", "5"))
+    MAKKAIZOU_READ_TIMEOUT: float = float(os.getenv("MAKKAIZOU_READ_TIMEOUT", "30"))
+    MAKKAIZOU_WRITE_TIMEOUT: float = float(os.getenv("MAKKAIZOU_WRITE_TIMEOUT", "10"))
+    MAKKAIZOU_POOL_TIMEOUT: float = float(os.getenv("MAKKAIZOU_POOL_TIMEOUT", "5"))
+    
+    # Retry settings shared by Makkaizou and LINE API calls. Retries are spread
+    # with full jitter and may make up at most RETRY_BUDGET_RATIO of all calls
+    # (plus RETRY_BUDGET_MIN_RETRIES) within RETRY_BUDGET_WINDOW seconds
+    MAKKAIZOU_MAX_ATTEMPTS: int = int(os.getenv("MAKKAIZOU_MAX_ATTEMPTS", "2"))
+    LINE_MAX_ATTEMPTS: int = int(os.getenv("LINE_MAX_ATTEMPTS", "3"))
+    RETRY_BASE_DELAY: float = float(os.getenv("RETRY_BASE_DELAY", "0.2"))
+    RETRY_MAX_DELAY: float = float(os.getenv("RETRY_MAX_DELAY", "2"))
+    RETRY_BUDGET_RATIO: float = float(os.getenv("RETRY_BUDGET_RATIO", "0.1"))
+    RETRY_BUDGET_MIN_RETRIES: int = int(os.getenv("RETRY_BUDGET_MIN_RETRIES", "10"))
+    RETRY_BUDGET_WINDOW: float = float(os.getenv("RETRY_BUDGET_WINDOW", "10"))
+    
+    # Seconds after the event during which LINE accepts its reply token
+    LINE_REPLY_TOKEN_TTL: float = float(os.getenv("LINE_REPLY_TOKEN_TTL", "60"))
+    # Answers whose reply token has less than LINE_REPLY_TOKEN_MARGIN seconds
+    # left, or was rejected, are sent as push messages to the group instead
+    LINE_PUSH_FALLBACK_ENABLED: bool = os.getenv("LINE_PUSH_FALLBACK_ENABLED", "True").lower() == "true"
+    LINE_REPLY_TOKEN_MARGIN: float = float(os.getenv("LINE_REPLY_TOKEN_MARGIN", "5"))
+    
+    # Outbox settings. Answers are written to the outbox table and sent by a
+    # background sender, at most OUTBOX_RATE_LIMIT messages per second per
+    # LINE account
+    OUTBOX_ENABLED: bool = os.getenv("OUTBOX_ENABLED", "True").lower() == "true"
+    OUTBOX_BATCH_SIZE: int = int(os.getenv("OUTBOX_BATCH_SIZE", "50"))
+    OUTBOX_MAX_CONCURRENCY: int = int(os.getenv("OUTBOX_MAX_CONCURRENCY", "10"))
+    OUTBOX_RATE_LIMIT: float = float(os.getenv("OUTBOX_RATE_LIMIT", "50"))
+    OUTBOX_RATE_BURST: int = int(os.getenv("OUTBOX_RATE_BURST", "50"))
+    OUTBOX_POLL_INTERVAL: float = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+    OUTBOX_LEASE_SECONDS: float = float(os.getenv("OUTBOX_LEASE_SECONDS", "60"))
+    OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+    OUTBOX_RETRY_DELAY: float = float(os.getenv("OUTBOX_RETRY_DELAY", "2"))
+    OUTBOX_RETENTION_SECONDS: float = float(os.getenv("OUTBOX_RETENTION_SECONDS", "604800"))
+    OUTBOX_DRAIN_TIMEOUT: float = float(os.getenv("OUTBOX_DRAIN_TIMEOUT", "10"))
+    
+    # Cache of Makkaizou responses to repeated prompts, per group ("group")
+    # or shared by all groups ("global")
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "False").lower() == "true"
+    RESPONSE_CACHE_TTL: float = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+    RESPONSE_CACHE_SIZE: int = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+    RESPONSE_CACHE_SCOPE: str = os.getenv("RESPONSE_CACHE_SCOPE", "group")
+    
+    # Mention debounce settings. Mentions of the same user in a group within
+    # MENTION_DEBOUNCE_SECONDS of the first one are merged into one prompt and
+    # answered once; a batch is answered early once it holds
+    # MENTION_DEBOUNCE_MAX_MESSAGES mentions
+    MENTION_DEBOUNCE_ENABLED: bool = os.getenv("MENTION_DEBOUNCE_ENABLED", "False").lower() == "true"
+    MENTION_DEBOUNCE_SECONDS: float = float(os.getenv("MENTION_DEBOUNCE_SECONDS", "2"))
+    MENTION_DEBOUNCE_MAX_MESSAGES: int = int(os.getenv("MENTION_DEBOUNCE_MAX_MESSAGES", "5"))
+    
+    # Rate limit settings. Mentions are answered by Makkaizou only while the
+    # user, the group and the Makkaizou configuration all have tokens left;
+    # otherwise RATE_LIMIT_THROTTLED_MESSAGE is sent (nothing if empty). A rate
+    # of 0 disables the limit of that scope. The "memory" backend limits each
+    # worker on its own, the "database" backend shares the limits between workers
+    RATE_LIMIT_ENABLED: bool = os.getenv("RATE_LIMIT_ENABLED", "False").lower() == "true"
+    RATE_LIMIT_BACKEND: str = os.getenv("RATE_LIMIT_BACKEND", "memory")
+    RATE_LIMIT_USER_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_USER_PER_MINUTE", "10"))
+    RATE_LIMIT_USER_BURST: int = int(os.getenv("RATE_LIMIT_USER_BURST", "5"))
+    RATE_LIMIT_GROUP_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_GROUP_PER_MINUTE", "30"))
+    RATE_LIMIT_GROUP_BURST: int = int(os.getenv("RATE_LIMIT_GROUP_BURST", "10"))
+    RATE_LIMIT_CONFIG_PER_MINUTE: float = float(os.getenv("RATE_LIMIT_CONFIG_PER_MINUTE", "300"))
+    RATE_LIMIT_CONFIG_BURST: int = int(os.getenv("RATE_LIMIT_CONFIG_BURST", "50"))
+    RATE_LIMIT_MAX_KEYS: int = int(os.getenv("RATE_LIMIT_MAX_KEYS", "10000"))
+    RATE_LIMIT_THROTTLED_MESSAGE: str = os.getenv(
+        "RATE_LIMIT_THROTTLED_MESSAGE",
+        "You're sending questions faster than I can answer them. Please wait a moment and try again."
+    )
+    
+    # Identical prompts of a group in flight at the same time share one
+    # Makkaizou request; a positive SINGLE_FLIGHT_GRACE_SECONDS also shares
+    # successful answers for that long after the request finished
+    SINGLE_FLIGHT_ENABLED: bool = os.getenv("SINGLE_FLIGHT_ENABLED", "True").lower() == "true"
+    SINGLE_FLIGHT_GRACE_SECONDS: float = float(os.getenv("SINGLE_FLIGHT_GRACE_SECONDS", "0"))
+    
+    # Makkaizou circuit breaker settings
+    MAKKAIZOU_BREAKER_ENABLED: bool = os.getenv("MAKKAIZOU_BREAKER_ENABLED", "True").lower() == "true"
+    MAKKAIZOU_BREAKER_FAILURE_THRESHOLD: int = int(os.getenv("MAKKAIZOU_BREAKER_FAILURE_THRESHOLD", "5"))
+    MAKKAIZOU_BREAKER_RECOVERY_TIMEOUT: float = float(os.getenv("MAKKAIZOU_BREAKER_RECOVERY_TIMEOUT", "30"))
+    MAKKAIZOU_BREAKER_HALF_OPEN_MAX_CALLS: int = int(os.getenv("MAKKAIZOU_BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+    # The read timeout adapts to the p99 of recent Makkaizou calls, capped by MAKKAIZOU_READ_TIMEOUT
+    MAKKAIZOU_TIMEOUT_WINDOW_SIZE: int = int(os.getenv("MAKKAIZOU_TIMEOUT_WINDOW_SIZE", "200"))
+    MAKKAIZOU_TIMEOUT_MIN_SAMPLES: int = int(os.getenv("MAKKAIZOU_TIMEOUT_MIN_SAMPLES", "20"))
+    MAKKAIZOU_TIMEOUT_MULTIPLIER: float = float(os.getenv("MAKKAIZOU_TIMEOUT_MULTIPLIER", "2"))
+    MAKKAIZOU_TIMEOUT_MIN: float = float(os.getenv("MAKKAIZOU_TIMEOUT_MIN", "5"))
+    
+    # Webhook processing settings
+    # "inline" processes events before responding, "queue" acknowledges first
+    # and processes events in background workers
+    WEBHOOK_PROCESSING_MODE: str = os.getenv("WEBHOOK_PROCESSING_MODE", "inline")
+    # JSON backend for webhook bodies: "orjson" (in requirements.txt; falls back
+    # to "json" when it is not installed), "json" or "pydantic"
+    WEBHOOK_JSON_BACKEND: str = os.getenv("WEBHOOK_JSON_BACKEND", "orjson")
+    # Events of one group are processed in order, different groups in parallel
+    EVENT_MAX_CONCURRENT_GROUPS: int = int(os.getenv("EVENT_MAX_CONCURRENT_GROUPS", "8"))
+    EVENT_QUEUE_MAX_SIZE: int = int(os.getenv("EVENT_QUEUE_MAX_SIZE", "1000"))
+    EVENT_QUEUE_DRAIN_TIMEOUT: float = float(os.getenv("EVENT_QUEUE_DRAIN_TIMEOUT", "30"))
+    
+    # Admission control. Mentions arriving while ADMISSION_MAX_IN_FLIGHT events
+    # are being processed, ADMISSION_MAX_QUEUE_DEPTH events are waiting, or the
+    # event loop lags ADMISSION_MAX_LOOP_LAG_MS behind get ADMISSION_BUSY_MESSAGE
+    # right away instead of an answer. 0 disables a check
+    ADMISSION_CONTROL_ENABLED: bool = os.getenv("ADMISSION_CONTROL_ENABLED", "True").lower() == "true"
+    ADMISSION_MAX_IN_FLIGHT: int = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "500"))
+    ADMISSION_MAX_QUEUE_DEPTH: int = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "300"))
+    ADMISSION_MAX_LOOP_LAG_MS: int = int(os.getenv("ADMISSION_MAX_LOOP_LAG_MS", "1000"))
+    ADMISSION_BUSY_MESSAGE: str = os.getenv(
+        "ADMISSION_BUSY_MESSAGE",
+        "I'm receiving a lot of questions right now. Please ask me again in a few minutes."
+    )
+    # Seconds between two measurements of the event loop lag
+    LOOP_LAG_INTERVAL: float = float(os.getenv("LOOP_LAG_INTERVAL", "0.5"))
+    
+    # Event loop monitor settings. The lag is also measured without admission
+    # control, and the stack of code blocking the loop longer than
+    # LOOP_BLOCK_THRESHOLD_MS is sampled by a watchdog thread. Percentiles are
+    # taken over the last LOOP_LAG_HISTORY measurements. LOOP_DEBUG_ENABLED
+    # runs the loop in asyncio debug mode, which logs slow callbacks but slows
+    # the loop down
+    LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "False").lower() == "true"
+    LOOP_BLOCK_THRESHOLD_MS: int = int(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+    LOOP_STACK_SAMPLES: int = int(os.getenv("LOOP_STACK_SAMPLES", "20"))
+    LOOP_LAG_HISTORY: int = int(os.getenv("LOOP_LAG_HISTORY", "1200"))
+    LOOP_DEBUG_ENABLED: bool = os.getenv("LOOP_DEBUG_ENABLED", "False").lower() == "true"
+    
+    # Metrics settings. With several uvicorn workers, set METRICS_MULTIPROC_DIR
+    # to a directory shared by the workers (emptied before they start), so that
+    # /metrics on any worker reports the totals of all of them
+    METRICS_MULTIPROC_DIR: str = os.getenv("METRICS_MULTIPROC_DIR", "")
+    METRICS_WRITE_INTERVAL: float = float(os.getenv("METRICS_WRITE_INTERVAL", "5"))
+    
+    # Tracing settings. TRACING_SAMPLE_RATE of the traces are exported, either
+    # over OTLP/HTTP to the collector at TRACING_OTLP_ENDPOINT ("otlp") or
+    # appended to TRACING_FILE_PATH as JSON lines ("file")
+    TRACING_ENABLED: bool = os.getenv("TRACING_ENABLED", "False").lower() == "true"
+    TRACING_SAMPLE_RATE: float = float(os.getenv("TRACING_SAMPLE_RATE", "0.1"))
+    TRACING_EXPORTER: str = os.getenv("TRACING_EXPORTER", "otlp")
+    TRACING_OTLP_ENDPOINT: str = os.getenv("TRACING_OTLP_ENDPOINT", "http://localhost:4318")
+    TRACING_FILE_PATH: str = os.getenv("TRACING_FILE_PATH", "traces.jsonl")
+    TRACING_SERVICE_NAME: str = os.getenv("TRACING_SERVICE_NAME", "makkaizou-line")
+    TRACING_BATCH_SIZE: int = int(os.getenv("TRACING_BATCH_SIZE", "512"))
+    TRACING_EXPORT_INTERVAL: float = float(os.getenv("TRACING_EXPORT_INTERVAL", "5"))
+    TRACING_MAX_QUEUE: int = int(os.getenv("TRACING_MAX_QUEUE", "10000"))
+    
+    # Webhook capture settings. Webhook bodies with a valid signature are
+    # appended to WEBHOOK_CAPTURE_PATH with user content scrubbed, for replay
+    # by benchmarks.replay_webhooks. IDs are pseudonymized with
+    # WEBHOOK_CAPTURE_SALT (random per process if empty), so repeated users,
+    # groups and messages stay recognizable without being identifiable
+    WEBHOOK_CAPTURE_ENABLED: bool = os.getenv("WEBHOOK_CAPTURE_ENABLED", "False").lower() == "true"
+    WEBHOOK_CAPTURE_PATH: str = os.getenv("WEBHOOK_CAPTURE_PATH", "webhook_capture.jsonl.gz")
+    WEBHOOK_CAPTURE_SAMPLE_RATE: float = float(os.getenv("WEBHOOK_CAPTURE_SAMPLE_RATE", "1.0"))
+    WEBHOOK_CAPTURE_SALT: str = os.getenv("WEBHOOK_CAPTURE_SALT", "")
+    WEBHOOK_CAPTURE_MAX_BUFFER: int = int(os.getenv("WEBHOOK_CAPTURE_MAX_BUFFER", "10000"))
+    
     class Config:
         extra = "ignore"
 
@@ -1,5 +1,5 @@
-from app.database.database import Base, engine, get_db
-from app.database.models import LineAccount, MakkaizouConfig, LineAccountMakkaizouMapping, LineGroup, MessageLog, ErrorLog
+from app.database.database import Base, engine, get_db, async_engine, AsyncSessionLocal, get_async_db
+from app.database.models import LineAccount, MakkaizouConfig, LineAccountMakkaizouMapping, LineGroup, MessageLog, ErrorLog, ProcessedEvent, OutboxMessage, RateLimitBucket
 
 # Create all tables in the database
 def init_db():
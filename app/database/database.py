@@ -1,15 +1,92 @@
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from app.config import settings
 
-# Create SQLAlchemy engine
+# Async drivers for the synchronous database URL schemes
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def get_async_database_url(database_url: str) -> str:
+    """
+    Get the async driver equivalent of a database URL.
+
+    Args:
+        database_url: Database URL, e.g. `postgresql://...` or `sqlite:///...`.
+
+    Returns:
+        str: Database URL using asyncpg or aiosqlite. URLs that already name
+            another driver are returned unchanged.
+    """
+    scheme, separator, rest = database_url.partition("://")
+    return f"{ASYNC_DRIVERS.get(scheme, scheme)}{separator}{rest}"
+
+def get_async_engine_options(database_url: str) -> dict:
+    """
+    Get the connection pool options for the async engine.
+
+    Args:
+        database_url: Database URL.
+
+    Returns:
+        dict: Keyword arguments for `create_async_engine`.
+    """
+    # SQLite uses SQLAlchemy's default pool, which ignores these options
+    if database_url.startswith("sqlite"):
+        return {}
+
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_pre_ping": True,
+    }
+
+def dialect_insert(db: AsyncSession, model):
+    """
+    Create an INSERT statement for the session's database that supports ON CONFLICT.
+
+    Args:
+        db: Async database session.
+        model: Model to insert into.
+
+    Returns:
+        Insert: PostgreSQL or SQLite INSERT statement.
+
+    Raises:
+        ValueError: If the database is neither PostgreSQL nor SQLite.
+    """
+    dialect_name = db.bind.dialect.name
+    if dialect_name == "postgresql":
+        return postgresql.insert(model)
+    if dialect_name == "sqlite":
+        return sqlite.insert(model)
+
+    raise ValueError(f"ON CONFLICT is not supported for {dialect_name}")
+
+# Create SQLAlchemy engine, used to create the tables and by command-line tools
 engine = create_engine(settings.DATABASE_URL)
 
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create async SQLAlchemy engine, used while serving requests
+async_engine = create_async_engine(
+    get_async_database_url(settings.DATABASE_URL),
+    **get_async_engine_options(settings.DATABASE_URL)
+)
+
+# Create async session factory
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Create base class for models
 Base = declarative_base()
 
@@ -17,7 +94,7 @@ Base = declarative_base()
 def get_db():
     """
     Dependency function to get a database session.
-    
+
     Yields:
         Session: A SQLAlchemy session.
     """
@@ -25,4 +102,15 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
+
+# Dependency to get async DB session
+async def get_async_db():
+    """
+    Dependency function to get an async database session.
+
+    Yields:
+        AsyncSession: A SQLAlchemy async session.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text, JSON
+from sqlalchemy import Boolean, Column, DateTime, Float, ForeignKey, Integer, String, Text, JSON
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -87,6 +87,10 @@ class MessageLog(Base):
     makkaizou_response = Column(JSON)
     line_response_status = Column(String(50))
     processing_time_ms = Column(Integer)
+    cache_hit = Column(Boolean, default=False)
+    latency_saved_ms = Column(Integer)
+    coalesced = Column(Boolean, default=False)
+    trace_id = Column(String(32), index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
     # Relationships
@@ -103,4 +107,45 @@ class ErrorLog(Base):
     stack_trace = Column(Text)
     request_data = Column(JSON)
     line_group_id = Column(String(100))
-    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
\ No newline at end of file
+    trace_id = Column(String(32), index=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now()) 
+
+class ProcessedEvent(Base):
+    """Model for webhook events that have already been processed, used to skip redeliveries."""
+    
+    __tablename__ = "processed_events"
+    
+    webhook_event_id = Column(String(100), primary_key=True)
+    line_group_id = Column(String(100))
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+    completed_at = Column(DateTime(timezone=True))
+
+class OutboxMessage(Base):
+    """Model for outgoing LINE messages, sent by the outbox sender."""
+    
+    __tablename__ = "outbox_messages"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    line_account_id = Column(Integer, ForeignKey("line_accounts.id"))
+    line_group_id = Column(String(100), nullable=False)
+    reply_token = Column(String(100))
+    reply_expires_at = Column(DateTime(timezone=True))
+    message = Column(Text, nullable=False)
+    retry_key = Column(String(36), nullable=False)
+    status = Column(String(20), nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime(timezone=True), nullable=False, index=True)
+    delivery_method = Column(String(10))
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    sent_at = Column(DateTime(timezone=True))
+
+class RateLimitBucket(Base):
+    """Model for token buckets shared by all workers, used by the database rate limiter."""
+    
+    __tablename__ = "rate_limit_buckets"
+    
+    key = Column(String(200), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    # Unix time of the last update, compared with the clock of the workers
+    updated_at = Column(Float, nullable=False, index=True)
@@ -1,15 +1,78 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 import time
 
 from app.config import settings
-from app.database import init_db
+from app.database import init_db, async_engine
 from app.api.webhook import router as webhook_router
+from app.api.monitoring import router as monitoring_router
+from app.api.metrics import router as metrics_router
+from app.services.event_queue import event_queue
+from app.services.event_scheduler import event_scheduler
+from app.services.admission import admission_controller, loop_lag_monitor
+from app.services.config_cache import config_cache
+from app.services.http_client import makkaizou_http_client, line_http_client
+from app.services.message_service import mention_debouncer
+from app.services.outbox import outbox_sender
 from app.utils.logging import logger
+from app.utils.log_sink import log_sink
+from app.utils.metrics import http_request_duration, http_requests_in_flight, metrics_registry
+from app.utils.tracing import SPAN_KIND_SERVER, tracer
+from app.utils.webhook_capture import webhook_recorder
 
 # Initialize the database
 init_db()
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start and stop the background components of the application.
+    
+    Args:
+        app: FastAPI application.
+    """
+    if settings.LOG_SINK_ENABLED:
+        await log_sink.start()
+    await metrics_registry.start()
+    await tracer.start()
+    if settings.WEBHOOK_CAPTURE_ENABLED:
+        await webhook_recorder.start()
+    await config_cache.start()
+    await makkaizou_http_client.start()
+    await line_http_client.start()
+    if settings.OUTBOX_ENABLED:
+        await outbox_sender.start()
+    await event_scheduler.start()
+    if settings.ADMISSION_CONTROL_ENABLED or settings.LOOP_MONITOR_ENABLED:
+        await loop_lag_monitor.start()
+    if settings.MENTION_DEBOUNCE_ENABLED:
+        await mention_debouncer.start()
+    if settings.WEBHOOK_PROCESSING_MODE == "queue":
+        event_queue.start()
+    
+    yield
+    
+    # Stop accepting events and drain the pending ones before the process exits
+    event_queue.stop()
+    await mention_debouncer.stop(timeout=settings.EVENT_QUEUE_DRAIN_TIMEOUT)
+    await event_scheduler.stop(timeout=settings.EVENT_QUEUE_DRAIN_TIMEOUT)
+    await loop_lag_monitor.stop()
+    await admission_controller.stop(timeout=settings.EVENT_QUEUE_DRAIN_TIMEOUT)
+    
+    # Send the answers of the drained events
+    await outbox_sender.stop(timeout=settings.OUTBOX_DRAIN_TIMEOUT)
+    await makkaizou_http_client.stop()
+    await line_http_client.stop()
+    await config_cache.stop()
+    
+    # Write the buffered logs of the drained events
+    await log_sink.stop()
+    await metrics_registry.stop()
+    await tracer.stop()
+    await webhook_recorder.stop()
+    await async_engine.dispose()
+
 # Create the FastAPI application
 app = FastAPI(
     title="Makkaizou-LINE Integration",
@@ -17,6 +80,7 @@ app = FastAPI(
     version="0.1.0",
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
+    lifespan=lifespan,
 )
 
 # Add CORS middleware
@@ -42,23 +106,45 @@ async def log_requests(request: Request, call_next):
         Response: FastAPI response object.
     """
     start_time = time.time()
+    stalls = loop_lag_monitor.stalls
     
     # Log the request
     logger.info(f"Request: {request.method} {request.url.path}")
     
-    # Process the request
-    response = await call_next(request)
+    # Process the request as the root span of its trace
+    http_requests_in_flight.inc()
+    try:
+        with tracer.span(f"{request.method} {request.url.path}", kind=SPAN_KIND_SERVER) as span:
+            response = await call_next(request)
+            span.set_attribute("http.status_code", response.status_code)
+    finally:
+        http_requests_in_flight.dec()
     
     # Calculate processing time
     process_time = time.time() - start_time
     
+    # Label by route template so that unknown paths do not create new series
+    route = request.scope.get("route")
+    http_request_duration.observe(
+        process_time,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=response.status_code
+    )
+    
     # Log the response
     logger.info(f"Response: {response.status_code} ({process_time:.4f}s)")
     
+    # Blocked event loop time counts against every request in flight
+    if loop_lag_monitor.stalls != stalls:
+        logger.warning(f"Event loop was blocked during {request.method} {request.url.path}, see event_loop in /stats")
+    
     return response
 
 # Include routers
 app.include_router(webhook_router, tags=["webhook"])
+app.include_router(monitoring_router, tags=["monitoring"])
+app.include_router(metrics_router, tags=["monitoring"])
 
 # Root endpoint
 @app.get("/")
@@ -0,0 +1,229 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.services.event_scheduler import GroupScheduler, event_scheduler
+from app.services.line_service import LineService
+from app.utils.loop_lag import LoopLagMonitor
+from app.utils.validators import LineWebhookEvent
+from app.utils.logging import logger
+from app.utils.metrics import events_total
+from app.utils.tracing import tracer
+
+IN_FLIGHT = "in_flight"
+QUEUE_DEPTH = "queue_depth"
+LOOP_LAG = "loop_lag"
+
+class AdmissionController:
+    """
+    Decides whether the webhook takes on more mentions.
+
+    A mention is shed when taking it on would put more than `max_in_flight`
+    events in processing, when more than `max_queue_depth` events are already
+    waiting for their group or a free slot, or when the event loop lags more
+    than `max_loop_lag` seconds. Shed mentions get a short busy reply instead of
+    waiting behind work that cannot be finished in time, sent in the
+    background so the webhook is acknowledged without waiting for LINE.
+    Events that do not mention the bot are dropped before admission, so they
+    are never queued.
+    """
+
+    def __init__(
+        self,
+        scheduler: GroupScheduler,
+        lag_monitor: LoopLagMonitor,
+        max_in_flight: int,
+        max_queue_depth: int,
+        max_loop_lag: float,
+        session_factory: async_sessionmaker = AsyncSessionLocal
+    ):
+        """
+        Initialize the admission controller.
+
+        Args:
+            scheduler: Scheduler processing the admitted events.
+            lag_monitor: Monitor of the event loop lag.
+            max_in_flight: Maximum number of events in processing; 0 disables the check.
+            max_queue_depth: Maximum number of events waiting to be processed; 0 disables the check.
+            max_loop_lag: Maximum event loop lag in seconds; 0 disables the check.
+            session_factory: Factory for the sessions of the busy replies.
+        """
+        self.scheduler = scheduler
+        self.lag_monitor = lag_monitor
+        self.max_in_flight = max_in_flight
+        self.max_queue_depth = max_queue_depth
+        self.max_loop_lag = max_loop_lag
+        self.session_factory = session_factory
+
+        self._admitted = 0
+        self._shed = {IN_FLIGHT: 0, QUEUE_DEPTH: 0, LOOP_LAG: 0}
+        self._busy_replies = 0
+        self._busy_reply_failures = 0
+        self._busy_reply_tasks: Set[asyncio.Task] = set()
+
+    def overload(self, admitted: int = 0) -> Optional[str]:
+        """
+        Check whether the application is overloaded.
+
+        Args:
+            admitted: Events admitted but not handed to the scheduler yet.
+
+        Returns:
+            Optional[str]: The exceeded limit, or None if more work may be taken on.
+        """
+        if self.max_in_flight and self.scheduler.pending + admitted >= self.max_in_flight:
+            return IN_FLIGHT
+
+        if self.max_queue_depth and self.scheduler.queued >= self.max_queue_depth:
+            return QUEUE_DEPTH
+
+        if self.max_loop_lag and self.lag_monitor.running and self.lag_monitor.lag >= self.max_loop_lag:
+            return LOOP_LAG
+
+        return None
+
+    def admit(self, events: List[LineWebhookEvent]) -> Tuple[List[LineWebhookEvent], List[LineWebhookEvent]]:
+        """
+        Split mention events into those to process and those to shed.
+
+        Args:
+            events: Mention events of a webhook request.
+
+        Returns:
+            Tuple[List[LineWebhookEvent], List[LineWebhookEvent]]: Admitted and shed events.
+        """
+        admitted: List[LineWebhookEvent] = []
+        shed: List[LineWebhookEvent] = []
+
+        for event in events:
+            reason = self.overload(len(admitted))
+
+            if reason is None:
+                admitted.append(event)
+            else:
+                self._shed[reason] += 1
+                shed.append(event)
+
+        self._admitted += len(admitted)
+
+        if shed:
+            events_total.inc(len(shed), outcome="shed")
+            logger.warning(f"Overloaded, shedding {len(shed)} of {len(events)} mentions")
+
+        return admitted, shed
+
+    def send_busy_replies(self, events: List[LineWebhookEvent]) -> None:
+        """
+        Start replying to shed mentions with the busy message in the background.
+
+        Args:
+            events: Shed mention events.
+        """
+        if not settings.ADMISSION_BUSY_MESSAGE or not any(event.replyToken for event in events):
+            return
+
+        task = asyncio.create_task(self._send_busy_replies(events))
+        self._busy_reply_tasks.add(task)
+        task.add_done_callback(self._busy_reply_tasks.discard)
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Wait for the busy replies being sent.
+
+        Args:
+            timeout: Seconds to wait; replies still being sent are cancelled afterwards.
+        """
+        if not self._busy_reply_tasks:
+            return
+
+        _, pending = await asyncio.wait(set(self._busy_reply_tasks), timeout=timeout)
+        for task in pending:
+            task.cancel()
+
+    async def _send_busy_replies(self, events: List[LineWebhookEvent]) -> None:
+        """
+        Reply to shed mentions with the busy message, using a session of its own.
+
+        Args:
+            events: Shed mention events.
+        """
+        async with self.session_factory() as db:
+            await self.reply_busy(db, events)
+
+    async def reply_busy(self, db: AsyncSession, events: List[LineWebhookEvent]) -> None:
+        """
+        Reply to shed mentions with the busy message.
+
+        Args:
+            db: Async database session.
+            events: Shed mention events.
+        """
+        events = [event for event in events if event.replyToken]
+        if not settings.ADMISSION_BUSY_MESSAGE or not events:
+            return
+
+        try:
+            with tracer.span("admission.reply_busy", events=len(events)):
+                line_service = await LineService.create(db)
+                results = await asyncio.gather(*[
+                    line_service.send_reply(
+                        event.replyToken,
+                        settings.ADMISSION_BUSY_MESSAGE,
+                        deadline=event.timestamp / 1000 + settings.LINE_REPLY_TOKEN_TTL
+                    )
+                    for event in events
+                ])
+
+        except Exception as e:
+            self._busy_reply_failures += len(events)
+            logger.error(f"Could not send busy replies: {str(e)}")
+            return
+
+        sent = sum(1 for result in results if result["status"] == "success")
+        self._busy_replies += sent
+        self._busy_reply_failures += len(results) - sent
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get admission statistics.
+
+        Returns:
+            Dict[str, Any]: Admission statistics.
+        """
+        return {
+            "admitted": self._admitted,
+            "shed": sum(self._shed.values()),
+            "shed_by_reason": dict(self._shed),
+            "busy_replies": self._busy_replies,
+            "busy_reply_failures": self._busy_reply_failures,
+            "busy_replies_in_flight": len(self._busy_reply_tasks),
+            "in_flight": self.scheduler.pending,
+            "queue_depth": self.scheduler.queued,
+            "loop_lag_ms": round(self.lag_monitor.lag * 1000, 1),
+            "limits": {
+                "max_in_flight": self.max_in_flight,
+                "max_queue_depth": self.max_queue_depth,
+                "max_loop_lag_ms": int(self.max_loop_lag * 1000)
+            }
+        }
+
+# Application-wide event loop lag monitor, started in the FastAPI lifespan
+loop_lag_monitor = LoopLagMonitor(
+    interval=settings.LOOP_LAG_INTERVAL,
+    history=settings.LOOP_LAG_HISTORY,
+    block_threshold=settings.LOOP_BLOCK_THRESHOLD_MS / 1000 if settings.LOOP_MONITOR_ENABLED else 0.0,
+    max_stack_samples=settings.LOOP_STACK_SAMPLES,
+    debug=settings.LOOP_MONITOR_ENABLED and settings.LOOP_DEBUG_ENABLED
+)
+
+# Application-wide admission controller, used when ADMISSION_CONTROL_ENABLED is set
+admission_controller = AdmissionController(
+    scheduler=event_scheduler,
+    lag_monitor=loop_lag_monitor,
+    max_in_flight=settings.ADMISSION_MAX_IN_FLIGHT,
+    max_queue_depth=settings.ADMISSION_MAX_QUEUE_DEPTH,
+    max_loop_lag=settings.ADMISSION_MAX_LOOP_LAG_MS / 1000
+)
@@ -0,0 +1,216 @@
+import math
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.utils.logging import logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open."""
+
+class CircuitBreaker:
+    """
+    Circuit breaker with a latency-derived timeout for a remote API.
+
+    The circuit opens after `failure_threshold` consecutive failures. While it
+    is open, calls are rejected right away. After `recovery_timeout` seconds it
+    becomes half-open and lets up to `half_open_max_calls` trial calls through:
+    a successful trial closes the circuit, a failed one opens it again.
+
+    The read timeout of each call is `timeout_multiplier` times the p99 of
+    the last `window_size` call durations, kept between `min_timeout` and
+    `max_timeout`. Until `min_samples` calls have been observed, `max_timeout`
+    is used.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        recovery_timeout: float,
+        half_open_max_calls: int,
+        window_size: int,
+        min_samples: int,
+        timeout_multiplier: float,
+        min_timeout: float,
+        max_timeout: float
+    ):
+        """
+        Initialize the circuit breaker.
+
+        Args:
+            name: Name used in logs and statistics.
+            failure_threshold: Consecutive failures that open the circuit.
+            recovery_timeout: Seconds the circuit stays open before a trial call.
+            half_open_max_calls: Maximum number of concurrent trial calls.
+            window_size: Number of recent call durations the timeout is derived from.
+            min_samples: Call durations needed before the timeout adapts.
+            timeout_multiplier: Factor applied to the p99 duration.
+            min_timeout: Lower bound of the timeout in seconds.
+            max_timeout: Upper bound of the timeout in seconds.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.min_samples = min_samples
+        self.timeout_multiplier = timeout_multiplier
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._half_open_calls = 0
+        self._durations: deque = deque(maxlen=window_size)
+        self._trips = 0
+        self._rejected = 0
+        self._successes = 0
+        self._failures = 0
+
+    @property
+    def state(self) -> str:
+        """Current state, moving from open to half-open once the recovery timeout has passed."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._half_open_calls = 0
+            logger.info(f"{self.name} circuit is half-open")
+
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        Check that a call may be made.
+
+        Every allowed call must be followed by `record_success` or `record_failure`.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with all trial calls in flight.
+        """
+        state = self.state
+
+        if state == OPEN or (state == HALF_OPEN and self._half_open_calls >= self.half_open_max_calls):
+            self._rejected += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        if state == HALF_OPEN:
+            self._half_open_calls += 1
+
+    def record_success(self, duration: float) -> None:
+        """
+        Record a successful call.
+
+        Args:
+            duration: Duration of the call in seconds.
+        """
+        self._successes += 1
+        self._durations.append(duration)
+        self._consecutive_failures = 0
+
+        if self._state == HALF_OPEN:
+            self._state = CLOSED
+            logger.info(f"{self.name} circuit closed")
+
+    def record_failure(self, duration: Optional[float] = None) -> None:
+        """
+        Record a failed call.
+
+        Args:
+            duration: Duration of the call in seconds if it timed out. The
+                duration is added to the latency window so that the timeout
+                can grow when the API becomes slower.
+        """
+        self._failures += 1
+        self._consecutive_failures += 1
+
+        if duration is not None:
+            self._durations.append(duration)
+
+        if self._state == HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def timeout(self) -> float:
+        """
+        Get the timeout for the next call.
+
+        Returns:
+            float: Timeout in seconds.
+        """
+        if len(self._durations) < self.min_samples:
+            return self.max_timeout
+
+        timeout = self._percentile(self._sorted_durations(), 0.99) * self.timeout_multiplier
+        return min(max(timeout, self.min_timeout), self.max_timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get circuit breaker statistics.
+
+        Returns:
+            Dict[str, Any]: Circuit breaker statistics.
+        """
+        durations = self._sorted_durations()
+
+        return {
+            "state": self.state,
+            "trips": self._trips,
+            "rejected": self._rejected,
+            "successes": self._successes,
+            "failures": self._failures,
+            "consecutive_failures": self._consecutive_failures,
+            "samples": len(durations),
+            "p95_ms": round(self._percentile(durations, 0.95) * 1000, 1),
+            "p99_ms": round(self._percentile(durations, 0.99) * 1000, 1),
+            "timeout_s": round(self.timeout(), 3)
+        }
+
+    def _open(self) -> None:
+        """Open the circuit."""
+        if self._state != OPEN:
+            self._trips += 1
+            logger.warning(
+                f"{self.name} circuit opened after {self._consecutive_failures} consecutive failures"
+            )
+
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+
+    def _sorted_durations(self) -> List[float]:
+        """Get the observed call durations in ascending order."""
+        return sorted(self._durations)
+
+    @staticmethod
+    def _percentile(durations: List[float], percentile: float) -> float:
+        """
+        Get a percentile of sorted durations using the nearest-rank method.
+
+        Args:
+            durations: Durations in ascending order.
+            percentile: Percentile between 0 and 1.
+
+        Returns:
+            float: The percentile, or 0 if there are no durations.
+        """
+        if not durations:
+            return 0.0
+
+        rank = max(math.ceil(len(durations) * percentile) - 1, 0)
+        return durations[rank]
+
+# Application-wide circuit breaker for the Makkaizou API
+makkaizou_circuit_breaker = CircuitBreaker(
+    name="makkaizou",
+    failure_threshold=settings.MAKKAIZOU_BREAKER_FAILURE_THRESHOLD,
+    recovery_timeout=settings.MAKKAIZOU_BREAKER_RECOVERY_TIMEOUT,
+    half_open_max_calls=settings.MAKKAIZOU_BREAKER_HALF_OPEN_MAX_CALLS,
+    window_size=settings.MAKKAIZOU_TIMEOUT_WINDOW_SIZE,
+    min_samples=settings.MAKKAIZOU_TIMEOUT_MIN_SAMPLES,
+    timeout_multiplier=settings.MAKKAIZOU_TIMEOUT_MULTIPLIER,
+    min_timeout=settings.MAKKAIZOU_TIMEOUT_MIN,
+    max_timeout=settings.MAKKAIZOU_READ_TIMEOUT
+)
@@ -0,0 +1,191 @@
+import asyncio
+from typing import Any, Dict, Optional, Tuple, Type
+
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal, Base
+from app.database.models import LineAccount, MakkaizouConfig
+from app.utils.cache import TTLCache
+from app.utils.logging import logger
+
+# Models whose active rows are cached
+CACHED_MODELS = (LineAccount, MakkaizouConfig)
+
+# Marker for cache misses, since "no active row" (None) is cached too
+_MISSING = object()
+
+class ConfigCache:
+    """
+    Process-wide cache of active `LineAccount` and `MakkaizouConfig` rows.
+
+    Rows are cached per model and row ID, where a row ID of None stands for
+    the default (first active) row. Cached rows are detached from their
+    session, so they can be shared between requests.
+
+    Entries expire after `ttl` seconds and are invalidated right away when
+    this process writes the tables through the ORM. Changes made by other
+    workers are picked up by a background task that compares a cheap change
+    signature of each table every `refresh_interval` seconds.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, ttl: float, refresh_interval: float, max_size: int = 1000):
+        """
+        Initialize the config cache.
+
+        Args:
+            session_factory: Factory for the sessions used by the refresh task.
+            ttl: Seconds a cached row is used before it is loaded again.
+            refresh_interval: Seconds between change checks; 0 disables the refresh task.
+            max_size: Maximum number of cached rows.
+        """
+        self.session_factory = session_factory
+        self.refresh_interval = refresh_interval
+
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._signatures: Dict[str, Tuple] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._invalidations = 0
+        self._reloads = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the refresh task has been started."""
+        return self._task is not None
+
+    async def start(self) -> None:
+        """Start the background refresh task."""
+        if self.running or self.refresh_interval <= 0:
+            return
+
+        self._task = asyncio.create_task(self._run(), name="config-cache-refresh")
+        logger.info("Started config cache refresh")
+
+    async def stop(self) -> None:
+        """Stop the background refresh task."""
+        if not self.running:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def get(self, db: AsyncSession, model: Type[Base], row_id: Optional[int] = None) -> Optional[Base]:
+        """
+        Get an active row, loading it from the database on a cache miss.
+
+        Args:
+            db: Async database session used on a cache miss.
+            model: `LineAccount` or `MakkaizouConfig`.
+            row_id: ID of the row, or None for the default active row.
+
+        Returns:
+            Optional[Base]: The detached row, or None if there is no such active row.
+        """
+        key = (model.__name__, row_id)
+
+        row = self._cache.get(key, _MISSING)
+        if row is not _MISSING:
+            return row
+
+        query = select(model).where(model.is_active == True)
+        if row_id is not None:
+            query = query.where(model.id == row_id)
+
+        result = await db.execute(query.order_by(model.id).limit(1))
+        row = result.scalars().first()
+
+        # Detach the row so it can outlive the session
+        if row is not None:
+            db.expunge(row)
+
+        self._cache.set(key, row)
+        self._reloads += 1
+
+        return row
+
+    def invalidate(self, model: Optional[Type[Base]] = None, row_id: Optional[int] = None) -> None:
+        """
+        Drop cached rows.
+
+        The default row of a model is always dropped along with any of its rows,
+        since the change may affect which row is the default.
+
+        Args:
+            model: Model to invalidate, or None to invalidate everything.
+            row_id: ID of the row to invalidate, or None for all rows of the model.
+        """
+        self._invalidations += 1
+
+        if model is None:
+            self._cache.clear()
+            return
+
+        if row_id is not None:
+            self._cache.pop((model.__name__, row_id))
+            self._cache.pop((model.__name__, None))
+            return
+
+        for key in [key for key in self._cache.keys() if key[0] == model.__name__]:
+            self._cache.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict[str, Any]: Cache statistics.
+        """
+        return {
+            **self._cache.stats(),
+            "reloads": self._reloads,
+            "invalidations": self._invalidations,
+            "refresh_running": self.running
+        }
+
+    async def _run(self) -> None:
+        """Invalidate models whose tables changed since the last check."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+
+            try:
+                async with self.session_factory() as db:
+                    for model in CACHED_MODELS:
+                        await self._check_for_changes(db, model)
+
+            except Exception as e:
+                logger.warning(f"Config cache refresh failed: {str(e)}")
+
+    async def _check_for_changes(self, db: AsyncSession, model: Type[Base]) -> None:
+        """
+        Invalidate a model if its change signature differs from the last check.
+
+        Args:
+            db: Async database session.
+            model: Model to check.
+        """
+        result = await db.execute(select(func.count(model.id), func.max(model.id), func.max(model.updated_at)))
+        signature = tuple(result.one())
+
+        previous = self._signatures.get(model.__name__)
+        self._signatures[model.__name__] = signature
+
+        if previous is not None and previous != signature:
+            logger.info(f"{model.__name__} rows changed, reloading config")
+            self.invalidate(model)
+
+# Application-wide config cache
+config_cache = ConfigCache(
+    session_factory=AsyncSessionLocal,
+    ttl=settings.CONFIG_CACHE_TTL,
+    refresh_interval=settings.CONFIG_CACHE_REFRESH_INTERVAL
+)
+
+def _invalidate_on_write(mapper, connection, target) -> None:
+    """Invalidate a cached row when this process writes it through the ORM."""
+    config_cache.invalidate(type(target), target.id)
+
+for _model in CACHED_MODELS:
+    for _event_name in ("after_insert", "after_update", "after_delete"):
+        event.listen(_model, _event_name, _invalidate_on_write)
@@ -0,0 +1,245 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+from sqlalchemy import delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.database import dialect_insert
+from app.database.models import ProcessedEvent
+from app.utils.cache import TTLCache
+from app.utils.validators import LineWebhookEvent, extract_group_id, is_redelivery
+from app.utils.logging import logger
+
+class EventDeduplicator:
+    """
+    Two-tier index of processed webhook event IDs.
+
+    LINE redelivers events it considers unanswered, with the same
+    `webhookEventId`. Event IDs are remembered in an in-process TTL/LRU set,
+    which catches most duplicates without a query, and in the
+    `processed_events` table, whose primary key makes the claim atomic across
+    workers and processes.
+
+    A claim only becomes final with `complete`, once the answer has been
+    handed over. A claim whose processing failed is given up with `release`,
+    and one left behind by a worker that died can be taken over by a
+    redelivery after `claim_timeout` seconds, so the mention is not lost.
+    """
+
+    def __init__(self, ttl_seconds: float, memory_size: int, purge_interval: float, claim_timeout: float):
+        """
+        Initialize the deduplicator.
+
+        Args:
+            ttl_seconds: How long an event ID is remembered.
+            memory_size: Maximum number of event IDs kept in memory.
+            purge_interval: Minimum seconds between deletions of expired rows.
+            claim_timeout: Seconds after which a claim that was never completed
+                may be taken over.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.purge_interval = purge_interval
+        self.claim_timeout = claim_timeout
+
+        self._seen = TTLCache(max_size=memory_size, ttl=ttl_seconds)
+        self._last_purge = time.monotonic()
+        self._checks = 0
+        self._redeliveries = 0
+        self._memory_hits = 0
+        self._database_hits = 0
+        self._takeovers = 0
+        self._released = 0
+        self._errors = 0
+
+    async def claim(self, db: AsyncSession, event: LineWebhookEvent) -> bool:
+        """
+        Record an event as being processed.
+
+        Events without a `webhookEventId` are always claimed. If the index cannot
+        be written, the event is claimed as well, so a database problem never
+        stops events from being answered.
+
+        Args:
+            db: Async database session.
+            event: LINE webhook event.
+
+        Returns:
+            bool: True if the event is new, False if it was seen before.
+        """
+        event_id = event.webhookEventId
+        if not event_id:
+            return True
+
+        self._checks += 1
+        if is_redelivery(event):
+            self._redeliveries += 1
+
+        # First tier: events seen by this process
+        if self._seen.get(event_id):
+            self._memory_hits += 1
+            return False
+
+        self._seen.set(event_id, True)
+
+        # Second tier: the insert only succeeds for the first claim across all workers
+        try:
+            statement = (
+                dialect_insert(db, ProcessedEvent)
+                .values(
+                    webhook_event_id=event_id,
+                    line_group_id=extract_group_id(event),
+                    created_at=datetime.now(timezone.utc)
+                )
+                .on_conflict_do_nothing(index_elements=["webhook_event_id"])
+                .returning(ProcessedEvent.webhook_event_id)
+            )
+            inserted = (await db.execute(statement)).first() is not None
+
+            if not inserted:
+                inserted = await self._take_over(db, event_id)
+
+            await db.commit()
+
+            await self._purge_expired(db)
+
+        except Exception as e:
+            await db.rollback()
+            self._errors += 1
+            logger.warning(f"Could not record webhook event {event_id}: {str(e)}")
+            return True
+
+        if not inserted:
+            self._database_hits += 1
+            return False
+
+        return True
+
+    async def complete(self, db: AsyncSession, event: LineWebhookEvent) -> None:
+        """
+        Mark a claimed event as processed for good.
+
+        Args:
+            db: Async database session.
+            event: LINE webhook event passed to `claim`.
+        """
+        event_id = event.webhookEventId
+        if not event_id:
+            return
+
+        try:
+            await db.execute(
+                update(ProcessedEvent)
+                .where(ProcessedEvent.webhook_event_id == event_id)
+                .values(completed_at=datetime.now(timezone.utc))
+            )
+            await db.commit()
+
+        except Exception as e:
+            await db.rollback()
+            self._errors += 1
+            logger.warning(f"Could not complete webhook event {event_id}: {str(e)}")
+
+    async def release(self, db: AsyncSession, event: LineWebhookEvent) -> None:
+        """
+        Give up the claim of an event whose processing failed, so a redelivery is processed.
+
+        Args:
+            db: Async database session.
+            event: LINE webhook event passed to `claim`.
+        """
+        event_id = event.webhookEventId
+        if not event_id:
+            return
+
+        self._seen.pop(event_id)
+        self._released += 1
+
+        try:
+            # The session may hold the failed transaction of the processing
+            await db.rollback()
+            await db.execute(
+                delete(ProcessedEvent)
+                .where(ProcessedEvent.webhook_event_id == event_id)
+                .where(ProcessedEvent.completed_at.is_(None))
+            )
+            await db.commit()
+
+        except Exception as e:
+            await db.rollback()
+            self._errors += 1
+            logger.warning(f"Could not release webhook event {event_id}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get deduplication statistics.
+
+        Returns:
+            Dict[str, Any]: Deduplication statistics.
+        """
+        duplicates = self._memory_hits + self._database_hits
+
+        return {
+            "checks": self._checks,
+            "redeliveries": self._redeliveries,
+            "duplicates": duplicates,
+            "memory_hits": self._memory_hits,
+            "database_hits": self._database_hits,
+            "takeovers": self._takeovers,
+            "released": self._released,
+            "errors": self._errors,
+            "hit_rate": round(duplicates / self._checks, 4) if self._checks else 0.0,
+            "memory_size": len(self._seen)
+        }
+
+    async def _take_over(self, db: AsyncSession, event_id: str) -> bool:
+        """
+        Claim an event whose earlier claim was never completed nor released.
+
+        Args:
+            db: Async database session.
+            event_id: Webhook event ID.
+
+        Returns:
+            bool: True if the stale claim was taken over.
+        """
+        now = datetime.now(timezone.utc)
+        result = await db.execute(
+            update(ProcessedEvent)
+            .where(ProcessedEvent.webhook_event_id == event_id)
+            .where(ProcessedEvent.completed_at.is_(None))
+            .where(ProcessedEvent.created_at < now - timedelta(seconds=self.claim_timeout))
+            .values(created_at=now)
+        )
+
+        if result.rowcount:
+            self._takeovers += 1
+            logger.warning(f"Taking over webhook event {event_id}, whose processing never finished")
+            return True
+
+        return False
+
+    async def _purge_expired(self, db: AsyncSession) -> None:
+        """
+        Delete expired event IDs from the database, at most once per purge interval.
+
+        Args:
+            db: Async database session.
+        """
+        if time.monotonic() - self._last_purge < self.purge_interval:
+            return
+
+        self._last_purge = time.monotonic()
+
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.ttl_seconds)
+        await db.execute(delete(ProcessedEvent).where(ProcessedEvent.created_at < cutoff))
+        await db.commit()
+
+# Application-wide event deduplicator
+event_deduplicator = EventDeduplicator(
+    ttl_seconds=settings.EVENT_DEDUP_TTL_SECONDS,
+    memory_size=settings.EVENT_DEDUP_MEMORY_SIZE,
+    purge_interval=settings.EVENT_DEDUP_PURGE_INTERVAL,
+    claim_timeout=settings.EVENT_DEDUP_CLAIM_TIMEOUT
+)
@@ -0,0 +1,119 @@
+from functools import partial
+from typing import Dict, Any
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.services.message_service import MessageService
+from app.services.event_scheduler import GroupScheduler, event_scheduler, event_group_key
+from app.utils.validators import LineWebhookEvent
+from app.utils.logging import log_error, get_exception_traceback, logger
+from app.utils.tracing import tracer
+
+async def process_event(event: LineWebhookEvent) -> None:
+    """
+    Process a single event with its own database session.
+
+    Errors are logged instead of raised, so one failing event never affects others.
+
+    Args:
+        event: LINE webhook event.
+    """
+    async with AsyncSessionLocal() as db:
+        try:
+            message_service = await MessageService.create(db)
+            await message_service.process_event(event)
+
+        except Exception as e:
+            # Discard any failed transaction so the error can be logged
+            await db.rollback()
+            await log_error(
+                db,
+                "EventProcessingError",
+                str(e),
+                get_exception_traceback(),
+                {"event": event.dict()}
+            )
+
+class EventQueue:
+    """
+    Background work queue for LINE webhook events.
+
+    Queued events are handed to the group scheduler, which processes them in
+    order per group and runs different groups in parallel.
+    """
+
+    def __init__(self, scheduler: GroupScheduler, max_size: int):
+        """
+        Initialize the event queue.
+
+        Args:
+            scheduler: Scheduler running the queued events.
+            max_size: Maximum number of events waiting to be processed.
+        """
+        self.scheduler = scheduler
+        self.max_size = max_size
+
+        self._running = False
+        self._accepted = 0
+        self._rejected = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the queue accepts events."""
+        return self._running and self.scheduler.running
+
+    @property
+    def depth(self) -> int:
+        """Number of events waiting to be processed."""
+        return self.scheduler.pending
+
+    def start(self) -> None:
+        """Start accepting events. The scheduler must be started separately."""
+        self._running = True
+        logger.info("Started event queue")
+
+    def stop(self) -> None:
+        """Stop accepting events. Stopping the scheduler drains the queued events."""
+        self._running = False
+        logger.info("Stopped event queue")
+
+    def enqueue(self, event: LineWebhookEvent) -> bool:
+        """
+        Put an event on the queue without waiting.
+
+        Args:
+            event: LINE webhook event.
+
+        Returns:
+            bool: True if the event was queued, False if the queue is full or not running.
+        """
+        if not self.running:
+            return False
+
+        if self.depth >= self.max_size:
+            logger.warning("Event queue is full")
+            self._rejected += 1
+            return False
+
+        self.scheduler.submit(event_group_key(event), tracer.propagate(partial(process_event, event)))
+        self._accepted += 1
+
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get queue statistics.
+
+        Returns:
+            Dict[str, Any]: Queue statistics.
+        """
+        return {
+            "running": self.running,
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "accepted": self._accepted,
+            "rejected": self._rejected
+        }
+
+# Application-wide event queue, started in the FastAPI lifespan
+event_queue = EventQueue(scheduler=event_scheduler, max_size=settings.EVENT_QUEUE_MAX_SIZE)
@@ -0,0 +1,214 @@
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from app.config import settings
+from app.utils.validators import LineWebhookEvent, extract_group_id, extract_user_id
+from app.utils.logging import logger
+
+Job = Callable[[], Awaitable[Any]]
+
+def event_group_key(event: LineWebhookEvent) -> str:
+    """
+    Get the scheduling key of an event.
+
+    Events are keyed by the LINE group (or room) they belong to, which maps
+    one-to-one to a Makkaizou talk_id. Events outside of groups are keyed by user.
+
+    Args:
+        event: LINE webhook event.
+
+    Returns:
+        str: Scheduling key.
+    """
+    return extract_group_id(event) or extract_user_id(event) or "default"
+
+class GroupScheduler:
+    """
+    Scheduler that runs jobs in FIFO order per group and different groups in parallel.
+
+    Each group gets a lane: a queue of jobs drained by a single task, so jobs of the
+    same group never overlap. A semaphore limits how many lanes run a job at once.
+    A lane is evicted as soon as it has no more jobs, so memory only grows with the
+    number of groups that currently have pending work.
+    """
+
+    def __init__(self, max_concurrent_groups: int):
+        """
+        Initialize the scheduler.
+
+        Args:
+            max_concurrent_groups: Maximum number of groups running a job at once.
+        """
+        self.max_concurrent_groups = max_concurrent_groups
+
+        self._lanes: Dict[str, Deque[Tuple[Job, asyncio.Future]]] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._evicted_lanes = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the scheduler has been started."""
+        return self._semaphore is not None
+
+    @property
+    def pending(self) -> int:
+        """Number of jobs submitted but not yet finished."""
+        return self._pending
+
+    @property
+    def queued(self) -> int:
+        """Number of jobs waiting for their group or for a free slot."""
+        return self._pending - self._active
+
+    async def start(self) -> None:
+        """
+        Start the scheduler.
+
+        The concurrency semaphore is created here rather than in `__init__`,
+        since the scheduler is created at import time, before the event loop.
+        """
+        if self.running:
+            return
+
+        self._semaphore = asyncio.Semaphore(self.max_concurrent_groups)
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        logger.info(f"Started event scheduler with {self.max_concurrent_groups} concurrent groups")
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Wait for pending jobs to finish and stop the scheduler.
+
+        Args:
+            timeout: Seconds to wait for pending jobs. Jobs still pending after
+                that are cancelled.
+        """
+        if not self.running:
+            return
+
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Event scheduler drain timed out, cancelling {self._pending} jobs")
+
+        # Collect the jobs that never started before the lanes are evicted
+        leftover = [future for lane in self._lanes.values() for _, future in lane]
+
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for future in leftover:
+            future.cancel()
+
+        self._lanes.clear()
+        self._tasks.clear()
+        self._pending = 0
+        self._semaphore = None
+        self._idle = None
+
+        logger.info("Stopped event scheduler")
+
+    def submit(self, key: str, job: Job) -> asyncio.Future:
+        """
+        Schedule a job behind the other jobs of its group.
+
+        Args:
+            key: Group key, see `event_group_key`.
+            job: Callable returning the awaitable to run.
+
+        Returns:
+            asyncio.Future: Future resolved with the result of the job.
+
+        Raises:
+            RuntimeError: If the scheduler has not been started.
+        """
+        if not self.running:
+            raise RuntimeError("Event scheduler is not running")
+
+        future = asyncio.get_running_loop().create_future()
+
+        lane = self._lanes.get(key)
+        if lane is None:
+            lane = self._lanes[key] = deque()
+            self._tasks[key] = asyncio.create_task(self._run_lane(key, lane))
+
+        lane.append((job, future))
+        self._pending += 1
+        self._idle.clear()
+
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get scheduler statistics.
+
+        Returns:
+            Dict[str, Any]: Scheduler statistics.
+        """
+        return {
+            "running": self.running,
+            "max_concurrent_groups": self.max_concurrent_groups,
+            "active_lanes": len(self._lanes),
+            "pending": self._pending,
+            "active": self._active,
+            "completed": self._completed,
+            "failed": self._failed,
+            "evicted_lanes": self._evicted_lanes
+        }
+
+    async def _run_lane(self, key: str, lane: Deque[Tuple[Job, asyncio.Future]]) -> None:
+        """
+        Run the jobs of a lane one after another, then evict the lane.
+
+        Args:
+            key: Group key.
+            lane: Jobs of the group.
+        """
+        try:
+            while lane:
+                job, future = lane.popleft()
+                try:
+                    async with self._semaphore:
+                        self._active += 1
+                        try:
+                            result = await job()
+                        finally:
+                            self._active -= 1
+
+                    self._completed += 1
+                    if not future.done():
+                        future.set_result(result)
+
+                except asyncio.CancelledError:
+                    future.cancel()
+                    raise
+
+                except Exception as e:
+                    self._failed += 1
+                    if not future.done():
+                        future.set_exception(e)
+
+                finally:
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._idle.set()
+
+        finally:
+            # No await between the empty check and here, so no job can slip in
+            if self._lanes.get(key) is lane:
+                del self._lanes[key]
+                del self._tasks[key]
+                self._evicted_lanes += 1
+
+# Application-wide event scheduler, started in the FastAPI lifespan
+event_scheduler = GroupScheduler(max_concurrent_groups=settings.EVENT_MAX_CONCURRENT_GROUPS)
@@ -0,0 +1,206 @@
+import time
+import httpx
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.utils.logging import logger
+
+class PooledHTTPClient:
+    """
+    Application-scoped HTTP client with a shared connection pool.
+
+    The underlying `httpx.AsyncClient` is created in the FastAPI lifespan and
+    reused by every request, so connections (and their TCP/TLS setup) are kept
+    alive between calls. When the client has not been started, for example in
+    scripts or tests that do not run the lifespan, each call falls back to a
+    short-lived client with the same settings.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        max_connections: int,
+        max_keepalive_connections: int,
+        keepalive_expiry: float,
+        connect_timeout: float,
+        read_timeout: float,
+        write_timeout: float,
+        pool_timeout: float,
+        http2: bool = False
+    ):
+        """
+        Initialize the HTTP client.
+
+        Args:
+            name: Name used in logs and statistics.
+            max_connections: Maximum number of open connections.
+            max_keepalive_connections: Maximum number of idle connections kept alive.
+            keepalive_expiry: Seconds an idle connection is kept alive.
+            connect_timeout: Seconds to wait for a connection to be established.
+            read_timeout: Seconds to wait for response data.
+            write_timeout: Seconds to wait for request data to be sent.
+            pool_timeout: Seconds to wait for a free connection from the pool.
+            http2: Whether to negotiate HTTP/2.
+        """
+        self.name = name
+        self.http2 = http2
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        self.timeout = httpx.Timeout(
+            connect=connect_timeout,
+            read=read_timeout,
+            write=write_timeout,
+            pool=pool_timeout
+        )
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._max_in_flight = 0
+        self._total_time = 0.0
+
+    @property
+    def running(self) -> bool:
+        """Whether the shared client has been started."""
+        return self._client is not None
+
+    async def start(self) -> None:
+        """Create the shared client."""
+        if self.running:
+            return
+
+        self._client = self._create_client()
+        logger.info(f"Started {self.name} HTTP client (http2={self.http2})")
+
+    async def stop(self) -> None:
+        """Close the shared client and its connections."""
+        if not self.running:
+            return
+
+        await self._client.aclose()
+        self._client = None
+        logger.info(f"Stopped {self.name} HTTP client")
+
+    async def request(self, method: str, url: str, **kwargs: Any) -> httpx.Response:
+        """
+        Send a request through the shared client.
+
+        Args:
+            method: HTTP method.
+            url: Request URL.
+            **kwargs: Arguments passed to `httpx.AsyncClient.request`.
+
+        Returns:
+            httpx.Response: The response.
+
+        Raises:
+            httpx.RequestError: If the request could not be completed.
+        """
+        start_time = time.perf_counter()
+        self._requests += 1
+        self._in_flight += 1
+        self._max_in_flight = max(self._max_in_flight, self._in_flight)
+
+        try:
+            if self._client is not None:
+                return await self._client.request(method, url, **kwargs)
+
+            async with self._create_client() as client:
+                return await client.request(method, url, **kwargs)
+
+        except httpx.RequestError:
+            self._errors += 1
+            raise
+
+        finally:
+            self._in_flight -= 1
+            self._total_time += time.perf_counter() - start_time
+
+    async def post(self, url: str, **kwargs: Any) -> httpx.Response:
+        """
+        Send a POST request through the shared client.
+
+        Args:
+            url: Request URL.
+            **kwargs: Arguments passed to `httpx.AsyncClient.request`.
+
+        Returns:
+            httpx.Response: The response.
+        """
+        return await self.request("POST", url, **kwargs)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get client and connection pool statistics.
+
+        Returns:
+            Dict[str, Any]: Client statistics.
+        """
+        connections = self._pool_connections()
+
+        return {
+            "running": self.running,
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "connections": len(connections),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+            "requests": self._requests,
+            "errors": self._errors,
+            "in_flight": self._in_flight,
+            "max_in_flight": self._max_in_flight,
+            "avg_request_time_ms": round(self._total_time / self._requests * 1000, 2) if self._requests else 0.0
+        }
+
+    def _create_client(self) -> httpx.AsyncClient:
+        """
+        Create an `httpx.AsyncClient` with the configured pool and timeouts.
+
+        Returns:
+            httpx.AsyncClient: The client.
+        """
+        return httpx.AsyncClient(limits=self.limits, timeout=self.timeout, http2=self.http2)
+
+    def _pool_connections(self) -> list:
+        """
+        Get the connections of the shared connection pool.
+
+        httpx does not expose its pool publicly, so this reads the transport's
+        httpcore pool and returns an empty list if its layout changes.
+
+        Returns:
+            list: httpcore connections.
+        """
+        transport = getattr(self._client, "_transport", None)
+        pool = getattr(transport, "_pool", None)
+        return list(getattr(pool, "connections", []))
+
+# Application-wide client for the Makkaizou API, started in the FastAPI lifespan
+makkaizou_http_client = PooledHTTPClient(
+    name="makkaizou",
+    max_connections=settings.MAKKAIZOU_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.MAKKAIZOU_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.MAKKAIZOU_KEEPALIVE_EXPIRY,
+    connect_timeout=settings.MAKKAIZOU_CONNECT_TIMEOUT,
+    read_timeout=settings.MAKKAIZOU_READ_TIMEOUT,
+    write_timeout=settings.MAKKAIZOU_WRITE_TIMEOUT,
+    pool_timeout=settings.MAKKAIZOU_POOL_TIMEOUT,
+    http2=settings.MAKKAIZOU_HTTP2
+)
+
+# Application-wide client for the LINE Messaging API, started in the FastAPI lifespan
+line_http_client = PooledHTTPClient(
+    name="line",
+    max_connections=settings.LINE_MAX_CONNECTIONS,
+    max_keepalive_connections=settings.LINE_MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=settings.LINE_KEEPALIVE_EXPIRY,
+    connect_timeout=settings.LINE_CONNECT_TIMEOUT,
+    read_timeout=settings.LINE_READ_TIMEOUT,
+    write_timeout=settings.LINE_WRITE_TIMEOUT,
+    pool_timeout=settings.LINE_POOL_TIMEOUT,
+    http2=settings.LINE_HTTP2
+)
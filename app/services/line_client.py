@@ -0,0 +1,128 @@
+from typing import Any, Dict, List, Optional
+
+from linebot.exceptions import LineBotApiError
+from linebot.models import Error
+
+from app.config import settings
+from app.services.http_client import PooledHTTPClient, line_http_client
+
+class LineMessagingClient:
+    """
+    Async client for the LINE Messaging API.
+
+    Unlike `linebot.LineBotApi`, requests never block the event loop. The client
+    holds no per-account state: the channel access token is passed with each
+    call, so one pooled client serves every `LineAccount`.
+    """
+
+    def __init__(self, http_client: PooledHTTPClient, endpoint: str):
+        """
+        Initialize the LINE Messaging API client.
+
+        Args:
+            http_client: Pooled HTTP client used for the requests.
+            endpoint: Base URL of the LINE Messaging API.
+        """
+        self.http_client = http_client
+        self.endpoint = endpoint.rstrip("/")
+
+    async def reply_message(self, channel_access_token: str, reply_token: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Send a reply message.
+
+        Args:
+            channel_access_token: Channel access token of the LINE account.
+            reply_token: Reply token from the webhook event.
+            messages: Messages to send, as LINE message objects.
+
+        Returns:
+            Dict[str, Any]: Response body from LINE API.
+
+        Raises:
+            LineBotApiError: If LINE API returns an error response.
+            httpx.RequestError: If the request could not be completed.
+        """
+        return await self._post(
+            channel_access_token,
+            "/v2/bot/message/reply",
+            {"replyToken": reply_token, "messages": messages}
+        )
+
+    async def push_message(
+        self,
+        channel_access_token: str,
+        to: str,
+        messages: List[Dict[str, Any]],
+        retry_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Send a push message.
+
+        Args:
+            channel_access_token: Channel access token of the LINE account.
+            to: ID of the user, group or room to send to.
+            messages: Messages to send, as LINE message objects.
+            retry_key: UUID sent as `X-Line-Retry-Key`. LINE accepts a push
+                with the same key only once, which makes retries safe.
+
+        Returns:
+            Dict[str, Any]: Response body from LINE API.
+
+        Raises:
+            LineBotApiError: If LINE API returns an error response.
+            httpx.RequestError: If the request could not be completed.
+        """
+        return await self._post(
+            channel_access_token,
+            "/v2/bot/message/push",
+            {"to": to, "messages": messages},
+            {"X-Line-Retry-Key": retry_key} if retry_key else None
+        )
+
+    async def _post(
+        self,
+        channel_access_token: str,
+        path: str,
+        payload: Dict[str, Any],
+        headers: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Send a POST request to LINE API.
+
+        Args:
+            channel_access_token: Channel access token of the LINE account.
+            path: API path.
+            payload: JSON request body.
+            headers: Additional request headers.
+
+        Returns:
+            Dict[str, Any]: Response body from LINE API.
+
+        Raises:
+            LineBotApiError: If LINE API returns an error response.
+        """
+        response = await self.http_client.post(
+            f"{self.endpoint}{path}",
+            json=payload,
+            headers={"Authorization": f"Bearer {channel_access_token}", **(headers or {})}
+        )
+
+        try:
+            body = response.json() if response.content else {}
+        except ValueError:
+            body = {"message": response.text}
+
+        if response.status_code >= 400:
+            # Raise the same error as LineBotApi so callers handle both alike
+            raise LineBotApiError(
+                status_code=response.status_code,
+                headers=dict(response.headers),
+                request_id=response.headers.get("x-line-request-id"),
+                accepted_request_id=response.headers.get("x-line-accepted-request-id"),
+                error=Error.new_from_json_dict(body)
+            )
+
+        return body
+
+# Application-wide LINE Messaging API client, shared by all LINE accounts
+line_messaging_client = LineMessagingClient(line_http_client, settings.LINE_API_ENDPOINT)
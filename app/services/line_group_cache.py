@@ -0,0 +1,173 @@
+import asyncio
+import uuid
+from typing import Any, Dict, NamedTuple, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.database import dialect_insert
+from app.database.models import LineGroup
+from app.utils.cache import TTLCache
+
+class LineGroupRef(NamedTuple):
+    """Cached identity of a LINE group and its Makkaizou talk."""
+
+    id: int
+    line_group_id: str
+    makkaizou_talk_id: str
+
+class LineGroupCache:
+    """
+    Bounded LRU cache of LINE group ID to `LineGroupRef`.
+
+    Hot groups are resolved without touching the database. On a miss, only
+    one lookup per group runs at a time in this process; concurrent callers
+    for the same group wait for its result. New groups are created with an
+    INSERT ... ON CONFLICT upsert, so concurrent creation from several
+    workers always ends with a single row and a single talk_id.
+    """
+
+    def __init__(self, max_size: int):
+        """
+        Initialize the group cache.
+
+        Args:
+            max_size: Maximum number of cached groups.
+        """
+        self._cache = TTLCache(max_size=max_size)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._coalesced = 0
+        self._created = 0
+
+    async def get_or_create(self, db: AsyncSession, group_id: str, line_account_id: Optional[int] = None) -> LineGroupRef:
+        """
+        Get a LINE group, creating it if it does not exist.
+
+        Args:
+            db: Async database session used on a cache miss.
+            group_id: LINE group ID.
+            line_account_id: LINE account to assign to a new group.
+
+        Returns:
+            LineGroupRef: The LINE group.
+        """
+        group = self._cache.get(group_id)
+        if group is not None:
+            return group
+
+        # Wait for a lookup of the same group that is already running
+        in_flight = self._in_flight.get(group_id)
+        if in_flight is not None:
+            self._coalesced += 1
+            try:
+                return await asyncio.shield(in_flight)
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+
+                # The caller running the lookup was cancelled, not this one
+                return await self.get_or_create(db, group_id, line_account_id)
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[group_id] = future
+
+        try:
+            group = await self._load(db, group_id)
+            if group is None:
+                group = await self._insert(db, group_id, line_account_id)
+
+            self._cache.set(group_id, group)
+            future.set_result(group)
+            return group
+
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+
+        except BaseException:
+            future.cancel()
+            raise
+
+        finally:
+            del self._in_flight[group_id]
+
+    def invalidate(self, group_id: str) -> None:
+        """
+        Drop a cached group.
+
+        Args:
+            group_id: LINE group ID.
+        """
+        self._cache.pop(group_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict[str, Any]: Cache statistics.
+        """
+        return {
+            **self._cache.stats(),
+            "coalesced": self._coalesced,
+            "created": self._created
+        }
+
+    async def _load(self, db: AsyncSession, group_id: str) -> Optional[LineGroupRef]:
+        """
+        Load an existing LINE group.
+
+        Args:
+            db: Async database session.
+            group_id: LINE group ID.
+
+        Returns:
+            Optional[LineGroupRef]: The LINE group, or None if it does not exist.
+        """
+        result = await db.execute(
+            select(LineGroup.id, LineGroup.line_group_id, LineGroup.makkaizou_talk_id)
+            .where(LineGroup.line_group_id == group_id)
+        )
+        row = result.first()
+        return LineGroupRef(*row) if row is not None else None
+
+    async def _insert(self, db: AsyncSession, group_id: str, line_account_id: Optional[int]) -> LineGroupRef:
+        """
+        Create a LINE group, or return the row another worker created first.
+
+        Args:
+            db: Async database session.
+            group_id: LINE group ID.
+            line_account_id: LINE account to assign to the group.
+
+        Returns:
+            LineGroupRef: The LINE group.
+        """
+        # Generate a unique talk_id for Makkaizou
+        talk_id = f"line-{uuid.uuid4()}"
+
+        statement = dialect_insert(db, LineGroup).values(
+            line_group_id=group_id,
+            line_account_id=line_account_id,
+            makkaizou_talk_id=talk_id
+        )
+
+        # A no-op update on conflict makes RETURNING yield the existing row
+        statement = statement.on_conflict_do_update(
+            index_elements=["line_group_id"],
+            set_={"line_group_id": statement.excluded.line_group_id}
+        ).returning(LineGroup.id, LineGroup.line_group_id, LineGroup.makkaizou_talk_id)
+
+        group = LineGroupRef(*(await db.execute(statement)).one())
+        await db.commit()
+
+        if group.makkaizou_talk_id == talk_id:
+            self._created += 1
+
+        return group
+
+# Application-wide LINE group cache
+line_group_cache = LineGroupCache(max_size=settings.LINE_GROUP_CACHE_SIZE)
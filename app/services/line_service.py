@@ -1,49 +1,103 @@
-from linebot import LineBotApi
+import httpx
+import time
+import uuid
+from functools import partial
 from linebot.models import TextSendMessage
 from linebot.exceptions import LineBotApiError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional, Dict, Any
-import uuid
 
 from app.config import settings
-from app.database.models import LineAccount, LineGroup
+from app.database.models import LineAccount
+from app.services.config_cache import config_cache
+from app.services.line_client import line_messaging_client
+from app.services.line_group_cache import LineGroupRef, line_group_cache
+from app.services.retry import line_retry_policy, may_have_been_processed
 from app.utils.logging import log_error, logger
+from app.utils.metrics import stage_duration
+from app.utils.tracing import SPAN_KIND_CLIENT, tracer
+
+# Counters of how answers reached LINE, reported by /stats
+delivery_stats: Dict[str, int] = {
+    "replies": 0,
+    "reply_failures": 0,
+    "expired_tokens": 0,
+    "rejected_tokens": 0,
+    "uncertain_replies": 0,
+    "pushes": 0,
+    "push_failures": 0
+}
+
+def is_invalid_reply_token_error(error: LineBotApiError) -> bool:
+    """
+    Check whether LINE rejected a reply because its token is expired or used.
+    
+    Args:
+        error: Error returned by LINE API.
+        
+    Returns:
+        bool: True if the reply token was rejected.
+    """
+    message = getattr(error.error, "message", None) or ""
+    return error.status_code == 400 and "reply token" in message.lower()
 
 class LineService:
     """Service for interacting with the LINE API."""
     
-    def __init__(self, db: Session, line_account: Optional[LineAccount] = None):
+    def __init__(self, db: AsyncSession, line_account: Optional[LineAccount] = None):
         """
         Initialize the LINE service.
         
+        Use `LineService.create` to load the default account from the database.
+        
         Args:
-            db: Database session.
-            line_account: LINE account to use. If None, the default account will be used.
+            db: Async database session.
+            line_account: LINE account to use. If None, the settings will be used.
         """
         self.db = db
         self.line_account = line_account
         
-        # Use the provided account or get the default one
-        if line_account is None:
-            self.line_account = self._get_default_line_account()
-        
-        # Initialize the LINE Bot API client
+        # Use the account's access token with the shared LINE API client
         if self.line_account:
-            self.line_bot_api = LineBotApi(self.line_account.channel_access_token)
+            self.channel_access_token = self.line_account.channel_access_token
         else:
             # Use the settings if no account is found
-            self.line_bot_api = LineBotApi(settings.LINE_CHANNEL_ACCESS_TOKEN)
+            self.channel_access_token = settings.LINE_CHANNEL_ACCESS_TOKEN
+        
+        self.line_client = line_messaging_client
+    
+    @classmethod
+    async def create(cls, db: AsyncSession, line_account: Optional[LineAccount] = None) -> "LineService":
+        """
+        Create a LINE service.
+        
+        Args:
+            db: Async database session.
+            line_account: LINE account to use. If None, the default account will be used.
+            
+        Returns:
+            LineService: The LINE service.
+        """
+        # Use the provided account or get the default one
+        if line_account is None:
+            line_account = await cls._get_default_line_account(db)
+        
+        return cls(db, line_account)
     
-    def _get_default_line_account(self) -> Optional[LineAccount]:
+    @staticmethod
+    async def _get_default_line_account(db: AsyncSession) -> Optional[LineAccount]:
         """
         Get the default LINE account.
         
+        Args:
+            db: Async database session.
+            
         Returns:
             Optional[LineAccount]: The default LINE account, or None if not found.
         """
-        return self.db.query(LineAccount).filter(LineAccount.is_active == True).first()
+        return await config_cache.get(db, LineAccount)
     
-    def get_or_create_line_group(self, group_id: str) -> LineGroup:
+    async def get_or_create_line_group(self, group_id: str) -> LineGroupRef:
         """
         Get or create a LINE group.
         
@@ -51,60 +105,221 @@ class LineService:
             group_id: LINE group ID.
             
         Returns:
-            LineGroup: The LINE group.
+            LineGroupRef: The LINE group's ID and Makkaizou talk_id.
+        """
+        return await line_group_cache.get_or_create(
+            self.db,
+            group_id,
+            self.line_account.id if self.line_account else None
+        )
+    
+    async def send_reply(self, reply_token: str, message: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Send a reply message to LINE.
+        
+        A retried reply is never delivered twice, since LINE accepts a reply
+        token only once. But when an attempt timed out on the response or got a
+        server error, LINE may have delivered it all the same; the result then
+        has `uncertain` set. If a later attempt is rejected for its reply token,
+        the reply is taken as delivered.
+        
+        Args:
+            reply_token: Reply token from the webhook event.
+            message: Message to send.
+            deadline: Unix time at which the reply token expires; no retry is
+                started after it.
+            
+        Returns:
+            Dict[str, Any]: Response from LINE API.
         """
-        # Check if the group exists
-        group = self.db.query(LineGroup).filter(LineGroup.line_group_id == group_id).first()
-        
-        # If not, create it
-        if group is None:
-            # Generate a unique talk_id for Makkaizou
-            talk_id = f"line-{uuid.uuid4()}"
-            
-            # Create the group
-            group = LineGroup(
-                line_group_id=group_id,
-                line_account_id=self.line_account.id if self.line_account else None,
-                makkaizou_talk_id=talk_id
+        text_message = TextSendMessage(text=message)
+        uncertain = False
+        
+        async def attempt() -> Dict[str, Any]:
+            nonlocal uncertain
+            try:
+                return await self.line_client.reply_message(
+                    self.channel_access_token,
+                    reply_token,
+                    [text_message.as_json_dict()]
+                )
+            except Exception as e:
+                uncertain = uncertain or may_have_been_processed(e)
+                raise
+        
+        try:
+            # Send the reply
+            with stage_duration.time(stage="line_reply"), tracer.span("line.reply", kind=SPAN_KIND_CLIENT):
+                response = await line_retry_policy.run(attempt, idempotent=True, deadline=deadline)
+            
+            logger.info(f"Sent reply to LINE: {message}")
+            
+            return {"status": "success", "response": response}
+        
+        except LineBotApiError as e:
+            # The token was most likely used up by an earlier attempt whose response was lost
+            if is_invalid_reply_token_error(e) and uncertain:
+                logger.warning(f"Reply token was rejected after an attempt that may have been delivered: {message}")
+                return {"status": "success", "response": {}, "uncertain": True}
+            
+            # An expired token is not an error when the caller falls back to a push message
+            if is_invalid_reply_token_error(e):
+                logger.warning(f"LINE rejected the reply token: {str(e)}")
+                return {"status": "error", "error": str(e), "reason": "invalid_reply_token"}
+            
+            # Log the error
+            await log_error(
+                self.db,
+                "LineBotApiError",
+                str(e),
+                None,
+                {"reply_token": reply_token, "message": message}
             )
             
-            # Save to database
-            self.db.add(group)
-            self.db.commit()
-            self.db.refresh(group)
+            return {"status": "error", "error": str(e), "uncertain": uncertain or may_have_been_processed(e)}
         
-        return group
+        except httpx.RequestError as e:
+            # Log connection errors, timeouts, etc.
+            await log_error(
+                self.db,
+                "LineAPIRequestError",
+                f"Request error: {str(e)}",
+                None,
+                {"reply_token": reply_token, "message": message}
+            )
+            
+            return {"status": "error", "error": str(e), "uncertain": uncertain or may_have_been_processed(e)}
     
-    def send_reply(self, reply_token: str, message: str) -> Dict[str, Any]:
+    async def deliver(
+        self,
+        reply_token: Optional[str],
+        to: str,
+        message: str,
+        reply_deadline: float,
+        retry_key: Optional[str] = None,
+        reply_uncertain: bool = False
+    ) -> Dict[str, Any]:
         """
-        Send a reply message to LINE.
+        Deliver a message as a reply, or as a push message once the reply token can no longer be used.
+        
+        The reply token is skipped when less than `LINE_REPLY_TOKEN_MARGIN`
+        seconds of its lifetime are left, and a push message is also sent when
+        LINE rejects the token. No push message is sent once a reply attempt
+        may have been delivered, see `send_reply`: a rejected token then means
+        the reply got through.
         
         Args:
-            reply_token: Reply token from the webhook event.
+            reply_token: Reply token from the webhook event, or None to push right away.
+            to: ID of the group, room or user to push to instead.
+            message: Message to send.
+            reply_deadline: Unix time at which the reply token expires.
+            retry_key: Retry key of the push message, see `send_push`.
+            reply_uncertain: Whether an earlier reply of the same message may
+                have been delivered, e.g. by an earlier outbox attempt.
+            
+        Returns:
+            Dict[str, Any]: Response from LINE API, with the `method` used.
+        """
+        if not settings.LINE_PUSH_FALLBACK_ENABLED:
+            result = await self.send_reply(reply_token, message, deadline=reply_deadline)
+            delivery_stats["replies" if result["status"] == "success" else "reply_failures"] += 1
+            return {**result, "method": "reply"}
+        
+        # Leave a margin for the request itself to reach LINE in time
+        usable_until = reply_deadline - settings.LINE_REPLY_TOKEN_MARGIN
+        
+        if reply_token and time.time() < usable_until:
+            result = await self.send_reply(reply_token, message, deadline=usable_until)
+            
+            if result.get("reason") == "invalid_reply_token" and reply_uncertain:
+                logger.warning(f"Reply token was rejected after an earlier reply that may have been delivered: {message}")
+                result = {"status": "success", "response": {}, "uncertain": True}
+            
+            if result.get("reason") != "invalid_reply_token":
+                if result.get("uncertain") and result["status"] == "success":
+                    delivery_stats["uncertain_replies"] += 1
+                delivery_stats["replies" if result["status"] == "success" else "reply_failures"] += 1
+                return {**result, "method": "reply"}
+            
+            delivery_stats["rejected_tokens"] += 1
+        elif reply_uncertain:
+            # Pushing could deliver the message twice
+            logger.warning(f"Not pushing a message whose earlier reply may have been delivered: {message}")
+            delivery_stats["uncertain_replies"] += 1
+            return {"status": "success", "response": {}, "uncertain": True, "method": "reply"}
+        else:
+            delivery_stats["expired_tokens"] += 1
+        
+        logger.info(f"Reply token can no longer be used, pushing the message to {to}")
+        
+        result = await self.send_push(to, message, retry_key)
+        delivery_stats["pushes" if result["status"] == "success" else "push_failures"] += 1
+        return {**result, "method": "push"}
+    
+    async def send_push(self, to: str, message: str, retry_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Send a push message to LINE.
+        
+        Args:
+            to: ID of the user, group or room to send to.
             message: Message to send.
+            retry_key: UUID identifying the message, so that sending it again is
+                not delivered twice. A new one is generated if None.
             
         Returns:
             Dict[str, Any]: Response from LINE API.
         """
+        # The same retry key on every attempt keeps LINE from delivering the message twice
+        retry_key = retry_key or str(uuid.uuid4())
+        
         try:
             # Create a text message
             text_message = TextSendMessage(text=message)
             
-            # Send the reply
-            response = self.line_bot_api.reply_message(reply_token, text_message)
+            # Send the push message
+            with stage_duration.time(stage="line_push"), tracer.span("line.push", kind=SPAN_KIND_CLIENT):
+                response = await line_retry_policy.run(
+                    partial(
+                        self.line_client.push_message,
+                        self.channel_access_token,
+                        to,
+                        [text_message.as_json_dict()],
+                        retry_key
+                    ),
+                    idempotent=True
+                )
             
-            logger.info(f"Sent reply to LINE: {message}")
+            logger.info(f"Sent push message to LINE: {message}")
             
             return {"status": "success", "response": response}
         
         except LineBotApiError as e:
+            # An earlier attempt was accepted even though its response was lost
+            if e.status_code == 409 and e.headers.get("x-line-accepted-request-id"):
+                logger.info(f"Push message was already accepted by LINE: {message}")
+                return {"status": "success", "response": {}}
+            
             # Log the error
-            log_error(
+            await log_error(
                 self.db,
                 "LineBotApiError",
                 str(e),
                 None,
-                {"reply_token": reply_token, "message": message}
+                {"to": to, "message": message},
+                to
+            )
+            
+            return {"status": "error", "error": str(e)}
+        
+        except httpx.RequestError as e:
+            # Log connection errors, timeouts, etc.
+            await log_error(
+                self.db,
+                "LineAPIRequestError",
+                f"Request error: {str(e)}",
+                None,
+                {"to": to, "message": message},
+                to
             )
             
-            return {"status": "error", "error": str(e)} 
\ No newline at end of file
+            return {"status": "error", "error": str(e)}
\ No newline at end of file
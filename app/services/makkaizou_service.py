@@ -1,30 +1,43 @@
 import httpx
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Dict, Any, Optional
 import json
+import time
+from functools import partial
 
 from app.config import settings
 from app.database.models import MakkaizouConfig
+from app.services.circuit_breaker import CircuitBreaker, CircuitOpenError, makkaizou_circuit_breaker
+from app.services.config_cache import config_cache
+from app.services.http_client import makkaizou_http_client
+from app.services.response_cache import normalize_prompt, response_cache
+from app.services.retry import makkaizou_retry_policy
 from app.utils.logging import log_error, logger
+from app.utils.single_flight import SingleFlight
+from app.utils.tracing import SPAN_KIND_CLIENT, tracer
+
+# Identical prompts of a talk in flight at the same time share one Makkaizou request
+prompt_flights = SingleFlight(
+    grace_seconds=settings.SINGLE_FLIGHT_GRACE_SECONDS,
+    is_reusable=lambda result: result["status"] == "success"
+)
 
 class MakkaizouService:
     """Service for interacting with the Makkaizou API."""
     
-    def __init__(self, db: Session, makkaizou_config: Optional[MakkaizouConfig] = None):
+    def __init__(self, db: AsyncSession, makkaizou_config: Optional[MakkaizouConfig] = None):
         """
         Initialize the Makkaizou service.
         
+        Use `MakkaizouService.create` to load the default configuration from the database.
+        
         Args:
-            db: Database session.
-            makkaizou_config: Makkaizou configuration to use. If None, the default configuration will be used.
+            db: Async database session.
+            makkaizou_config: Makkaizou configuration to use. If None, the settings will be used.
         """
         self.db = db
         self.makkaizou_config = makkaizou_config
         
-        # Use the provided configuration or get the default one
-        if makkaizou_config is None:
-            self.makkaizou_config = self._get_default_makkaizou_config()
-        
         # Use the configuration or settings
         if self.makkaizou_config:
             self.api_key = self.makkaizou_config.api_key
@@ -38,22 +51,80 @@ class MakkaizouService:
             self.learning_model_code = settings.MAKKAIZOU_LEARNING_MODEL_CODE
             self.model_settings = {}
     
-    def _get_default_makkaizou_config(self) -> Optional[MakkaizouConfig]:
+    @classmethod
+    async def create(cls, db: AsyncSession, makkaizou_config: Optional[MakkaizouConfig] = None) -> "MakkaizouService":
+        """
+        Create a Makkaizou service.
+        
+        Args:
+            db: Async database session.
+            makkaizou_config: Makkaizou configuration to use. If None, the default configuration will be used.
+            
+        Returns:
+            MakkaizouService: The Makkaizou service.
+        """
+        # Use the provided configuration or get the default one
+        if makkaizou_config is None:
+            makkaizou_config = await cls._get_default_makkaizou_config(db)
+        
+        return cls(db, makkaizou_config)
+    
+    @staticmethod
+    async def _get_default_makkaizou_config(db: AsyncSession) -> Optional[MakkaizouConfig]:
         """
         Get the default Makkaizou configuration.
         
+        Args:
+            db: Async database session.
+            
         Returns:
             Optional[MakkaizouConfig]: The default Makkaizou configuration, or None if not found.
         """
-        return self.db.query(MakkaizouConfig).filter(MakkaizouConfig.is_active == True).first()
+        return await config_cache.get(db, MakkaizouConfig)
     
-    async def process_prompt(self, talk_id: str, prompt: str) -> Dict[str, Any]:
+    async def process_prompt(self, talk_id: str, prompt: str, deadline: Optional[float] = None) -> Dict[str, Any]:
         """
         Process a prompt using the Makkaizou API.
         
         Args:
             talk_id: Talk ID for Makkaizou.
             prompt: Prompt to process.
+            deadline: Unix time after which no retry is started, e.g. when the
+                reply token expires.
+            
+        Returns:
+            Dict[str, Any]: Response from Makkaizou API.
+        """
+        # Answer repeated questions without calling Makkaizou
+        if settings.RESPONSE_CACHE_ENABLED:
+            cached = response_cache.get(self.learning_model_code, talk_id, prompt)
+            if cached is not None:
+                logger.info("Answering prompt from the response cache")
+                return {
+                    "status": "success",
+                    "response": cached.response,
+                    "cache_hit": True,
+                    "latency_saved_ms": cached.latency_ms
+                }
+        
+        # Share the answer of an identical prompt that is already in flight
+        if settings.SINGLE_FLIGHT_ENABLED:
+            result, shared = await prompt_flights.run(
+                (self.learning_model_code, talk_id, normalize_prompt(prompt)),
+                partial(self._request_prompt, talk_id, prompt, deadline)
+            )
+            return {**result, "coalesced": True} if shared else result
+        
+        return await self._request_prompt(talk_id, prompt, deadline)
+    
+    async def _request_prompt(self, talk_id: str, prompt: str, deadline: Optional[float]) -> Dict[str, Any]:
+        """
+        Send a prompt to the Makkaizou API.
+        
+        Args:
+            talk_id: Talk ID for Makkaizou.
+            prompt: Prompt to process.
+            deadline: Unix time after which no retry is started.
             
         Returns:
             Dict[str, Any]: Response from Makkaizou API.
@@ -71,49 +142,59 @@ class MakkaizouService:
             "talk_id": talk_id
         }
         
+        # Fail fast while Makkaizou is known to be down
+        breaker = makkaizou_circuit_breaker if settings.MAKKAIZOU_BREAKER_ENABLED else None
+        start_time = time.perf_counter()
+        
         try:
-            # Send the request to Makkaizou API
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.api_url,
-                    data=form_data,
-                    headers=headers,
-                    timeout=30.0  # 30 seconds timeout
+            # Retry only failures Makkaizou certainly did not process, since a
+            # repeated prompt would be added to the talk twice
+            result = await makkaizou_retry_policy.run(
+                partial(self._send_request, form_data, headers, breaker),
+                idempotent=False,
+                deadline=deadline
+            )
+            
+            logger.info(f"Received response from Makkaizou API: {json.dumps(result)[:100]}...")
+            
+            # Check if there's an error in the response
+            if "error_code" in result:
+                error_message = f"Makkaizou API error: {result.get('error_code')} - {result.get('message', 'Unknown error')}"
+                await log_error(
+                    self.db,
+                    "MakkaizouAPIError",
+                    error_message,
+                    None,
+                    {"talk_id": talk_id, "prompt": prompt}
                 )
                 
-                # Check if the request was successful
-                response.raise_for_status()
-                
-                # Parse the response
-                result = response.json()
-                
-                logger.info(f"Received response from Makkaizou API: {json.dumps(result)[:100]}...")
-                
-                # Check if there's an error in the response
-                if "error_code" in result:
-                    error_message = f"Makkaizou API error: {result.get('error_code')} - {result.get('message', 'Unknown error')}"
-                    log_error(
-                        self.db,
-                        "MakkaizouAPIError",
-                        error_message,
-                        None,
-                        {"talk_id": talk_id, "prompt": prompt}
-                    )
-                    
-                    return {
-                        "status": "error",
-                        "error": error_message
-                    }
-                
                 return {
-                    "status": "success",
-                    "response": result
+                    "status": "error",
+                    "error": error_message
                 }
+            
+            if settings.RESPONSE_CACHE_ENABLED:
+                latency_ms = int((time.perf_counter() - start_time) * 1000)
+                response_cache.set(self.learning_model_code, talk_id, prompt, result, latency_ms)
+            
+            return {
+                "status": "success",
+                "response": result
+            }
+        
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping Makkaizou request: {str(e)}")
+            
+            return {
+                "status": "error",
+                "error": str(e),
+                "circuit_open": True
+            }
         
         except httpx.HTTPStatusError as e:
             # Handle HTTP errors
             error_message = f"HTTP error: {e.response.status_code} - {e.response.text}"
-            log_error(
+            await log_error(
                 self.db,
                 "MakkaizouAPIHTTPError",
                 error_message,
@@ -129,7 +210,7 @@ class MakkaizouService:
         except httpx.RequestError as e:
             # Handle request errors (connection, timeout, etc.)
             error_message = f"Request error: {str(e)}"
-            log_error(
+            await log_error(
                 self.db,
                 "MakkaizouAPIRequestError",
                 error_message,
@@ -145,7 +226,7 @@ class MakkaizouService:
         except Exception as e:
             # Handle other errors
             error_message = f"Unexpected error: {str(e)}"
-            log_error(
+            await log_error(
                 self.db,
                 "MakkaizouAPIUnexpectedError",
                 error_message,
@@ -156,4 +237,94 @@ class MakkaizouService:
             return {
                 "status": "error",
                 "error": error_message
-            } 
\ No newline at end of file
+            }
+    
+    async def _send_request(
+        self,
+        form_data: Dict[str, Any],
+        headers: Dict[str, str],
+        breaker: Optional[CircuitBreaker]
+    ) -> Dict[str, Any]:
+        """
+        Send one request to the Makkaizou API through the shared connection pool.
+        
+        Args:
+            form_data: Form data to send.
+            headers: Request headers.
+            breaker: Circuit breaker guarding the request, or None.
+            
+        Returns:
+            Dict[str, Any]: Parsed response body.
+            
+        Raises:
+            CircuitOpenError: If the circuit breaker rejects the request.
+            httpx.HTTPStatusError: If Makkaizou API returns an error status.
+            httpx.RequestError: If the request could not be completed.
+        """
+        request_options = {}
+        
+        if breaker is not None:
+            breaker.before_call()
+            
+            # Wait for the response only as long as recent requests suggest
+            pool_timeout = makkaizou_http_client.timeout
+            request_options["timeout"] = httpx.Timeout(
+                connect=pool_timeout.connect,
+                read=breaker.timeout(),
+                write=pool_timeout.write,
+                pool=pool_timeout.pool
+            )
+        
+        start_time = time.perf_counter()
+        failed = True
+        timed_out = False
+        
+        try:
+            with tracer.span("makkaizou.request", kind=SPAN_KIND_CLIENT, **{"http.method": "POST"}) as span:
+                response = await makkaizou_http_client.post(
+                    self.api_url,
+                    data=form_data,
+                    headers=headers,
+                    **request_options
+                )
+                span.set_attribute("http.status_code", response.status_code)
+                
+                # Check if the request was successful
+                response.raise_for_status()
+            
+            # Parse the response
+            result = response.json()
+            failed = False
+            
+            return result
+        
+        except httpx.HTTPStatusError as e:
+            # Client errors mean Makkaizou is up; only server errors and throttling trip the circuit
+            failed = e.response.status_code >= 500 or e.response.status_code == 429
+            raise
+        
+        except httpx.TimeoutException:
+            timed_out = True
+            raise
+        
+        finally:
+            if breaker is not None:
+                self._record_request(breaker, failed, timed_out, time.perf_counter() - start_time)
+    
+    @staticmethod
+    def _record_request(breaker: CircuitBreaker, failed: bool, timed_out: bool, duration: float) -> None:
+        """
+        Record the outcome of a Makkaizou request in the circuit breaker.
+        
+        Args:
+            breaker: Circuit breaker.
+            failed: Whether the request failed.
+            timed_out: Whether the request failed by timing out.
+            duration: Duration of the request in seconds.
+        """
+        if not failed:
+            breaker.record_success(duration)
+        elif timed_out:
+            breaker.record_failure(duration)
+        else:
+            breaker.record_failure()
@@ -1,30 +1,84 @@
 import time
-from sqlalchemy.orm import Session
-from typing import Dict, Any, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Dict, Any, Hashable, List, NamedTuple, Optional
 
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.services.event_dedup import event_deduplicator
+from app.services.event_scheduler import event_scheduler
 from app.services.line_service import LineService
 from app.services.makkaizou_service import MakkaizouService
+from app.services.outbox import outbox_sender
+from app.services.rate_limiter import CONFIG_SCOPE, GROUP_SCOPE, USER_SCOPE, rate_limiter
+from app.utils.debounce import Debouncer
 from app.utils.validators import LineWebhookEvent, is_mention_event, extract_group_id, extract_user_id, extract_message_text
-from app.utils.logging import log_message, log_error, logger
+from app.utils.logging import log_message, log_error, get_exception_traceback, logger
+from app.utils.metrics import events_total, stage_duration
+from app.utils.tracing import tracer
+
+class Mention(NamedTuple):
+    """Mention of the LINE Official Account waiting to be answered."""
+    
+    group_id: str
+    user_id: str
+    message_text: str
+    reply_token: str
+    reply_deadline: float
+    received_at: float
 
 class MessageService:
     """Service for processing messages."""
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, line_service: LineService, makkaizou_service: MakkaizouService):
         """
         Initialize the message service.
         
+        Use `MessageService.create` to build the services from the default configuration.
+        
         Args:
-            db: Database session.
+            db: Async database session.
+            line_service: LINE service to reply with.
+            makkaizou_service: Makkaizou service to process prompts with.
         """
         self.db = db
-        self.line_service = LineService(db)
-        self.makkaizou_service = MakkaizouService(db)
+        self.line_service = line_service
+        self.makkaizou_service = makkaizou_service
+    
+    @classmethod
+    async def create(cls, db: AsyncSession) -> "MessageService":
+        """
+        Create a message service using the default LINE account and Makkaizou configuration.
+        
+        Args:
+            db: Async database session.
+            
+        Returns:
+            MessageService: The message service.
+        """
+        line_service = await LineService.create(db)
+        makkaizou_service = await MakkaizouService.create(db)
+        return cls(db, line_service, makkaizou_service)
     
     async def process_event(self, event: LineWebhookEvent) -> Dict[str, Any]:
         """
         Process a LINE webhook event.
         
+        Args:
+            event: LINE webhook event.
+            
+        Returns:
+            Dict[str, Any]: Processing result.
+        """
+        with tracer.span("message.process_event", webhook_event_id=event.webhookEventId) as span:
+            result = await self._count_outcome(self._process_event(event))
+            span.set_attribute("status", result["status"])
+        
+        return result
+    
+    async def _process_event(self, event: LineWebhookEvent) -> Dict[str, Any]:
+        """
+        Process a LINE webhook event, see `process_event`.
+        
         Args:
             event: LINE webhook event.
             
@@ -39,22 +93,56 @@ class MessageService:
             logger.debug("Event is not a mention event, ignoring")
             return {"status": "ignored", "reason": "not_mention_event"}
         
+        if not settings.EVENT_DEDUP_ENABLED:
+            return await self._process_mention(event, start_time)
+        
+        # Skip events LINE redelivered after we already took them on
+        if not await event_deduplicator.claim(self.db, event):
+            logger.info(f"Skipping duplicate webhook event {event.webhookEventId}")
+            return {"status": "ignored", "reason": "duplicate_event"}
+        
+        try:
+            result = await self._process_mention(event, start_time)
+        
+        except Exception:
+            # Let LINE's redelivery of the event be processed again
+            await event_deduplicator.release(self.db, event)
+            raise
+        
+        await event_deduplicator.complete(self.db, event)
+        return result
+    
+    async def _process_mention(self, event: LineWebhookEvent, start_time: float) -> Dict[str, Any]:
+        """
+        Answer a mention event, or hand it to the debouncer.
+        
+        Args:
+            event: LINE webhook event mentioning the bot.
+            start_time: Unix time processing started.
+            
+        Returns:
+            Dict[str, Any]: Processing result.
+        """
         # Extract information from the event
         group_id = extract_group_id(event)
         user_id = extract_user_id(event)
         message_text = extract_message_text(event)
         reply_token = event.replyToken
         
+        # LINE accepts the reply token only for a limited time after the event
+        reply_deadline = event.timestamp / 1000 + settings.LINE_REPLY_TOKEN_TTL
+        
         # Check if we have all the required information
         if not group_id or not user_id or not message_text or not reply_token:
             logger.warning("Missing required information from event")
             return {"status": "error", "reason": "missing_information"}
         
         # Get or create the LINE group
-        line_group = self.line_service.get_or_create_line_group(group_id)
+        with stage_duration.time(stage="group_lookup"), tracer.span("message.group_lookup"):
+            line_group = await self.line_service.get_or_create_line_group(group_id)
         
         # Log the message
-        log_message(
+        await log_message(
             self.db,
             group_id,
             user_id,
@@ -62,20 +150,91 @@ class MessageService:
             is_mention=True
         )
         
+        mention = Mention(group_id, user_id, message_text, reply_token, reply_deadline, start_time)
+        
+        # Wait for more mentions of the same user and answer them together
+        if mention_debouncer.running:
+            pending_mentions = mention_debouncer.add((group_id, user_id), mention)
+            logger.debug(f"Debouncing mention of {user_id} in {group_id} ({pending_mentions} pending)")
+            return {"status": "debounced", "pending_mentions": pending_mentions}
+        
+        return await self._answer(line_group.makkaizou_talk_id, [mention])
+    
+    async def process_mentions(self, mentions: List[Mention]) -> Dict[str, Any]:
+        """
+        Answer mentions of one user, merged into a single prompt.
+        
+        Args:
+            mentions: Mentions of the same user and group, oldest first.
+            
+        Returns:
+            Dict[str, Any]: Processing result.
+        """
+        with tracer.span("message.process_mentions", mentions=len(mentions)) as span:
+            with stage_duration.time(stage="group_lookup"), tracer.span("message.group_lookup"):
+                line_group = await self.line_service.get_or_create_line_group(mentions[0].group_id)
+            
+            result = await self._count_outcome(self._answer(line_group.makkaizou_talk_id, mentions))
+            span.set_attribute("status", result["status"])
+        
+        return result
+    
+    async def _answer(self, talk_id: str, mentions: List[Mention]) -> Dict[str, Any]:
+        """
+        Send the merged mentions to Makkaizou and answer them once.
+        
+        The answer is sent with the newest reply token, which expires last.
+        LINE has no way to give back the older reply tokens; they are left to
+        expire unused.
+        
+        Args:
+            talk_id: Makkaizou talk ID of the group.
+            mentions: Mentions of the same user and group, oldest first.
+            
+        Returns:
+            Dict[str, Any]: Processing result.
+        """
+        start_time = mentions[0].received_at
+        group_id = mentions[0].group_id
+        user_id = mentions[0].user_id
+        message_text = "\n".join(mention.message_text for mention in mentions)
+        reply_token = mentions[-1].reply_token
+        reply_deadline = mentions[-1].reply_deadline
+        
+        if len(mentions) > 1:
+            logger.info(f"Merged {len(mentions)} mentions of {user_id} in {group_id} into one prompt")
+        
+        # Keep noisy users and groups from using up the Makkaizou quota of everyone else
+        if settings.RATE_LIMIT_ENABLED:
+            makkaizou_config = self.makkaizou_service.makkaizou_config
+            throttled_scope = await rate_limiter.acquire(self.db, {
+                USER_SCOPE: user_id,
+                GROUP_SCOPE: group_id,
+                CONFIG_SCOPE: str(makkaizou_config.id) if makkaizou_config else "default"
+            })
+            
+            if throttled_scope is not None:
+                return await self._throttle(throttled_scope, mentions, message_text)
+        
         # Process the message with Makkaizou
         makkaizou_request = {
             "external_integration_key": self.makkaizou_service.api_key,
             "learning_model_code": self.makkaizou_service.learning_model_code,
             "message": message_text,
-            "talk_id": line_group.makkaizou_talk_id
+            "talk_id": talk_id
         }
         
         logger.info(f"Processing message with Makkaizou: {message_text}")
         
-        makkaizou_response = await self.makkaizou_service.process_prompt(
-            line_group.makkaizou_talk_id,
-            message_text
-        )
+        with stage_duration.time(stage="makkaizou"), tracer.span("makkaizou.process_prompt") as span:
+            makkaizou_response = await self.makkaizou_service.process_prompt(
+                talk_id,
+                message_text,
+                deadline=reply_deadline
+            )
+            span.set_attribute("status", makkaizou_response["status"])
+            span.set_attribute("cache_hit", makkaizou_response.get("cache_hit", False))
+            span.set_attribute("coalesced", makkaizou_response.get("coalesced", False))
         
         # Check if Makkaizou processing was successful
         if makkaizou_response["status"] == "success":
@@ -83,13 +242,13 @@ class MessageService:
             response_text = self._extract_response_text(makkaizou_response["response"])
             
             # Send the response back to LINE
-            line_response = self.line_service.send_reply(reply_token, response_text)
+            line_response = await self._send_answer(reply_token, group_id, response_text, reply_deadline)
             
             # Calculate processing time
             processing_time_ms = int((time.time() - start_time) * 1000)
             
             # Update the message log
-            log_message(
+            await log_message(
                 self.db,
                 group_id,
                 user_id,
@@ -98,7 +257,10 @@ class MessageService:
                 makkaizou_request=makkaizou_request,
                 makkaizou_response=makkaizou_response["response"],
                 line_response_status=line_response["status"],
-                processing_time_ms=processing_time_ms
+                processing_time_ms=processing_time_ms,
+                cache_hit=makkaizou_response.get("cache_hit", False),
+                latency_saved_ms=makkaizou_response.get("latency_saved_ms"),
+                coalesced=makkaizou_response.get("coalesced", False)
             )
             
             return {
@@ -113,23 +275,24 @@ class MessageService:
             
             # Send an error message to LINE
             fallback_message = "I'm sorry, but I'm having trouble processing your request. Please try again later."
-            line_response = self.line_service.send_reply(reply_token, fallback_message)
+            line_response = await self._send_answer(reply_token, group_id, fallback_message, reply_deadline)
             
             # Calculate processing time
             processing_time_ms = int((time.time() - start_time) * 1000)
             
-            # Log the error
-            log_error(
-                self.db,
-                "MakkaizouProcessingError",
-                error_message,
-                None,
-                makkaizou_request,
-                group_id
-            )
+            # Log the error, unless the request was skipped because Makkaizou is down
+            if not makkaizou_response.get("circuit_open"):
+                await log_error(
+                    self.db,
+                    "MakkaizouProcessingError",
+                    error_message,
+                    None,
+                    makkaizou_request,
+                    group_id
+                )
             
             # Update the message log
-            log_message(
+            await log_message(
                 self.db,
                 group_id,
                 user_id,
@@ -148,6 +311,106 @@ class MessageService:
                 "line_response": line_response
             }
     
+    async def _throttle(self, scope: str, mentions: List[Mention], message_text: str) -> Dict[str, Any]:
+        """
+        Answer mentions over the rate limit without calling Makkaizou.
+        
+        Args:
+            scope: Scope whose rate limit was reached.
+            mentions: Mentions of the same user and group, oldest first.
+            message_text: Prompt the mentions would have been sent as.
+            
+        Returns:
+            Dict[str, Any]: Processing result.
+        """
+        group_id = mentions[0].group_id
+        logger.info(f"Rate limit of {scope} reached, not sending the mention of {mentions[0].user_id} in {group_id}")
+        
+        if settings.RATE_LIMIT_THROTTLED_MESSAGE:
+            line_response = await self._send_answer(
+                mentions[-1].reply_token,
+                group_id,
+                settings.RATE_LIMIT_THROTTLED_MESSAGE,
+                mentions[-1].reply_deadline
+            )
+        else:
+            line_response = {"status": "skipped"}
+        
+        processing_time_ms = int((time.time() - mentions[0].received_at) * 1000)
+        
+        # Update the message log
+        await log_message(
+            self.db,
+            group_id,
+            mentions[0].user_id,
+            message_text,
+            is_mention=True,
+            makkaizou_response={"error": "rate_limited", "scope": scope},
+            line_response_status=line_response["status"],
+            processing_time_ms=processing_time_ms
+        )
+        
+        return {
+            "status": "throttled",
+            "scope": scope,
+            "processing_time_ms": processing_time_ms,
+            "line_response": line_response
+        }
+    
+    async def _count_outcome(self, processing: Awaitable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Count the outcome of processing in the event metrics.
+        
+        Args:
+            processing: Awaitable returning the processing result.
+            
+        Returns:
+            Dict[str, Any]: Processing result.
+        """
+        try:
+            with stage_duration.time(stage="process_event"):
+                result = await processing
+        
+        except Exception:
+            events_total.inc(outcome="exception")
+            raise
+        
+        events_total.inc(outcome=result["status"])
+        return result
+    
+    async def _send_answer(self, reply_token: str, group_id: str, message: str, reply_deadline: float) -> Dict[str, Any]:
+        """
+        Send an answer through the outbox, or directly if the outbox sender is not running.
+        
+        Args:
+            reply_token: Reply token from the webhook event.
+            group_id: LINE group ID.
+            message: Message to send.
+            reply_deadline: Unix time at which the reply token expires.
+            
+        Returns:
+            Dict[str, Any]: Enqueue or delivery result.
+        """
+        if outbox_sender.running:
+            line_account = self.line_service.line_account
+            
+            try:
+                return await outbox_sender.enqueue(
+                    self.db,
+                    line_account.id if line_account else None,
+                    group_id,
+                    reply_token,
+                    reply_deadline,
+                    message
+                )
+            
+            except Exception as e:
+                # Deliver the answer directly rather than lose it
+                await self.db.rollback()
+                logger.error(f"Could not write answer to the outbox: {str(e)}")
+        
+        return await self.line_service.deliver(reply_token, group_id, message, reply_deadline)
+    
     def _extract_response_text(self, makkaizou_response: Dict[str, Any]) -> str:
         """
         Extract the response text from the Makkaizou response.
@@ -186,4 +449,45 @@ class MessageService:
         
         # If the response format is different, log a warning and return a fallback message
         logger.warning(f"Could not extract response text from Makkaizou response: {makkaizou_response}")
-        return "I'm sorry, but I couldn't generate a proper response. Please try again." 
\ No newline at end of file
+        return "I'm sorry, but I couldn't generate a proper response. Please try again." 
+
+async def answer_mentions(key: Hashable, mentions: List[Mention]) -> None:
+    """
+    Answer a batch of debounced mentions with its own database session.
+    
+    The batch runs behind the other events of its group when the event
+    scheduler is running. Errors are logged instead of raised.
+    
+    Args:
+        key: Group and user ID of the mentions.
+        mentions: Mentions of the same user and group, oldest first.
+    """
+    async def answer() -> None:
+        async with AsyncSessionLocal() as db:
+            try:
+                message_service = await MessageService.create(db)
+                await message_service.process_mentions(mentions)
+            
+            except Exception as e:
+                # Discard any failed transaction so the error can be logged
+                await db.rollback()
+                await log_error(
+                    db,
+                    "EventProcessingError",
+                    str(e),
+                    get_exception_traceback(),
+                    {"mentions": [mention._asdict() for mention in mentions]},
+                    mentions[0].group_id
+                )
+    
+    if event_scheduler.running:
+        await event_scheduler.submit(mentions[0].group_id, answer)
+    else:
+        await answer()
+
+# Application-wide mention debouncer, started in the FastAPI lifespan when MENTION_DEBOUNCE_ENABLED is set
+mention_debouncer = Debouncer(
+    window_seconds=settings.MENTION_DEBOUNCE_SECONDS,
+    max_items=settings.MENTION_DEBOUNCE_MAX_MESSAGES,
+    flush=answer_mentions
+)
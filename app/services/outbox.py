@@ -0,0 +1,472 @@
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal
+from app.database.models import LineAccount, OutboxMessage
+from app.services.config_cache import config_cache
+from app.services.line_service import LineService
+from app.utils.logging import logger
+from app.utils.rate_limit import TokenBucket
+
+PENDING = "pending"
+SENT = "sent"
+FAILED = "failed"
+
+# Delivery method of a row whose reply may have reached LINE although it failed
+UNCERTAIN_REPLY = "uncertain"
+
+# Seconds between deletions of sent messages past their retention
+PURGE_INTERVAL = 3600
+
+def to_timestamp(value: datetime) -> float:
+    """
+    Convert a database datetime to Unix time.
+
+    SQLite returns naive datetimes, which are stored in UTC.
+
+    Args:
+        value: Datetime read from the database.
+
+    Returns:
+        float: Unix time.
+    """
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class OutboxSender:
+    """
+    Background sender of the `outbox_messages` table.
+
+    Answers are written to the outbox in the same place they used to be sent,
+    so an answer survives a crash between Makkaizou responding and LINE being
+    called. The sender claims due rows in batches with `FOR UPDATE SKIP
+    LOCKED` on PostgreSQL, so several workers never claim the same row.
+    A claim moves the row's `next_attempt_at` forward by a lease instead of
+    changing its status: if the worker dies while sending, the row becomes due
+    again once the lease ends.
+
+    Rows are sent with bounded concurrency and a token bucket per LINE account.
+    Failed rows are retried with exponential backoff until `max_attempts`.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        batch_size: int,
+        max_concurrency: int,
+        rate_limit: float,
+        rate_burst: int,
+        poll_interval: float,
+        lease_seconds: float,
+        max_attempts: int,
+        retry_delay: float,
+        retention_seconds: float
+    ):
+        """
+        Initialize the outbox sender.
+
+        Args:
+            session_factory: Factory for the sessions used by the sender.
+            batch_size: Maximum number of rows claimed at once.
+            max_concurrency: Maximum number of messages sent at once.
+            rate_limit: Messages per second per LINE account.
+            rate_burst: Messages per LINE account that may be sent at once.
+            poll_interval: Seconds between checks for due rows when no message is enqueued.
+            lease_seconds: Seconds a claimed row is reserved for the worker sending it.
+            max_attempts: Attempts before a message is marked as failed.
+            retry_delay: Delay before the first retry in seconds, doubled for each further retry.
+            retention_seconds: Seconds sent rows are kept.
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        self.rate_limit = rate_limit
+        self.rate_burst = rate_burst
+        self.poll_interval = poll_interval
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retention_seconds = retention_seconds
+
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._sending: Dict[int, asyncio.Task] = {}
+        self._stopping = False
+        self._rate_limiters: Dict[Optional[int], TokenBucket] = {}
+        self._last_purge = time.monotonic()
+        self._enqueued = 0
+        self._claimed = 0
+        self._sent = 0
+        self._retried = 0
+        self._failed = 0
+        self._rate_limited = 0
+        self._lease_renewals = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the sender has been started."""
+        return self._task is not None
+
+    async def start(self) -> None:
+        """Start the sender task."""
+        if self.running:
+            return
+
+        # Created here so it belongs to the running event loop
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="outbox-sender")
+        logger.info(f"Started outbox sender (max_concurrency={self.max_concurrency})")
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Send the due messages and stop the sender.
+
+        Messages that are not sent within the timeout stay in the outbox and are
+        sent after the next start, or by another worker.
+
+        Args:
+            timeout: Seconds to wait for the due messages to be sent.
+        """
+        if not self.running:
+            return
+
+        self._stopping = True
+        self._wake.set()
+
+        # wait_for cancels the task on timeout; claimed rows become due again when their lease ends
+        try:
+            await asyncio.wait_for(self._task, timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox sender did not finish in time, leaving messages in the outbox")
+        finally:
+            self._task = None
+
+        logger.info("Stopped outbox sender")
+
+    async def enqueue(
+        self,
+        db: AsyncSession,
+        line_account_id: Optional[int],
+        line_group_id: str,
+        reply_token: Optional[str],
+        reply_deadline: Optional[float],
+        message: str
+    ) -> Dict[str, Any]:
+        """
+        Add a message to the outbox.
+
+        Args:
+            db: Async database session.
+            line_account_id: LINE account to send with, or None for the default one.
+            line_group_id: Group to push to if the reply token cannot be used.
+            reply_token: Reply token from the webhook event.
+            reply_deadline: Unix time at which the reply token expires.
+            message: Message to send.
+
+        Returns:
+            Dict[str, Any]: Enqueue result with the outbox row ID.
+        """
+        outbox_message = OutboxMessage(
+            line_account_id=line_account_id,
+            line_group_id=line_group_id,
+            reply_token=reply_token,
+            reply_expires_at=datetime.fromtimestamp(reply_deadline, timezone.utc) if reply_deadline else None,
+            message=message,
+            retry_key=str(uuid.uuid4()),
+            status=PENDING,
+            attempts=0,
+            next_attempt_at=datetime.now(timezone.utc)
+        )
+        db.add(outbox_message)
+        await db.commit()
+
+        self._enqueued += 1
+        self._wake.set()
+
+        return {"status": "queued", "outbox_id": outbox_message.id}
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get sender statistics.
+
+        Returns:
+            Dict[str, Any]: Sender statistics.
+        """
+        return {
+            "running": self.running,
+            "in_flight": len(self._sending),
+            "max_concurrency": self.max_concurrency,
+            "enqueued": self._enqueued,
+            "claimed": self._claimed,
+            "sent": self._sent,
+            "retried": self._retried,
+            "failed": self._failed,
+            "rate_limited": self._rate_limited,
+            "lease_renewals": self._lease_renewals
+        }
+
+    async def _run(self) -> None:
+        """Claim due messages whenever a send slot is free, until the sender is stopped."""
+        renewal = asyncio.create_task(self._renew_leases())
+
+        try:
+            while True:
+                self._wake.clear()
+
+                if await self._claim_free_slots():
+                    continue
+
+                if self._stopping and not self._sending:
+                    return
+
+                if not self._sending:
+                    await self._purge_sent()
+
+                # Woken by new messages and by finished sends freeing a slot
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        finally:
+            # Only sends cut short by a stop timeout are left; their leases run out
+            renewal.cancel()
+            for task in self._sending.values():
+                task.cancel()
+            await asyncio.gather(renewal, *self._sending.values(), return_exceptions=True)
+            self._sending.clear()
+
+    async def _claim_free_slots(self) -> bool:
+        """
+        Claim due messages for the free send slots and start sending them.
+
+        Returns:
+            bool: True if messages were claimed.
+        """
+        free_slots = self.max_concurrency - len(self._sending)
+        if free_slots <= 0:
+            return False
+
+        try:
+            async with self.session_factory() as db:
+                outbox_messages = await self._claim(db, min(self.batch_size, free_slots))
+        except Exception as e:
+            logger.error(f"Could not claim outbox messages: {str(e)}")
+            return False
+
+        for outbox_message in outbox_messages:
+            self._sending[outbox_message.id] = asyncio.create_task(self._send(outbox_message))
+
+        return bool(outbox_messages)
+
+    async def _claim(self, db: AsyncSession, limit: int) -> List[OutboxMessage]:
+        """
+        Claim due messages.
+
+        Args:
+            db: Async database session.
+            limit: Maximum number of messages to claim.
+
+        Returns:
+            List[OutboxMessage]: Claimed messages.
+        """
+        now = datetime.now(timezone.utc)
+        due = (OutboxMessage.status == PENDING, OutboxMessage.next_attempt_at <= now)
+
+        # SKIP LOCKED lets concurrent workers claim different rows; SQLite ignores it
+        result = await db.execute(
+            select(OutboxMessage)
+            .where(*due)
+            .order_by(OutboxMessage.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        outbox_messages = list(result.scalars().all())
+
+        if outbox_messages:
+            # Rows another worker claimed since the select are no longer due and are skipped
+            result = await db.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([outbox_message.id for outbox_message in outbox_messages]), *due)
+                .values(next_attempt_at=now + timedelta(seconds=self.lease_seconds))
+                .returning(OutboxMessage.id)
+                .execution_options(synchronize_session=False)
+            )
+            claimed_ids = set(result.scalars().all())
+            outbox_messages = [outbox_message for outbox_message in outbox_messages if outbox_message.id in claimed_ids]
+
+        await db.commit()
+        self._claimed += len(outbox_messages)
+
+        return outbox_messages
+
+    async def _renew_leases(self) -> None:
+        """Extend the leases of the messages being sent, three times per lease."""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+
+            if not self._sending:
+                continue
+
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(OutboxMessage)
+                        .where(OutboxMessage.id.in_(list(self._sending)), OutboxMessage.status == PENDING)
+                        .values(next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=self.lease_seconds))
+                        .execution_options(synchronize_session=False)
+                    )
+                    await db.commit()
+                self._lease_renewals += 1
+
+            except Exception as e:
+                logger.warning(f"Could not renew the leases of outbox messages: {str(e)}")
+
+    async def _send(self, outbox_message: OutboxMessage) -> None:
+        """
+        Send a claimed message and record the outcome.
+
+        Args:
+            outbox_message: Claimed message.
+        """
+        try:
+            async with self.session_factory() as db:
+                try:
+                    result = await self._deliver(db, outbox_message)
+                except Exception as e:
+                    logger.error(f"Could not send outbox message {outbox_message.id}: {str(e)}")
+                    await db.rollback()
+                    result = {"status": "error", "error": str(e)}
+
+                await self._record(db, outbox_message, result)
+
+        except Exception as e:
+            # The lease runs out and another attempt picks the message up
+            logger.error(f"Could not update outbox message {outbox_message.id}: {str(e)}")
+
+        finally:
+            self._sending.pop(outbox_message.id, None)
+            self._wake.set()
+
+    async def _deliver(self, db: AsyncSession, outbox_message: OutboxMessage) -> Dict[str, Any]:
+        """
+        Deliver a message with its LINE account, respecting the account's rate limit.
+
+        Args:
+            db: Async database session.
+            outbox_message: Message to deliver.
+
+        Returns:
+            Dict[str, Any]: Delivery result.
+        """
+        line_account = await config_cache.get(db, LineAccount, outbox_message.line_account_id)
+
+        waited = await self._rate_limiter(outbox_message.line_account_id).acquire()
+        if waited > 0:
+            self._rate_limited += 1
+
+        reply_deadline = (
+            to_timestamp(outbox_message.reply_expires_at) if outbox_message.reply_expires_at else 0.0
+        )
+
+        line_service = LineService(db, line_account)
+        return await line_service.deliver(
+            outbox_message.reply_token,
+            outbox_message.line_group_id,
+            outbox_message.message,
+            reply_deadline,
+            outbox_message.retry_key,
+            reply_uncertain=outbox_message.delivery_method == UNCERTAIN_REPLY
+        )
+
+    async def _record(self, db: AsyncSession, outbox_message: OutboxMessage, result: Dict[str, Any]) -> None:
+        """
+        Mark a message as sent, or schedule its next attempt.
+
+        Args:
+            db: Async database session.
+            outbox_message: Message that was sent.
+            result: Delivery result.
+        """
+        attempts = outbox_message.attempts + 1
+        values = {"attempts": attempts, "delivery_method": result.get("method")}
+
+        # Remembered for the next attempts, which must not fall back to a push message
+        if result["status"] != "success" and (result.get("uncertain") or outbox_message.delivery_method == UNCERTAIN_REPLY):
+            values["delivery_method"] = UNCERTAIN_REPLY
+
+        if result["status"] == "success":
+            values.update(status=SENT, sent_at=datetime.now(timezone.utc), last_error=None)
+            self._sent += 1
+        elif attempts >= self.max_attempts or result.get("reason") == "invalid_reply_token":
+            # A rejected reply token cannot succeed later, e.g. with the push fallback disabled
+            values.update(status=FAILED, last_error=result.get("error"))
+            self._failed += 1
+            logger.error(f"Giving up on outbox message {outbox_message.id} after {attempts} attempts")
+        else:
+            delay = self.retry_delay * 2 ** (attempts - 1)
+            values.update(
+                next_attempt_at=datetime.now(timezone.utc) + timedelta(seconds=delay),
+                last_error=result.get("error")
+            )
+            self._retried += 1
+
+        await db.execute(update(OutboxMessage).where(OutboxMessage.id == outbox_message.id).values(**values))
+        await db.commit()
+
+    def _rate_limiter(self, line_account_id: Optional[int]) -> TokenBucket:
+        """
+        Get the rate limiter of a LINE account.
+
+        Args:
+            line_account_id: LINE account ID, or None for the default account.
+
+        Returns:
+            TokenBucket: The account's rate limiter.
+        """
+        rate_limiter = self._rate_limiters.get(line_account_id)
+        if rate_limiter is None:
+            rate_limiter = TokenBucket(rate=self.rate_limit, capacity=self.rate_burst)
+            self._rate_limiters[line_account_id] = rate_limiter
+
+        return rate_limiter
+
+    async def _purge_sent(self) -> None:
+        """Delete sent messages past their retention, at most once per purge interval."""
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+
+        self._last_purge = time.monotonic()
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.retention_seconds)
+
+        try:
+            async with self.session_factory() as db:
+                await db.execute(
+                    delete(OutboxMessage).where(OutboxMessage.status == SENT, OutboxMessage.sent_at < cutoff)
+                )
+                await db.commit()
+        except Exception as e:
+            logger.warning(f"Could not purge sent outbox messages: {str(e)}")
+
+# Application-wide outbox sender, started in the FastAPI lifespan
+outbox_sender = OutboxSender(
+    session_factory=AsyncSessionLocal,
+    batch_size=settings.OUTBOX_BATCH_SIZE,
+    max_concurrency=settings.OUTBOX_MAX_CONCURRENCY,
+    rate_limit=settings.OUTBOX_RATE_LIMIT,
+    rate_burst=settings.OUTBOX_RATE_BURST,
+    poll_interval=settings.OUTBOX_POLL_INTERVAL,
+    lease_seconds=settings.OUTBOX_LEASE_SECONDS,
+    max_attempts=settings.OUTBOX_MAX_ATTEMPTS,
+    retry_delay=settings.OUTBOX_RETRY_DELAY,
+    retention_seconds=settings.OUTBOX_RETENTION_SECONDS
+)
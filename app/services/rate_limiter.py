@@ -0,0 +1,295 @@
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import case, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.database import dialect_insert
+from app.database.models import RateLimitBucket
+from app.utils.cache import TTLCache
+from app.utils.logging import logger
+from app.utils.rate_limit import TokenBucket
+
+USER_SCOPE = "user"
+GROUP_SCOPE = "group"
+CONFIG_SCOPE = "config"
+
+MEMORY_BACKEND = "memory"
+DATABASE_BACKEND = "database"
+
+# Minimum seconds between deletions of idle buckets from the database
+PURGE_INTERVAL = 3600
+
+class RateLimit(NamedTuple):
+    """Token bucket settings of a scope."""
+
+    rate: float
+    burst: int
+
+    @property
+    def refill_seconds(self) -> float:
+        """Seconds an empty bucket takes to fill up, after which it can be forgotten."""
+        return self.burst / self.rate
+
+class MemoryBuckets:
+    """Token buckets of one scope, kept in the memory of this worker."""
+
+    def __init__(self, scope: str, limit: RateLimit, max_keys: int):
+        """
+        Initialize the buckets.
+
+        Args:
+            scope: Scope of the buckets.
+            limit: Token bucket settings.
+            max_keys: Maximum number of buckets kept. Idle buckets are full and
+                are forgotten after `limit.refill_seconds`.
+        """
+        self.scope = scope
+        self.limit = limit
+
+        self._buckets = TTLCache(max_size=max_keys, ttl=limit.refill_seconds)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    async def take(self, db: AsyncSession, key: str) -> bool:
+        """
+        Take a token from the bucket of a key.
+
+        Args:
+            db: Async database session, unused.
+            key: Key of the bucket.
+
+        Returns:
+            bool: True if a token was taken, False if the bucket is empty.
+        """
+        bucket = self._buckets.get(key) or TokenBucket(self.limit.rate, self.limit.burst)
+        taken = bucket.try_acquire()
+
+        # Keep the bucket until it would be full again
+        self._buckets.set(key, bucket)
+
+        return taken
+
+    async def give_back(self, db: AsyncSession, key: str) -> None:
+        """
+        Give back a token taken for a call that did not go ahead.
+
+        Args:
+            db: Async database session, unused.
+            key: Key of the bucket.
+        """
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            bucket.release()
+
+class DatabaseBuckets:
+    """
+    Token buckets of one scope, kept in the `rate_limit_buckets` table.
+
+    A token is taken with a single upsert that refills the bucket and takes
+    the token only if one is available, so the buckets are shared by all
+    workers and processes using the database.
+    """
+
+    def __init__(self, scope: str, limit: RateLimit):
+        """
+        Initialize the buckets.
+
+        Args:
+            scope: Scope of the buckets, used as prefix of the keys.
+            limit: Token bucket settings.
+        """
+        self.scope = scope
+        self.limit = limit
+
+        self._last_purge = time.monotonic()
+
+    async def take(self, db: AsyncSession, key: str) -> bool:
+        """
+        Take a token from the bucket of a key.
+
+        The change is committed by the caller.
+
+        Args:
+            db: Async database session.
+            key: Key of the bucket.
+
+        Returns:
+            bool: True if a token was taken, False if the bucket is empty.
+        """
+        now = time.time()
+        refilled = RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * self.limit.rate
+        refilled = case((refilled > self.limit.burst, self.limit.burst), else_=refilled)
+
+        statement = dialect_insert(db, RateLimitBucket).values(
+            key=f"{self.scope}:{key}",
+            tokens=self.limit.burst - 1,
+            updated_at=now
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=["key"],
+            set_={"tokens": refilled - 1, "updated_at": now},
+            where=refilled >= 1
+        ).returning(RateLimitBucket.key)
+
+        taken = (await db.execute(statement)).first() is not None
+
+        await self._purge_idle(db)
+
+        return taken
+
+    async def give_back(self, db: AsyncSession, key: str) -> None:
+        """
+        Give back a token taken for a call that did not go ahead.
+
+        The change is committed by the caller.
+
+        Args:
+            db: Async database session.
+            key: Key of the bucket.
+        """
+        await db.execute(
+            update(RateLimitBucket)
+            .where(RateLimitBucket.key == f"{self.scope}:{key}")
+            .values(tokens=RateLimitBucket.tokens + 1)
+        )
+
+    async def _purge_idle(self, db: AsyncSession) -> None:
+        """
+        Delete buckets that are full again, at most once per purge interval.
+
+        Args:
+            db: Async database session.
+        """
+        if time.monotonic() - self._last_purge < PURGE_INTERVAL:
+            return
+
+        self._last_purge = time.monotonic()
+
+        cutoff = time.time() - self.limit.refill_seconds
+        await db.execute(
+            delete(RateLimitBucket)
+            .where(RateLimitBucket.key.startswith(f"{self.scope}:"))
+            .where(RateLimitBucket.updated_at < cutoff)
+        )
+
+class RateLimiter:
+    """
+    Token-bucket rate limits per user, group and Makkaizou configuration.
+
+    A call goes ahead only if every scope has a token left for its key. Scopes
+    are checked in the order given, so the narrowest scope should come first;
+    when a later scope is exhausted, the tokens taken from the earlier ones are
+    given back. With the memory backend each worker limits on its own; the
+    database backend shares the buckets between workers at the cost of a
+    query per scope.
+    """
+
+    def __init__(self, limits: Dict[str, RateLimit], backend: str, max_keys: int):
+        """
+        Initialize the rate limiter.
+
+        Args:
+            limits: Token bucket settings per scope. Scopes with a rate of 0 are not limited.
+            backend: "memory" or "database".
+            max_keys: Maximum number of buckets kept per scope by the memory backend.
+        """
+        self.backend = DATABASE_BACKEND if backend == DATABASE_BACKEND else MEMORY_BACKEND
+
+        self._buckets: Dict[str, Any] = {}
+        for scope, limit in limits.items():
+            if limit.rate <= 0:
+                continue
+
+            if self.backend == DATABASE_BACKEND:
+                self._buckets[scope] = DatabaseBuckets(scope, limit)
+            else:
+                self._buckets[scope] = MemoryBuckets(scope, limit, max_keys)
+
+        self._allowed = 0
+        self._throttled = {scope: 0 for scope in self._buckets}
+        self._errors = 0
+
+    async def acquire(self, db: AsyncSession, keys: Dict[str, Optional[str]]) -> Optional[str]:
+        """
+        Take a token in every limited scope.
+
+        If the buckets cannot be read, the call is allowed, so a database
+        problem never stops mentions from being answered.
+
+        Args:
+            db: Async database session.
+            keys: Key of the call per scope, narrowest scope first. Scopes with
+                a key of None are not limited.
+
+        Returns:
+            Optional[str]: The scope whose limit was reached, or None if the call may go ahead.
+        """
+        taken: List[Tuple[Any, str]] = []
+
+        try:
+            for scope, key in keys.items():
+                buckets = self._buckets.get(scope)
+                if buckets is None or key is None:
+                    continue
+
+                if not await buckets.take(db, key):
+                    for taken_buckets, taken_key in taken:
+                        await taken_buckets.give_back(db, taken_key)
+
+                    await self._commit(db)
+                    self._throttled[scope] += 1
+                    return scope
+
+                taken.append((buckets, key))
+
+            await self._commit(db)
+
+        except Exception as e:
+            await db.rollback()
+            self._errors += 1
+            logger.warning(f"Could not check rate limits: {str(e)}")
+
+        self._allowed += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get rate limiter statistics.
+
+        Returns:
+            Dict[str, Any]: Rate limiter statistics.
+        """
+        stats = {
+            "backend": self.backend,
+            "allowed": self._allowed,
+            "throttled": dict(self._throttled),
+            "errors": self._errors,
+            "limits": {
+                scope: {"rate_per_minute": buckets.limit.rate * 60, "burst": buckets.limit.burst}
+                for scope, buckets in self._buckets.items()
+            }
+        }
+
+        if self.backend == MEMORY_BACKEND:
+            stats["buckets"] = {scope: len(buckets) for scope, buckets in self._buckets.items()}
+
+        return stats
+
+    async def _commit(self, db: AsyncSession) -> None:
+        """Commit the bucket changes of the database backend."""
+        if self.backend == DATABASE_BACKEND:
+            await db.commit()
+
+# Application-wide rate limiter, used when RATE_LIMIT_ENABLED is set
+rate_limiter = RateLimiter(
+    limits={
+        USER_SCOPE: RateLimit(settings.RATE_LIMIT_USER_PER_MINUTE / 60, settings.RATE_LIMIT_USER_BURST),
+        GROUP_SCOPE: RateLimit(settings.RATE_LIMIT_GROUP_PER_MINUTE / 60, settings.RATE_LIMIT_GROUP_BURST),
+        CONFIG_SCOPE: RateLimit(settings.RATE_LIMIT_CONFIG_PER_MINUTE / 60, settings.RATE_LIMIT_CONFIG_BURST)
+    },
+    backend=settings.RATE_LIMIT_BACKEND,
+    max_keys=settings.RATE_LIMIT_MAX_KEYS
+)
@@ -0,0 +1,119 @@
+import re
+import unicodedata
+from typing import Any, Dict, NamedTuple, Optional
+
+from app.config import settings
+from app.utils.cache import TTLCache
+
+GROUP_SCOPE = "group"
+GLOBAL_SCOPE = "global"
+
+# Punctuation that does not change the question, e.g. "Opening hours?" and "opening hours"
+_TRAILING_PUNCTUATION = "?!.,;:？！。、…"
+_WHITESPACE = re.compile(r"\s+")
+
+class CachedResponse(NamedTuple):
+    """Makkaizou response kept in the response cache."""
+
+    response: Dict[str, Any]
+    latency_ms: int
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so that trivially different questions share a cache entry.
+
+    Full-width characters are folded to their ASCII forms, case and runs of
+    whitespace are ignored, and trailing punctuation is dropped.
+
+    Args:
+        prompt: Prompt sent to Makkaizou.
+
+    Returns:
+        str: Normalized prompt.
+    """
+    prompt = unicodedata.normalize("NFKC", prompt).casefold()
+    prompt = _WHITESPACE.sub(" ", prompt).strip()
+    return prompt.rstrip(_TRAILING_PUNCTUATION + " ")
+
+class ResponseCache:
+    """
+    In-memory cache of Makkaizou responses to repeated prompts.
+
+    Entries are keyed by learning model and normalized prompt. With the group
+    scope, answers are only reused within the same talk; with the global
+    scope, every group asking the same question gets the same answer.
+    """
+
+    def __init__(self, max_size: int, ttl: float, scope: str):
+        """
+        Initialize the response cache.
+
+        Args:
+            max_size: Maximum number of cached responses.
+            ttl: Seconds a response is reused.
+            scope: "group" or "global".
+        """
+        self.scope = GLOBAL_SCOPE if scope == GLOBAL_SCOPE else GROUP_SCOPE
+
+        self._cache = TTLCache(max_size=max_size, ttl=ttl)
+        self._latency_saved_ms = 0
+
+    def get(self, learning_model_code: str, talk_id: str, prompt: str) -> Optional[CachedResponse]:
+        """
+        Get the cached response to a prompt.
+
+        Args:
+            learning_model_code: Makkaizou learning model.
+            talk_id: Makkaizou talk of the group.
+            prompt: Prompt sent to Makkaizou.
+
+        Returns:
+            Optional[CachedResponse]: The cached response, or None on a miss.
+        """
+        cached = self._cache.get(self._key(learning_model_code, talk_id, prompt))
+
+        if cached is not None:
+            self._latency_saved_ms += cached.latency_ms
+
+        return cached
+
+    def set(self, learning_model_code: str, talk_id: str, prompt: str, response: Dict[str, Any], latency_ms: int) -> None:
+        """
+        Cache the response to a prompt.
+
+        Args:
+            learning_model_code: Makkaizou learning model.
+            talk_id: Makkaizou talk of the group.
+            prompt: Prompt sent to Makkaizou.
+            response: Successful Makkaizou response.
+            latency_ms: Time Makkaizou took to respond, saved by each hit.
+        """
+        self._cache.set(self._key(learning_model_code, talk_id, prompt), CachedResponse(response, latency_ms))
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict[str, Any]: Cache statistics.
+        """
+        return {
+            **self._cache.stats(),
+            "scope": self.scope,
+            "latency_saved_ms": self._latency_saved_ms
+        }
+
+    def _key(self, learning_model_code: str, talk_id: str, prompt: str) -> tuple:
+        """Build the cache key of a prompt."""
+        return (
+            learning_model_code,
+            talk_id if self.scope == GROUP_SCOPE else None,
+            normalize_prompt(prompt)
+        )
+
+# Application-wide response cache, used when RESPONSE_CACHE_ENABLED is set
+response_cache = ResponseCache(
+    max_size=settings.RESPONSE_CACHE_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    scope=settings.RESPONSE_CACHE_SCOPE
+)
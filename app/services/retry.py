@@ -0,0 +1,260 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+
+import httpx
+from linebot.exceptions import LineBotApiError
+
+from app.config import settings
+from app.utils.logging import logger
+
+T = TypeVar("T")
+
+# Status codes meaning the request was rejected before it was processed
+REJECTED_STATUS_CODES = (429, 503)
+
+# Errors raised before the request reached the server
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+def is_retryable_error(error: Exception, idempotent: bool) -> bool:
+    """
+    Check whether a failed HTTP call may be retried.
+
+    Requests that never reached the server, and requests the server rejected
+    with 429 or 503, are always safe to retry. Other server errors and read
+    timeouts may have been processed already, so they are only retried for
+    idempotent requests.
+
+    Args:
+        error: Error raised by the call.
+        idempotent: Whether repeating the request has no further effect.
+
+    Returns:
+        bool: True if the call may be retried.
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status_code = error.response.status_code
+    elif isinstance(error, LineBotApiError):
+        status_code = error.status_code
+    elif isinstance(error, NOT_SENT_ERRORS):
+        return True
+    elif isinstance(error, httpx.RequestError):
+        return idempotent
+    else:
+        return False
+
+    return status_code in REJECTED_STATUS_CODES or (idempotent and status_code >= 500)
+
+def may_have_been_processed(error: Exception) -> bool:
+    """
+    Check whether a failed HTTP call may still have been processed by the server.
+
+    Read timeouts and server errors other than 503 leave it open whether the
+    request took effect; connection errors and 429/503 responses do not.
+
+    Args:
+        error: Error raised by the call.
+
+    Returns:
+        bool: True if the request may have taken effect.
+    """
+    return is_retryable_error(error, idempotent=True) and not is_retryable_error(error, idempotent=False)
+
+class RetryBudget:
+    """
+    Process-wide limit on retries, shared by every retry policy.
+
+    Within a sliding window, retries may make up at most `ratio` of the calls,
+    plus `min_retries` so that low traffic can still retry. When a dependency
+    fails for everyone, the budget runs out and calls fail after their first
+    attempt instead of multiplying the load on it.
+    """
+
+    def __init__(self, ratio: float, min_retries: int, window_seconds: float):
+        """
+        Initialize the retry budget.
+
+        Args:
+            ratio: Maximum retries per call within the window.
+            min_retries: Retries always allowed within the window.
+            window_seconds: Length of the sliding window in seconds.
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+
+        self._calls: deque = deque()
+        self._retries: deque = deque()
+        self._exhausted = 0
+
+    def record_call(self) -> None:
+        """Record a call, which adds `ratio` retries to the budget."""
+        self._calls.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        """
+        Take one retry from the budget.
+
+        Returns:
+            bool: True if the retry is allowed, False if the budget is exhausted.
+        """
+        self._expire()
+
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._calls):
+            self._exhausted += 1
+            return False
+
+        self._retries.append(time.monotonic())
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get retry budget statistics.
+
+        Returns:
+            Dict[str, Any]: Retry budget statistics.
+        """
+        self._expire()
+
+        return {
+            "calls_in_window": len(self._calls),
+            "retries_in_window": len(self._retries),
+            "available": max(int(self.min_retries + self.ratio * len(self._calls)) - len(self._retries), 0),
+            "exhausted": self._exhausted
+        }
+
+    def _expire(self) -> None:
+        """Forget calls and retries that left the window."""
+        cutoff = time.monotonic() - self.window_seconds
+        for timestamps in (self._calls, self._retries):
+            while timestamps and timestamps[0] < cutoff:
+                timestamps.popleft()
+
+class RetryPolicy:
+    """
+    Retries with capped exponential backoff and full jitter.
+
+    The delay before retry n is uniform between 0 and
+    `min(max_delay, base_delay * 2 ** (n - 1))`. A retry is skipped when the
+    error is not retryable, the shared budget is exhausted, or the delay would
+    end after the caller's deadline.
+    """
+
+    def __init__(self, name: str, max_attempts: int, base_delay: float, max_delay: float, budget: RetryBudget):
+        """
+        Initialize the retry policy.
+
+        Args:
+            name: Name used in logs and statistics.
+            max_attempts: Maximum number of attempts, including the first one.
+            base_delay: Backoff cap of the first retry in seconds.
+            max_delay: Maximum backoff in seconds.
+            budget: Retry budget shared with other policies.
+        """
+        self.name = name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget = budget
+
+        self._calls = 0
+        self._retries = 0
+        self._recovered = 0
+        self._budget_exhausted = 0
+        self._deadline_exceeded = 0
+
+    async def run(
+        self,
+        attempt: Callable[[], Awaitable[T]],
+        idempotent: bool,
+        deadline: Optional[float] = None
+    ) -> T:
+        """
+        Run a call, retrying it on retryable errors.
+
+        Args:
+            attempt: Coroutine function making one attempt.
+            idempotent: Whether repeating the call has no further effect.
+            deadline: Unix time after which the result is of no use, or None.
+
+        Returns:
+            T: Result of the first successful attempt.
+
+        Raises:
+            Exception: The error of the last attempt.
+        """
+        self._calls += 1
+        self.budget.record_call()
+
+        for attempt_number in range(1, self.max_attempts + 1):
+            try:
+                result = await attempt()
+
+                if attempt_number > 1:
+                    self._recovered += 1
+
+                return result
+
+            except Exception as e:
+                if attempt_number >= self.max_attempts or not is_retryable_error(e, idempotent):
+                    raise
+
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt_number - 1)))
+
+                if deadline is not None and time.time() + delay >= deadline:
+                    self._deadline_exceeded += 1
+                    raise
+
+                if not self.budget.try_spend():
+                    self._budget_exhausted += 1
+                    logger.warning(f"Retry budget exhausted, not retrying {self.name} call")
+                    raise
+
+                self._retries += 1
+                logger.info(
+                    f"Retrying {self.name} call in {delay:.2f}s "
+                    f"(attempt {attempt_number + 1}/{self.max_attempts}): {type(e).__name__}"
+                )
+
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get retry statistics.
+
+        Returns:
+            Dict[str, Any]: Retry statistics.
+        """
+        return {
+            "calls": self._calls,
+            "retries": self._retries,
+            "recovered": self._recovered,
+            "budget_exhausted": self._budget_exhausted,
+            "deadline_exceeded": self._deadline_exceeded
+        }
+
+# Retry budget shared by all outgoing API calls
+retry_budget = RetryBudget(
+    ratio=settings.RETRY_BUDGET_RATIO,
+    min_retries=settings.RETRY_BUDGET_MIN_RETRIES,
+    window_seconds=settings.RETRY_BUDGET_WINDOW
+)
+
+# Application-wide retry policies
+makkaizou_retry_policy = RetryPolicy(
+    name="makkaizou",
+    max_attempts=settings.MAKKAIZOU_MAX_ATTEMPTS,
+    base_delay=settings.RETRY_BASE_DELAY,
+    max_delay=settings.RETRY_MAX_DELAY,
+    budget=retry_budget
+)
+
+line_retry_policy = RetryPolicy(
+    name="line",
+    max_attempts=settings.LINE_MAX_ATTEMPTS,
+    base_delay=settings.RETRY_BASE_DELAY,
+    max_delay=settings.RETRY_MAX_DELAY,
+    budget=retry_budget
+)
@@ -4,7 +4,10 @@ from app.utils.validators import (
     LineWebhookEvent,
     LineWebhookRequest,
     is_mention_event,
+    may_mention_self,
+    parse_webhook_request,
     extract_group_id,
     extract_user_id,
-    extract_message_text
+    extract_message_text,
+    is_redelivery
 ) 
\ No newline at end of file
@@ -0,0 +1,120 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+class TTLCache:
+    """
+    Bounded in-memory cache with per-entry expiry and least-recently-used eviction.
+
+    Expired entries are only removed when they are read or evicted, so they
+    count towards `max_size` until then.
+    """
+
+    def __init__(self, max_size: int, ttl: Optional[float] = None):
+        """
+        Initialize the cache.
+
+        Args:
+            max_size: Maximum number of entries. The least recently used entry is
+                evicted when the cache is full.
+            ttl: Default time to live of an entry in seconds. None keeps entries
+                until they are evicted.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self._entries: "OrderedDict[Hashable, Tuple[Any, Optional[float]]]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get an entry and mark it as recently used.
+
+        Args:
+            key: Entry key.
+            default: Value returned when the entry is missing or expired.
+
+        Returns:
+            Any: The cached value, or `default`.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return value
+
+            del self._entries[key]
+
+        self._misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Add or replace an entry.
+
+        Args:
+            key: Entry key.
+            value: Value to cache.
+            ttl: Time to live in seconds, overriding the default.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove an entry.
+
+        Args:
+            key: Entry key.
+            default: Value returned when the entry is missing.
+
+        Returns:
+            Any: The removed value, or `default`.
+        """
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def keys(self) -> List[Hashable]:
+        """
+        Get the keys of the cached entries, including expired ones not yet removed.
+
+        Returns:
+            List[Hashable]: Entry keys, least recently used first.
+        """
+        return list(self._entries)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics.
+
+        Returns:
+            Dict[str, Any]: Cache statistics.
+        """
+        lookups = self._hits + self._misses
+
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self._hits,
+            "misses": self._misses,
+            "evictions": self._evictions,
+            "hit_rate": round(self._hits / lookups, 4) if lookups else 0.0
+        }
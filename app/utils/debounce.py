@@ -0,0 +1,176 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from app.utils.logging import logger
+
+Flush = Callable[[Hashable, List[Any]], Awaitable[None]]
+
+class Debouncer:
+    """
+    Collects items per key and hands them over in batches.
+
+    The first item of a key opens a batch; items with the same key added within
+    `window_seconds` join it. The batch is flushed when the window ends or
+    when it holds `max_items`, whichever comes first. Flushes run in their own
+    tasks, so `add` never waits for them, and `stop` flushes the batches
+    still open.
+    """
+
+    def __init__(self, window_seconds: float, max_items: int, flush: Flush):
+        """
+        Initialize the debouncer.
+
+        Args:
+            window_seconds: Seconds a batch stays open after its first item.
+            max_items: Number of items after which a batch is flushed right away.
+            flush: Coroutine function called with the key and the items of each batch.
+        """
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self.flush = flush
+
+        self._batches: Dict[Hashable, List[Any]] = {}
+        self._timers: Dict[Hashable, asyncio.Task] = {}
+        self._flushes: Set[asyncio.Task] = set()
+        self._running = False
+        self._items = 0
+        self._merged = 0
+        self._batches_flushed = 0
+        self._full_batches = 0
+        self._flush_errors = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the debouncer has been started."""
+        return self._running
+
+    async def start(self) -> None:
+        """
+        Start accepting items.
+        """
+        self._running = True
+
+        logger.info(f"Started debouncer with a {self.window_seconds}s window of up to {self.max_items} items")
+
+    async def stop(self, timeout: float) -> None:
+        """
+        Flush the open batches and wait for the flushes to finish.
+
+        Args:
+            timeout: Seconds to wait for the flushes. Flushes still running
+                after that are cancelled.
+        """
+        if not self._running:
+            return
+
+        self._running = False
+
+        for key in list(self._batches):
+            self._flush(key)
+
+        if self._flushes:
+            _, pending = await asyncio.wait(set(self._flushes), timeout=timeout)
+
+            if pending:
+                logger.warning(f"Debouncer drain timed out, cancelling {len(pending)} flushes")
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+        logger.info("Stopped debouncer")
+
+    def add(self, key: Hashable, item: Any) -> int:
+        """
+        Add an item to the open batch of its key, opening one if needed.
+
+        Args:
+            key: Key of the batch.
+            item: Item to add.
+
+        Returns:
+            int: Number of items in the batch after adding, or 0 if adding the
+                item filled the batch and flushed it.
+
+        Raises:
+            RuntimeError: If the debouncer has not been started.
+        """
+        if not self._running:
+            raise RuntimeError("Debouncer is not running")
+
+        self._items += 1
+
+        batch = self._batches.get(key)
+        if batch is None:
+            batch = self._batches[key] = []
+            self._timers[key] = asyncio.create_task(self._flush_later(key))
+        else:
+            self._merged += 1
+
+        batch.append(item)
+
+        if len(batch) >= self.max_items:
+            self._full_batches += 1
+            self._flush(key)
+            return 0
+
+        return len(batch)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get debouncer statistics.
+
+        Returns:
+            Dict[str, Any]: Debouncer statistics.
+        """
+        return {
+            "running": self._running,
+            "open_batches": len(self._batches),
+            "items": self._items,
+            "merged": self._merged,
+            "batches_flushed": self._batches_flushed,
+            "full_batches": self._full_batches,
+            "flush_errors": self._flush_errors
+        }
+
+    async def _flush_later(self, key: Hashable) -> None:
+        """
+        Flush a batch when its window ends.
+
+        Args:
+            key: Key of the batch.
+        """
+        await asyncio.sleep(self.window_seconds)
+        self._flush(key)
+
+    def _flush(self, key: Hashable) -> None:
+        """
+        Close a batch and start flushing it.
+
+        Args:
+            key: Key of the batch.
+        """
+        items = self._batches.pop(key)
+        timer: Optional[asyncio.Task] = self._timers.pop(key)
+
+        if timer is not asyncio.current_task():
+            timer.cancel()
+
+        task = asyncio.create_task(self._run_flush(key, items))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _run_flush(self, key: Hashable, items: List[Any]) -> None:
+        """
+        Hand a batch over, logging errors instead of raising them.
+
+        Args:
+            key: Key of the batch.
+            items: Items of the batch.
+        """
+        try:
+            await self.flush(key, items)
+            self._batches_flushed += 1
+
+        except Exception as e:
+            self._flush_errors += 1
+            logger.error(f"Error flushing batch of {len(items)} items: {str(e)}")
@@ -0,0 +1,179 @@
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple, Type
+
+from loguru import logger
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.config import settings
+from app.database.database import AsyncSessionLocal, Base
+from app.utils.metrics import stage_duration
+
+class LogSink:
+    """
+    Write-behind sink for `MessageLog` and `ErrorLog` rows.
+
+    Records are buffered in memory and written with one bulk INSERT per table
+    when `batch_size` records are buffered or every `flush_interval_ms`,
+    whichever comes first, so requests never wait for log writes.
+
+    Overflow policy: the buffer holds at most `max_buffer` records. When it is
+    full, the oldest buffered record is dropped to make room for the new one
+    and counted in `dropped`. A batch that fails to insert is dropped as well
+    and counted in `failed`, so a database outage cannot grow the buffer
+    without bound. Records still buffered on shutdown are flushed by `stop`.
+    """
+
+    def __init__(
+        self,
+        session_factory: async_sessionmaker,
+        batch_size: int,
+        flush_interval_ms: int,
+        max_buffer: int
+    ):
+        """
+        Initialize the log sink.
+
+        Args:
+            session_factory: Factory for the sessions used to write the logs.
+            batch_size: Number of buffered records that triggers a flush.
+            flush_interval_ms: Maximum time a record waits in the buffer, in milliseconds.
+            max_buffer: Maximum number of buffered records.
+        """
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_buffer = max_buffer
+
+        self._buffer: Deque[Tuple[Type[Base], Dict[str, Any]]] = deque(maxlen=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._written = 0
+        self._dropped = 0
+        self._failed = 0
+        self._flushes = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the flush task has been started."""
+        return self._task is not None
+
+    async def start(self) -> None:
+        """
+        Start the background flush task.
+
+        Records submitted before the start are kept and written by the first flush.
+        """
+        if self.running:
+            return
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run(), name="log-sink")
+
+        logger.info("Started log sink")
+
+    async def stop(self) -> None:
+        """Stop the flush task and write everything still buffered."""
+        if not self.running:
+            return
+
+        # Let the flush task finish its current batch instead of cancelling it mid-insert
+        self._stopping = True
+        self._wakeup.set()
+        await self._task
+
+        self._task = None
+        self._wakeup = None
+        self._stopping = False
+
+        while self._buffer:
+            await self.flush()
+
+        logger.info("Stopped log sink")
+
+    def submit(self, model: Type[Base], values: Dict[str, Any]) -> None:
+        """
+        Buffer a log record for writing.
+
+        Args:
+            model: Log model, `MessageLog` or `ErrorLog`.
+            values: Column values of the record.
+        """
+        if len(self._buffer) == self.max_buffer:
+            self._dropped += 1
+
+        # Keep the time the record was created rather than the time it is flushed
+        values.setdefault("created_at", datetime.now(timezone.utc))
+        self._buffer.append((model, values))
+
+        if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def flush(self) -> None:
+        """Write up to one batch of buffered records with bulk inserts."""
+        if not self._buffer:
+            return
+
+        batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+
+        rows: Dict[Type[Base], List[Dict[str, Any]]] = {}
+        for model, values in batch:
+            rows.setdefault(model, []).append(values)
+
+        try:
+            with stage_duration.time(stage="db_log_flush"):
+                async with self.session_factory() as db:
+                    for model, values in rows.items():
+                        await db.execute(insert(model), values)
+                    await db.commit()
+
+            self._written += len(batch)
+
+        except Exception as e:
+            self._failed += len(batch)
+            logger.error(f"Failed to write {len(batch)} log records: {str(e)}")
+
+        finally:
+            self._flushes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get sink statistics.
+
+        Returns:
+            Dict[str, Any]: Sink statistics.
+        """
+        return {
+            "running": self.running,
+            "buffered": len(self._buffer),
+            "max_buffer": self.max_buffer,
+            "written": self._written,
+            "dropped": self._dropped,
+            "failed": self._failed,
+            "flushes": self._flushes
+        }
+
+    async def _run(self) -> None:
+        """Flush the buffer whenever a batch is full or the flush interval passes."""
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+
+            self._wakeup.clear()
+
+            # Write every full batch, then whatever is left once the interval passed
+            while self._buffer:
+                await self.flush()
+
+# Application-wide log sink, started in the FastAPI lifespan
+log_sink = LogSink(
+    session_factory=AsyncSessionLocal,
+    batch_size=settings.LOG_SINK_BATCH_SIZE,
+    flush_interval_ms=settings.LOG_SINK_FLUSH_INTERVAL_MS,
+    max_buffer=settings.LOG_SINK_MAX_BUFFER
+)
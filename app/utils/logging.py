@@ -1,10 +1,13 @@
 import sys
 import traceback
 from loguru import logger
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database.models import ErrorLog, MessageLog
 from app.config import settings
+from app.utils.log_sink import log_sink
+from app.utils.metrics import stage_duration
+from app.utils.tracing import tracer
 
 # Configure logger
 logger.remove()
@@ -14,12 +17,16 @@ logger.add(
     format="<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | <cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>"
 )
 
-def log_error(db: Session, error_type: str, error_message: str, stack_trace: str = None, request_data: dict = None, line_group_id: str = None):
+async def log_error(db: AsyncSession, error_type: str, error_message: str, stack_trace: str = None, request_data: dict = None, line_group_id: str = None):
     """
     Log an error to the database and console.
     
+    When the log sink is running, the database write is buffered and done in
+    the background; otherwise the error is committed with the given session.
+    The ID of the current trace is stored with the error if the trace is exported.
+    
     Args:
-        db: Database session.
+        db: Async database session.
         error_type: Type of error.
         error_message: Error message.
         stack_trace: Stack trace of the error.
@@ -32,19 +39,26 @@ def log_error(db: Session, error_type: str, error_message: str, stack_trace: str
         logger.error(f"Stack trace: {stack_trace}")
     
     # Log to database
-    error_log = ErrorLog(
+    values = dict(
         error_type=error_type,
         error_message=error_message,
         stack_trace=stack_trace,
         request_data=request_data,
-        line_group_id=line_group_id
+        line_group_id=line_group_id,
+        trace_id=tracer.exported_trace_id()
     )
     
-    db.add(error_log)
-    db.commit()
+    with stage_duration.time(stage="db_log"), tracer.span("db.log_error"):
+        # Leave the write to the log sink when it is running
+        if log_sink.running:
+            log_sink.submit(ErrorLog, values)
+            return
+        
+        db.add(ErrorLog(**values))
+        await db.commit()
 
-def log_message(
-    db: Session,
+async def log_message(
+    db: AsyncSession,
     line_group_id: str,
     user_id: str,
     message_text: str,
@@ -52,13 +66,20 @@ def log_message(
     makkaizou_request: dict = None,
     makkaizou_response: dict = None,
     line_response_status: str = None,
-    processing_time_ms: int = None
+    processing_time_ms: int = None,
+    cache_hit: bool = False,
+    latency_saved_ms: int = None,
+    coalesced: bool = False
 ):
     """
     Log a message interaction to the database.
     
+    When the log sink is running, the database write is buffered and done in
+    the background; otherwise the message is committed with the given session.
+    The ID of the current trace is stored with the message if the trace is exported.
+    
     Args:
-        db: Database session.
+        db: Async database session.
         line_group_id: LINE group ID.
         user_id: User ID.
         message_text: Message text.
@@ -67,8 +88,11 @@ def log_message(
         makkaizou_response: Response from Makkaizou API.
         line_response_status: Status of the LINE response.
         processing_time_ms: Processing time in milliseconds.
+        cache_hit: Whether the Makkaizou response came from the response cache.
+        latency_saved_ms: Makkaizou latency saved by the cache hit, in milliseconds.
+        coalesced: Whether the Makkaizou response was shared with an identical prompt.
     """
-    message_log = MessageLog(
+    values = dict(
         line_group_id=line_group_id,
         user_id=user_id,
         message_text=message_text,
@@ -76,11 +100,21 @@ def log_message(
         makkaizou_request=makkaizou_request,
         makkaizou_response=makkaizou_response,
         line_response_status=line_response_status,
-        processing_time_ms=processing_time_ms
+        processing_time_ms=processing_time_ms,
+        cache_hit=cache_hit,
+        latency_saved_ms=latency_saved_ms,
+        coalesced=coalesced,
+        trace_id=tracer.exported_trace_id()
     )
     
-    db.add(message_log)
-    db.commit()
+    with stage_duration.time(stage="db_log"), tracer.span("db.log_message"):
+        # Leave the write to the log sink when it is running
+        if log_sink.running:
+            log_sink.submit(MessageLog, values)
+            return
+        
+        db.add(MessageLog(**values))
+        await db.commit()
 
 def get_exception_traceback():
     """
@@ -0,0 +1,210 @@
+import asyncio
+import statistics
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional
+
+from app.utils.logging import logger
+
+# Frames kept of the stack of the code blocking the loop, innermost last
+STACK_DEPTH = 30
+
+class LoopLagMonitor:
+    """
+    Measures how late the event loop runs scheduled callbacks.
+
+    A background task sleeps for `interval` seconds at a time; the time it
+    wakes up later than requested is the lag. Code that blocks the loop, such
+    as synchronous I/O in a request handler, shows up as lag.
+
+    With a `block_threshold`, a watchdog thread also checks whether the task
+    is overdue by more than the threshold while the loop is still blocked.
+    It then records the stack of the event loop thread, which shows the code
+    holding the loop, and the stall is logged once the loop runs again. The
+    watchdog needs the GIL, so it cannot sample code that blocks without
+    releasing it, such as a single long C call.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        window: int = 4,
+        history: int = 1200,
+        block_threshold: float = 0.0,
+        max_stack_samples: int = 20,
+        debug: bool = False
+    ):
+        """
+        Initialize the monitor.
+
+        Args:
+            interval: Seconds between two measurements.
+            window: Number of recent measurements the current lag is taken from.
+            history: Number of measurements the lag percentiles are computed from.
+            block_threshold: Seconds the loop may be blocked before its stack is
+                sampled; 0 disables the watchdog.
+            max_stack_samples: Number of most recent stack samples kept.
+            debug: Run the event loop in asyncio debug mode, which logs
+                callbacks taking longer than `block_threshold` (0.1 second if
+                0). Debug mode slows the loop down noticeably.
+        """
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.debug = debug
+
+        self._task: Optional[asyncio.Task] = None
+        self._recent: deque = deque(maxlen=window)
+        self._history: deque = deque(maxlen=history)
+        self._max_lag = 0.0
+        self._samples = 0
+
+        self._watchdog: Optional[threading.Thread] = None
+        self._watchdog_stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._due_at = 0.0
+        self._stall: Optional[Dict[str, Any]] = None
+        self._stack_samples: Deque[Dict[str, Any]] = deque(maxlen=max_stack_samples)
+        self._stalls = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the monitor has been started."""
+        return self._task is not None
+
+    @property
+    def lag(self) -> float:
+        """
+        Highest lag of the recent measurements in seconds.
+
+        A stall is measured once, when the loop gets to run the monitor again,
+        so it is kept for a few measurements instead of only until the next one.
+        """
+        return max(self._recent, default=0.0)
+
+    @property
+    def stalls(self) -> int:
+        """Number of times the loop was blocked longer than the block threshold."""
+        return self._stalls
+
+    async def start(self) -> None:
+        """
+        Start measuring the loop the caller runs on.
+
+        With a block threshold, also starts the watchdog thread sampling the
+        stack of that loop's thread.
+        """
+        if self.running:
+            return
+
+        self._due_at = time.monotonic() + self.interval
+        self._task = asyncio.create_task(self._run())
+
+        if self.block_threshold > 0:
+            self._loop_thread_id = threading.get_ident()
+            self._watchdog_stop.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+            self._watchdog.start()
+
+        if self.debug:
+            loop = asyncio.get_running_loop()
+            loop.set_debug(True)
+            loop.slow_callback_duration = self.block_threshold or 0.1
+
+        logger.info(f"Started event loop lag monitor, measuring every {self.interval}s")
+
+    async def stop(self) -> None:
+        """Stop measuring."""
+        if not self.running:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        if self._watchdog is not None:
+            self._watchdog_stop.set()
+            self._watchdog.join()
+            self._watchdog = None
+
+        if self.debug:
+            asyncio.get_running_loop().set_debug(False)
+
+        logger.info("Stopped event loop lag monitor")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get lag statistics.
+
+        Returns:
+            Dict[str, Any]: Lag statistics.
+        """
+        if len(self._history) >= 2:
+            quantiles = statistics.quantiles(self._history, n=100)
+            percentiles = {name: round(quantiles[index] * 1000, 1) for name, index in (("p50", 49), ("p95", 94), ("p99", 98))}
+        else:
+            percentiles = {"p50": None, "p95": None, "p99": None}
+
+        return {
+            "running": self.running,
+            "lag_ms": round(self.lag * 1000, 1),
+            "max_lag_ms": round(self._max_lag * 1000, 1),
+            "lag_percentiles_ms": percentiles,
+            "samples": self._samples,
+            "block_threshold_ms": int(self.block_threshold * 1000),
+            "stalls": self._stalls,
+            "stack_samples": list(self._stack_samples)
+        }
+
+    async def _run(self) -> None:
+        """Measure the lag until cancelled."""
+        while True:
+            started_at = time.monotonic()
+            self._due_at = started_at + self.interval
+            await asyncio.sleep(self.interval)
+            self._record(max(time.monotonic() - started_at - self.interval, 0.0))
+
+    def _record(self, lag: float) -> None:
+        """
+        Record a measurement.
+
+        Args:
+            lag: Lag in seconds.
+        """
+        self._recent.append(lag)
+        self._history.append(lag)
+        self._max_lag = max(self._max_lag, lag)
+        self._samples += 1
+
+        # The watchdog caught the loop blocked while this measurement was overdue
+        stall, self._stall = self._stall, None
+        if stall is not None:
+            stall["lag_ms"] = round(lag * 1000, 1)
+            self._stalls += 1
+            logger.warning(
+                f"Event loop was blocked for {stall['lag_ms']:.0f} ms in:\n{''.join(stall['stack'][-5:]).rstrip()}"
+            )
+
+    def _watch(self) -> None:
+        """Sample the stack of the event loop thread while it is blocked, until stopped."""
+        check_interval = min(self.block_threshold / 2, 0.05)
+
+        while not self._watchdog_stop.wait(check_interval):
+            due_at = self._due_at
+            if self._stall is not None or time.monotonic() - due_at < self.block_threshold:
+                continue
+
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+
+            stall = {
+                "at": datetime.now(timezone.utc).isoformat(),
+                "lag_ms": round((time.monotonic() - due_at) * 1000, 1),
+                "stack": traceback.format_stack(frame, limit=STACK_DEPTH)
+            }
+            self._stack_samples.append(stall)
+            self._stall = stall
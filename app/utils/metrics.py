@@ -0,0 +1,524 @@
+import asyncio
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from app.config import settings
+
+# Upper bounds of the latency histograms in seconds, from a cache hit to a slow Makkaizou answer
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+def _label_key(labelnames: Sequence[str], labels: Dict[str, Any]) -> str:
+    """
+    Build the key of a labelled sample.
+
+    Args:
+        labelnames: Label names of the metric.
+        labels: Label values given by the caller.
+
+    Returns:
+        str: JSON list of the label values, usable as a dict key and in snapshot files.
+
+    Raises:
+        ValueError: If the labels do not match the label names.
+    """
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {list(labelnames)}, got {list(labels)}")
+
+    return json.dumps([str(labels[name]) for name in labelnames])
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labelnames: Sequence[str], key: str, extra: Optional[Tuple[str, str]] = None) -> str:
+    """
+    Format the labels of a sample for the Prometheus text format.
+
+    Args:
+        labelnames: Label names of the metric.
+        key: Sample key, see `_label_key`.
+        extra: Additional label, e.g. the `le` bound of a histogram bucket.
+
+    Returns:
+        str: Labels in braces, or an empty string if there are none.
+    """
+    pairs = list(zip(labelnames, json.loads(key)))
+    if extra:
+        pairs.append(extra)
+
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _format_value(value: float) -> str:
+    """Format a sample value for the Prometheus text format."""
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Metric:
+    """Base class of the metric types."""
+
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        """
+        Initialize the metric.
+
+        Args:
+            name: Metric name.
+            documentation: Help text.
+            labelnames: Names of the labels every sample has.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        self._samples: Dict[str, Any] = {}
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current samples in a JSON-serializable form.
+
+        Returns:
+            Dict[str, Any]: Metric description and samples.
+        """
+        return {
+            "type": self.type,
+            "help": self.documentation,
+            "labelnames": list(self.labelnames),
+            "samples": {key: self._copy(value) for key, value in self._samples.items()}
+        }
+
+    def _copy(self, value: Any) -> Any:
+        """Copy a sample value for a snapshot."""
+        return value
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    type = COUNTER
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """
+        Increase the count.
+
+        Args:
+            amount: Amount to add.
+            **labels: Label values.
+        """
+        key = _label_key(self.labelnames, labels)
+        self._samples[key] = self._samples.get(key, 0.0) + amount
+
+class Gauge(Metric):
+    """
+    Value that goes up and down.
+
+    A gauge either holds values set by the application or reads its value
+    from a function when a snapshot is taken.
+    """
+
+    type = GAUGE
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None
+    ):
+        """
+        Initialize the gauge.
+
+        Args:
+            name: Metric name.
+            documentation: Help text.
+            labelnames: Names of the labels every sample has.
+            function: Function returning the value of an unlabelled gauge.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+
+    def set(self, value: float, **labels: Any) -> None:
+        """
+        Set the value.
+
+        Args:
+            value: New value.
+            **labels: Label values.
+        """
+        self._samples[_label_key(self.labelnames, labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        """
+        Increase the value.
+
+        Args:
+            amount: Amount to add.
+            **labels: Label values.
+        """
+        key = _label_key(self.labelnames, labels)
+        self._samples[key] = self._samples.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        """
+        Decrease the value.
+
+        Args:
+            amount: Amount to subtract.
+            **labels: Label values.
+        """
+        self.inc(-amount, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current samples in a JSON-serializable form.
+
+        Returns:
+            Dict[str, Any]: Metric description and samples.
+        """
+        if self.function is not None:
+            try:
+                self.set(self.function())
+            except Exception as e:
+                logger.warning(f"Could not read gauge {self.name}: {str(e)}")
+
+        return super().snapshot()
+
+class Histogram(Metric):
+    """Distribution of observed values over fixed buckets."""
+
+    type = HISTOGRAM
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        """
+        Initialize the histogram.
+
+        Args:
+            name: Metric name.
+            documentation: Help text.
+            labelnames: Names of the labels every sample has.
+            buckets: Upper bounds of the buckets, in increasing order.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels: Any) -> None:
+        """
+        Record an observation.
+
+        Args:
+            value: Observed value, e.g. a duration in seconds.
+            **labels: Label values.
+        """
+        key = _label_key(self.labelnames, labels)
+
+        sample = self._samples.get(key)
+        if sample is None:
+            # One count per bucket plus the +Inf bucket
+            sample = self._samples[key] = {"buckets": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+
+        sample["buckets"][bisect_left(self.buckets, value)] += 1
+        sample["sum"] += value
+        sample["count"] += 1
+
+    @contextmanager
+    def time(self, **labels: Any) -> Iterator[None]:
+        """
+        Observe the duration of a block in seconds, also when it raises.
+
+        Args:
+            **labels: Label values.
+        """
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the current samples in a JSON-serializable form.
+
+        Returns:
+            Dict[str, Any]: Metric description, bucket bounds and samples.
+        """
+        return {**super().snapshot(), "bounds": list(self.buckets)}
+
+    def _copy(self, value: Any) -> Any:
+        """Copy a sample value for a snapshot."""
+        return {**value, "buckets": list(value["buckets"])}
+
+class MetricsRegistry:
+    """
+    Metrics of one worker process, rendered in the Prometheus text format.
+
+    With several uvicorn workers, each worker gets its own registry. When a
+    shared directory is configured, every worker writes a snapshot of its
+    registry there, and `/metrics` on any worker merges the snapshots:
+    counters and histograms are summed over all workers that ever wrote one;
+    gauges are summed over the workers that are still writing.
+    """
+
+    def __init__(self, directory: str = "", write_interval: float = 5.0):
+        """
+        Initialize the registry.
+
+        Args:
+            directory: Directory shared by the workers; empty for a single worker.
+            write_interval: Seconds between two snapshots written to the directory.
+        """
+        self.directory = directory
+        self.write_interval = write_interval
+
+        self._metrics: Dict[str, Metric] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Create and register a counter, see `Counter`."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        function: Optional[Callable[[], float]] = None
+    ) -> Gauge:
+        """Create and register a gauge, see `Gauge`."""
+        return self._register(Gauge(name, documentation, labelnames, function))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        """Create and register a histogram, see `Histogram`."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Get the samples of all metrics of this worker.
+
+        Returns:
+            Dict[str, Any]: Snapshots by metric name.
+        """
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    async def start(self) -> None:
+        """Start writing snapshots to the shared directory, if one is configured."""
+        if not self.directory or self._task is not None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._task = asyncio.create_task(self._run())
+
+        logger.info(f"Writing metrics of worker {os.getpid()} to {self.directory}")
+
+    async def stop(self) -> None:
+        """Stop writing snapshots, after writing a last one so no count is lost."""
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        await asyncio.to_thread(self._write, self.snapshot())
+
+    def write_snapshot(self) -> None:
+        """Write the snapshot of this worker to the shared directory."""
+        self._write(self.snapshot())
+
+    def _write(self, snapshot: Dict[str, Any]) -> None:
+        """
+        Write a snapshot of this worker to the shared directory.
+
+        Only touches the snapshot passed in, so it can run in a thread while
+        the event loop keeps updating the metrics.
+
+        Args:
+            snapshot: Snapshot taken with `snapshot`.
+        """
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        temporary_path = f"{path}.tmp"
+
+        with open(temporary_path, "w") as file:
+            json.dump(snapshot, file)
+
+        # Readers never see a partly written file
+        os.replace(temporary_path, path)
+
+    def collect(self) -> Dict[str, Any]:
+        """
+        Merge the snapshots of all workers.
+
+        The snapshot of this worker is taken live; the others are read from
+        the shared directory.
+
+        Returns:
+            Dict[str, Any]: Merged snapshots by metric name.
+        """
+        snapshots = [(self.snapshot(), True)]
+
+        if self.directory and os.path.isdir(self.directory):
+            own_file = f"{os.getpid()}.json"
+            stale_before = time.time() - 3 * self.write_interval
+
+            for file_name in os.listdir(self.directory):
+                if not file_name.endswith(".json") or file_name == own_file:
+                    continue
+
+                path = os.path.join(self.directory, file_name)
+                try:
+                    with open(path) as file:
+                        snapshot = json.load(file)
+                    live = os.path.getmtime(path) >= stale_before
+                except (OSError, ValueError) as e:
+                    logger.warning(f"Could not read metrics snapshot {path}: {str(e)}")
+                    continue
+
+                snapshots.append((snapshot, live))
+
+        return merge_snapshots(snapshots)
+
+    def render(self) -> str:
+        """
+        Render the merged metrics of all workers.
+
+        Returns:
+            str: Metrics in the Prometheus text exposition format.
+        """
+        return render_snapshot(self.collect())
+
+    def _register(self, metric: Metric) -> Any:
+        """Register a metric under its name."""
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    async def _run(self) -> None:
+        """Write snapshots until cancelled."""
+        while True:
+            # The snapshot is taken on the event loop, the file is written in a thread
+            try:
+                await asyncio.to_thread(self._write, self.snapshot())
+            except OSError as e:
+                logger.warning(f"Could not write metrics snapshot: {str(e)}")
+
+            await asyncio.sleep(self.write_interval)
+
+def merge_snapshots(snapshots: List[Tuple[Dict[str, Any], bool]]) -> Dict[str, Any]:
+    """
+    Merge the snapshots of several workers.
+
+    Args:
+        snapshots: Snapshots with whether their worker is still running. Gauges
+            of workers that stopped are left out.
+
+    Returns:
+        Dict[str, Any]: Merged snapshots by metric name.
+    """
+    merged: Dict[str, Any] = {}
+
+    for snapshot, live in snapshots:
+        for name, metric in snapshot.items():
+            if metric["type"] == GAUGE and not live:
+                continue
+
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            for key, value in metric["samples"].items():
+                current = target["samples"].get(key)
+
+                if current is None:
+                    target["samples"][key] = (
+                        {**value, "buckets": list(value["buckets"])} if metric["type"] == HISTOGRAM else value
+                    )
+                elif metric["type"] == HISTOGRAM:
+                    current["buckets"] = [a + b for a, b in zip(current["buckets"], value["buckets"])]
+                    current["sum"] += value["sum"]
+                    current["count"] += value["count"]
+                else:
+                    target["samples"][key] = current + value
+
+    return merged
+
+def render_snapshot(snapshot: Dict[str, Any]) -> str:
+    """
+    Render a snapshot in the Prometheus text exposition format.
+
+    Args:
+        snapshot: Snapshots by metric name.
+
+    Returns:
+        str: Metrics in the Prometheus text exposition format.
+    """
+    lines: List[str] = []
+
+    for name, metric in sorted(snapshot.items()):
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['type']}")
+        labelnames = metric["labelnames"]
+
+        for key, value in sorted(metric["samples"].items()):
+            if metric["type"] != HISTOGRAM:
+                lines.append(f"{name}{_format_labels(labelnames, key)} {_format_value(value)}")
+                continue
+
+            cumulative = 0
+            for bound, count in zip(list(metric["bounds"]) + [float("inf")], value["buckets"]):
+                cumulative += count
+                labels = _format_labels(labelnames, key, ("le", _format_value(bound)))
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+
+            lines.append(f"{name}_sum{_format_labels(labelnames, key)} {_format_value(value['sum'])}")
+            lines.append(f"{name}_count{_format_labels(labelnames, key)} {value['count']}")
+
+    return "\n".join(lines) + "\n"
+
+# Application-wide metrics registry, served by /metrics
+metrics_registry = MetricsRegistry(
+    directory=settings.METRICS_MULTIPROC_DIR,
+    write_interval=settings.METRICS_WRITE_INTERVAL
+)
+
+stage_duration = metrics_registry.histogram(
+    "makkaizou_line_stage_duration_seconds",
+    "Duration of the stages of webhook and event processing",
+    ["stage"]
+)
+events_total = metrics_registry.counter(
+    "makkaizou_line_events_total",
+    "Mention events by processing outcome",
+    ["outcome"]
+)
+http_request_duration = metrics_registry.histogram(
+    "makkaizou_line_http_request_duration_seconds",
+    "Duration of HTTP requests",
+    ["method", "route", "status"]
+)
+http_requests_in_flight = metrics_registry.gauge(
+    "makkaizou_line_http_requests_in_flight",
+    "HTTP requests being handled"
+)
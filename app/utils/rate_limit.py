@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+class TokenBucket:
+    """
+    Token bucket rate limiter.
+
+    Tokens are added at `rate` per second up to `capacity`. `acquire` reserves
+    a token even when the bucket is empty and sleeps until it would have been
+    available, so concurrent callers are served in order at the configured rate.
+    `release` gives a token back, up to the capacity.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        Initialize the token bucket.
+
+        Args:
+            rate: Tokens added per second.
+            capacity: Maximum number of tokens, i.e. the allowed burst.
+        """
+        self.rate = rate
+        self.capacity = capacity
+
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    @property
+    def tokens(self) -> float:
+        """Tokens currently available; negative while callers wait for reserved tokens."""
+        self._refill()
+        return self._tokens
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """
+        Take tokens if they are available.
+
+        Args:
+            tokens: Number of tokens to take.
+
+        Returns:
+            bool: True if the tokens were taken, False if the bucket has too few.
+        """
+        self._refill()
+
+        if self._tokens < tokens:
+            return False
+
+        self._tokens -= tokens
+        return True
+
+    def release(self, tokens: float = 1.0) -> None:
+        """
+        Give back tokens taken for a call that did not go ahead.
+
+        Args:
+            tokens: Number of tokens to give back.
+        """
+        self._refill()
+        self._tokens = min(self.capacity, self._tokens + tokens)
+
+    async def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Take tokens, waiting until they are available.
+
+        Args:
+            tokens: Number of tokens to take.
+
+        Returns:
+            float: Seconds waited.
+        """
+        self._refill()
+        self._tokens -= tokens
+
+        if self._tokens >= 0:
+            return 0.0
+
+        delay = -self._tokens / self.rate
+        await asyncio.sleep(delay)
+        return delay
+
+    def _refill(self) -> None:
+        """Add the tokens accumulated since the last update."""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
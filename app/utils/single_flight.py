@@ -0,0 +1,126 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+from app.utils.cache import TTLCache
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one.
+
+    The first caller of a key runs the call; callers arriving while it is in
+    flight wait for its result instead of running their own. With a positive
+    `grace_seconds`, results accepted by `is_reusable` are also kept that long
+    after the call finishes, for callers that were queued behind it. Errors
+    are shared with the waiting callers but never kept.
+    """
+
+    def __init__(
+        self,
+        grace_seconds: float = 0,
+        max_size: int = 1000,
+        is_reusable: Optional[Callable[[Any], bool]] = None
+    ):
+        """
+        Initialize the single-flight group.
+
+        Args:
+            grace_seconds: Seconds a finished result is shared; 0 shares only in-flight calls.
+            max_size: Maximum number of finished results kept.
+            is_reusable: Predicate deciding whether a result may be shared after
+                the call finished. All results are reusable if None.
+        """
+        self.grace_seconds = grace_seconds
+        self.is_reusable = is_reusable or (lambda result: True)
+
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self._recent = TTLCache(max_size=max_size, ttl=grace_seconds) if grace_seconds > 0 else None
+        self._calls = 0
+        self._coalesced = 0
+        self._reused = 0
+
+    async def run(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run a call, or share the result of the same call in flight.
+
+        Args:
+            key: Key identifying identical calls.
+            call: Coroutine function making the call.
+
+        Returns:
+            Tuple[Any, bool]: The result, and whether it was shared from another caller.
+
+        Raises:
+            Exception: The error raised by the call, also for callers sharing it.
+        """
+        if self._recent is not None:
+            recent = self._recent.get(key)
+            if recent is not None:
+                self._reused += 1
+                return recent, True
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            try:
+                result = await asyncio.shield(in_flight)
+                self._coalesced += 1
+                return result, True
+            except asyncio.CancelledError:
+                if not in_flight.cancelled():
+                    raise
+
+                # The caller running the call was cancelled, not this one
+                return await self.run(key, call)
+
+        return await self._lead(key, call), False
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get single-flight statistics.
+
+        Returns:
+            Dict[str, Any]: Single-flight statistics.
+        """
+        return {
+            "calls": self._calls,
+            "coalesced": self._coalesced,
+            "reused": self._reused,
+            "in_flight": len(self._in_flight)
+        }
+
+    async def _lead(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run a call and share its result with the callers waiting for it.
+
+        Args:
+            key: Key identifying identical calls.
+            call: Coroutine function making the call.
+
+        Returns:
+            Any: The result.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        self._calls += 1
+
+        try:
+            result = await call()
+
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+
+        except BaseException:
+            future.cancel()
+            raise
+
+        finally:
+            del self._in_flight[key]
+
+        future.set_result(result)
+
+        if self._recent is not None and self.is_reusable(result):
+            self._recent.set(key, result)
+
+        return result
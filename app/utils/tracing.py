@@ -0,0 +1,482 @@
+import asyncio
+import json
+import os
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional, TypeVar
+
+import httpx
+from loguru import logger
+
+from app.config import settings
+
+T = TypeVar("T")
+
+# Span kinds of the OTLP data model
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+# Status codes of the OTLP data model
+STATUS_UNSET = 0
+STATUS_ERROR = 2
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    """
+    Encode an attribute value as an OTLP AnyValue.
+
+    Args:
+        value: Attribute value.
+
+    Returns:
+        Dict[str, Any]: OTLP/JSON encoded value.
+    """
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+class Span:
+    """Timed operation within a trace."""
+
+    __slots__ = (
+        "trace_id", "span_id", "parent_span_id", "name", "kind", "sampled",
+        "start_time_ns", "end_time_ns", "attributes", "status_code", "status_message"
+    )
+
+    def __init__(
+        self,
+        trace_id: str,
+        parent_span_id: Optional[str],
+        name: str,
+        kind: int,
+        sampled: bool,
+        attributes: Dict[str, Any]
+    ):
+        """
+        Start a span.
+
+        Args:
+            trace_id: Hex-encoded 16-byte trace ID.
+            parent_span_id: Hex-encoded 8-byte ID of the parent span, or None for a root span.
+            name: Operation name.
+            kind: OTLP span kind.
+            sampled: Whether the trace is exported.
+            attributes: Initial attributes.
+        """
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.kind = kind
+        self.sampled = sampled
+        self.start_time_ns = time.time_ns()
+        self.end_time_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status_code = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        """
+        Set an attribute; None values are ignored.
+
+        Args:
+            key: Attribute name.
+            value: Attribute value.
+        """
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, message: str) -> None:
+        """
+        Mark the operation as failed.
+
+        Args:
+            message: Description of the failure.
+        """
+        self.status_code = STATUS_ERROR
+        self.status_message = message
+
+    def to_otlp(self) -> Dict[str, Any]:
+        """
+        Encode the span in the OTLP/JSON format.
+
+        Returns:
+            Dict[str, Any]: OTLP span.
+        """
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_time_ns),
+            "endTimeUnixNano": str(self.end_time_ns or self.start_time_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": self.status_code}
+        }
+
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        if self.status_message:
+            span["status"]["message"] = self.status_message
+
+        return span
+
+class _NoopSpan:
+    """Span returned while tracing is disabled."""
+
+    trace_id = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def set_error(self, message: str) -> None:
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+def otlp_request(spans: List[Span], service_name: str) -> Dict[str, Any]:
+    """
+    Build an OTLP ExportTraceServiceRequest.
+
+    Args:
+        spans: Finished spans.
+        service_name: Name of the service the spans belong to.
+
+    Returns:
+        Dict[str, Any]: Request in the OTLP/JSON format.
+    """
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{
+                "scope": {"name": "app.utils.tracing"},
+                "spans": [span.to_otlp() for span in spans]
+            }]
+        }]
+    }
+
+class OTLPExporter:
+    """Exports spans to an OpenTelemetry collector over OTLP/HTTP with JSON encoding."""
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 10.0):
+        """
+        Initialize the exporter.
+
+        Args:
+            endpoint: Base URL of the collector, e.g. http://localhost:4318.
+            service_name: Name of the service the spans belong to.
+            timeout: Request timeout in seconds.
+        """
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.timeout = timeout
+
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def export(self, spans: List[Span]) -> None:
+        """
+        Send spans to the collector.
+
+        Args:
+            spans: Finished spans.
+
+        Raises:
+            httpx.HTTPError: If the collector cannot be reached or rejects the spans.
+        """
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+
+        response = await self._client.post(self.url, json=otlp_request(spans, self.service_name))
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        """Close the HTTP client."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+class JSONFileExporter:
+    """Appends spans to a file, one OTLP/JSON request per line, for offline analysis."""
+
+    def __init__(self, path: str, service_name: str):
+        """
+        Initialize the exporter.
+
+        Args:
+            path: File to append to.
+            service_name: Name of the service the spans belong to.
+        """
+        self.path = path
+        self.service_name = service_name
+
+    async def export(self, spans: List[Span]) -> None:
+        """
+        Append spans to the file.
+
+        Args:
+            spans: Finished spans.
+        """
+        line = json.dumps(otlp_request(spans, self.service_name), separators=(",", ":"))
+
+        # Keep the file system off the event loop
+        await asyncio.to_thread(self._append, line)
+
+    def _append(self, line: str) -> None:
+        """
+        Append a line to the file.
+
+        Args:
+            line: Encoded OTLP/JSON request.
+        """
+        with open(self.path, "a") as file:
+            file.write(line + "\n")
+
+    async def close(self) -> None:
+        """Nothing to close; the file is opened for each batch."""
+
+class Tracer:
+    """
+    Minimal tracer producing OpenTelemetry-compatible spans.
+
+    The current span is kept in a context variable, so spans opened inside
+    another span become its children, also across awaits. Whether a trace is
+    exported is decided once, when its root span starts. Finished spans of
+    sampled traces are buffered and exported in batches by a background task.
+    """
+
+    def __init__(
+        self,
+        enabled: bool,
+        sample_rate: float,
+        exporter: Any,
+        batch_size: int,
+        export_interval: float,
+        max_queue: int
+    ):
+        """
+        Initialize the tracer.
+
+        Args:
+            enabled: Whether spans are created at all.
+            sample_rate: Fraction of traces exported, between 0 and 1.
+            exporter: Exporter with `export(spans)` and `close()` coroutines.
+            batch_size: Maximum number of spans per export.
+            export_interval: Seconds between two exports.
+            max_queue: Maximum number of buffered spans; the oldest are dropped beyond it.
+        """
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.export_interval = export_interval
+
+        self._queue: Deque[Span] = deque(maxlen=max_queue)
+        self._task: Optional[asyncio.Task] = None
+        self._traces = 0
+        self._sampled_traces = 0
+        self._exported = 0
+        self._dropped = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the exporter task has been started."""
+        return self._task is not None
+
+    @contextmanager
+    def span(self, name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any) -> Iterator[Any]:
+        """
+        Trace a block as a span, a child of the current span if there is one.
+
+        Exceptions raised by the block mark the span as failed and are re-raised.
+
+        Args:
+            name: Operation name.
+            kind: OTLP span kind.
+            **attributes: Initial attributes; None values are left out.
+
+        Yields:
+            Span: The span, or a no-op span while tracing is disabled.
+        """
+        if not self.enabled:
+            yield NOOP_SPAN
+            return
+
+        parent = _current_span.get()
+        attributes = {key: value for key, value in attributes.items() if value is not None}
+
+        if parent is None:
+            self._traces += 1
+            sampled = random.random() < self.sample_rate
+            self._sampled_traces += sampled
+            span = Span(os.urandom(16).hex(), None, name, kind, sampled, attributes)
+        else:
+            span = Span(parent.trace_id, parent.span_id, name, kind, parent.sampled, attributes)
+
+        token = _current_span.set(span)
+        try:
+            yield span
+
+        except BaseException as e:
+            span.set_error(f"{type(e).__name__}: {str(e)}")
+            raise
+
+        finally:
+            _current_span.reset(token)
+            span.end_time_ns = time.time_ns()
+
+            if span.sampled:
+                if len(self._queue) == self._queue.maxlen:
+                    self._dropped += 1
+                self._queue.append(span)
+
+    def propagate(self, job: Callable[[], Awaitable[T]]) -> Callable[[], Awaitable[T]]:
+        """
+        Bind a job to the current span, for jobs run later by another task.
+
+        Tasks copy the context of the code that created them, which for the
+        long-lived scheduler lanes is not the request that submitted the job.
+
+        Args:
+            job: Coroutine function to run.
+
+        Returns:
+            Callable[[], Awaitable[T]]: Coroutine function running the job as part of the current trace.
+        """
+        parent = _current_span.get()
+        if parent is None:
+            return job
+
+        async def run() -> T:
+            token = _current_span.set(parent)
+            try:
+                return await job()
+            finally:
+                _current_span.reset(token)
+
+        return run
+
+    def current_trace_id(self) -> Optional[str]:
+        """
+        Get the ID of the current trace.
+
+        Returns:
+            Optional[str]: Hex-encoded trace ID, or None outside of a trace.
+        """
+        span = _current_span.get()
+        return span.trace_id if span is not None else None
+
+    def exported_trace_id(self) -> Optional[str]:
+        """
+        Get the ID of the current trace if it is exported.
+
+        Records pointing at a trace that was never exported would only lead
+        to a dead end in the trace backend.
+
+        Returns:
+            Optional[str]: Hex-encoded trace ID, or None outside of a sampled trace.
+        """
+        span = _current_span.get()
+        return span.trace_id if span is not None and span.sampled else None
+
+    async def start(self) -> None:
+        """
+        Start exporting spans in the background.
+
+        Does nothing when tracing is disabled; spans are then never recorded.
+        """
+        if not self.enabled or self.running:
+            return
+
+        self._task = asyncio.create_task(self._run())
+
+        logger.info(f"Started tracing, exporting {self.sample_rate:.0%} of traces with {type(self.exporter).__name__}")
+
+    async def stop(self) -> None:
+        """Export the buffered spans and stop."""
+        if not self.running:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        while self._queue:
+            await self.export()
+
+        await self.exporter.close()
+
+        logger.info("Stopped tracing")
+
+    async def export(self) -> None:
+        """Export up to one batch of buffered spans."""
+        if not self._queue:
+            return
+
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+
+        try:
+            await self.exporter.export(batch)
+            self._exported += len(batch)
+
+        except Exception as e:
+            self._failed += len(batch)
+            logger.warning(f"Failed to export {len(batch)} spans: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get tracing statistics.
+
+        Returns:
+            Dict[str, Any]: Tracing statistics.
+        """
+        return {
+            "enabled": self.enabled,
+            "running": self.running,
+            "sample_rate": self.sample_rate,
+            "traces": self._traces,
+            "sampled_traces": self._sampled_traces,
+            "buffered_spans": len(self._queue),
+            "exported_spans": self._exported,
+            "dropped_spans": self._dropped,
+            "failed_spans": self._failed
+        }
+
+    async def _run(self) -> None:
+        """Export spans until cancelled."""
+        while True:
+            await asyncio.sleep(self.export_interval)
+
+            while self._queue:
+                await self.export()
+
+def create_exporter() -> Any:
+    """
+    Create the span exporter selected by TRACING_EXPORTER.
+
+    Returns:
+        Any: `JSONFileExporter` for "file", otherwise `OTLPExporter`.
+    """
+    if settings.TRACING_EXPORTER == "file":
+        return JSONFileExporter(settings.TRACING_FILE_PATH, settings.TRACING_SERVICE_NAME)
+
+    return OTLPExporter(settings.TRACING_OTLP_ENDPOINT, settings.TRACING_SERVICE_NAME)
+
+# Application-wide tracer, started in the FastAPI lifespan when TRACING_ENABLED is set
+tracer = Tracer(
+    enabled=settings.TRACING_ENABLED,
+    sample_rate=settings.TRACING_SAMPLE_RATE,
+    exporter=create_exporter(),
+    batch_size=settings.TRACING_BATCH_SIZE,
+    export_interval=settings.TRACING_EXPORT_INTERVAL,
+    max_queue=settings.TRACING_MAX_QUEUE
+)
@@ -1,9 +1,18 @@
 from typing import Dict, Any, Optional, List
 from pydantic import BaseModel, Field
+import json
 import logging
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Key every mentionee carries; a body without it cannot mention the bot
+MENTION_SELF_MARKER = b'"isSelf"'
+
 class LineWebhookEvent(BaseModel):
     """Model for LINE webhook events."""
     
@@ -13,6 +22,8 @@ class LineWebhookEvent(BaseModel):
     source: Dict[str, Any]
     replyToken: Optional[str] = None
     message: Optional[Dict[str, Any]] = None
+    webhookEventId: Optional[str] = None
+    deliveryContext: Optional[Dict[str, Any]] = None
     
 class LineWebhookRequest(BaseModel):
     """Model for LINE webhook requests."""
@@ -20,6 +31,46 @@ class LineWebhookRequest(BaseModel):
     destination: str
     events: List[LineWebhookEvent]
 
+def may_mention_self(body: bytes) -> bool:
+    """
+    Cheaply check whether a raw webhook body can contain a mention of the bot.
+    
+    This is a byte search, not a parse: a True result still needs the full
+    check by `is_mention_event`, but a False result means none of the events
+    can mention the bot and the body does not need to be parsed at all.
+    
+    Args:
+        body: Raw request body.
+        
+    Returns:
+        bool: False if no event in the body mentions anyone as the bot.
+    """
+    return MENTION_SELF_MARKER in body
+
+def parse_webhook_request(body: bytes, backend: str = "orjson") -> LineWebhookRequest:
+    """
+    Parse and validate a webhook request straight from the raw body.
+    
+    Args:
+        body: Raw request body.
+        backend: "orjson" to decode with orjson (falls back to "json" when
+            orjson is not installed), "json" to decode with the standard
+            library, or "pydantic" to validate the bytes with pydantic-core.
+        
+    Returns:
+        LineWebhookRequest: Validated webhook request.
+        
+    Raises:
+        ValueError: If the body is not valid JSON or not a webhook request.
+    """
+    if backend == "pydantic":
+        return LineWebhookRequest.model_validate_json(body)
+    
+    if backend == "orjson" and orjson is not None:
+        return LineWebhookRequest.model_validate(orjson.loads(body))
+    
+    return LineWebhookRequest.model_validate(json.loads(body))
+
 def is_mention_event(event: LineWebhookEvent) -> bool:
     """
     Check if the event is a mention event specifically for @bot.
@@ -132,6 +183,18 @@ def extract_user_id(event: LineWebhookEvent) -> Optional[str]:
     """
     return event.source.get("userId")
 
+def is_redelivery(event: LineWebhookEvent) -> bool:
+    """
+    Check if LINE marked the event as a redelivery.
+    
+    Args:
+        event: LINE webhook event.
+        
+    Returns:
+        bool: True if the event was delivered before, False otherwise.
+    """
+    return bool((event.deliveryContext or {}).get("isRedelivery", False))
+
 def extract_message_text(event: LineWebhookEvent) -> Optional[str]:
     """
     Extract the message text from the event.
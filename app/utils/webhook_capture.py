@@ -0,0 +1,310 @@
+import asyncio
+import gzip
+import hashlib
+import hmac
+import json
+import os
+import random
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from loguru import logger
+
+from app.config import settings
+
+# Fields kept verbatim: they describe the shape of the traffic, not its content
+KEPT_FIELDS = frozenset({
+    "type", "mode", "isRedelivery", "isSelf", "index", "length", "timestamp",
+    "packageId", "stickerId", "stickerResourceType", "duration"
+})
+
+# Fields holding IDs or tokens, replaced by pseudonyms of the same length
+ID_FIELDS = frozenset({
+    "destination", "userId", "groupId", "roomId", "id", "quotedMessageId",
+    "quoteToken", "replyToken", "webhookEventId", "markAsReadToken"
+})
+
+_WORD = re.compile(r"\S+")
+
+class Scrubber:
+    """
+    Removes user content from webhook bodies while keeping their shape.
+
+    IDs and words are replaced by keyed hashes of the same length, so the
+    same user, group or message still looks the same across events but
+    cannot be traced back without the salt. Mentions of the bot itself are
+    kept. Fields that are not known to be harmless are scrubbed as well;
+    numbers outside of `KEPT_FIELDS` become 0.
+    """
+
+    def __init__(self, salt: str):
+        """
+        Initialize the scrubber.
+
+        Args:
+            salt: Key of the pseudonyms.
+        """
+        self._key = salt.encode("utf-8")
+
+    def pseudonym(self, value: str, keep_first: bool = False) -> str:
+        """
+        Replace a string by a keyed hash of the same length.
+
+        Args:
+            value: String to replace.
+            keep_first: Keep the first character, e.g. the U, C or R telling LINE IDs apart.
+
+        Returns:
+            str: Pseudonym made of hex digits.
+        """
+        digest = hmac.new(self._key, value.encode("utf-8"), hashlib.sha256).hexdigest()
+        digest = digest * (len(value) // len(digest) + 1)
+
+        if keep_first and value:
+            return value[0] + digest[:len(value) - 1]
+        return digest[:len(value)]
+
+    def scrub(self, value: Any, field: Optional[str] = None) -> Any:
+        """
+        Scrub a decoded webhook body or part of it.
+
+        Args:
+            value: Decoded JSON value.
+            field: Name of the field holding the value.
+
+        Returns:
+            Any: Scrubbed copy of the value.
+        """
+        if isinstance(value, dict):
+            scrubbed = {key: self.scrub(item, key) for key, item in value.items()}
+            if isinstance(value.get("text"), str) and isinstance(value.get("mention"), dict):
+                scrubbed["text"] = self.scrub_text(value["text"], value["mention"].get("mentionees") or [])
+            return scrubbed
+        if isinstance(value, list):
+            return [self.scrub(item, field) for item in value]
+        if field in KEPT_FIELDS or isinstance(value, bool) or value is None:
+            return value
+        if isinstance(value, (int, float)):
+            return 0
+        if field in ID_FIELDS:
+            return self.pseudonym(str(value), keep_first=True)
+
+        return self.scrub_text(str(value))
+
+    def scrub_text(self, text: str, mentionees: Sequence[Dict[str, Any]] = ()) -> str:
+        """
+        Scrub text word by word, keeping its length and repeated words.
+
+        The mentions of the bot itself are kept, since the webhook only
+        answers messages that start with one.
+
+        Args:
+            text: Text to scrub.
+            mentionees: Mentionees of the message, with the `index` and
+                `length` of each mention in the text.
+
+        Returns:
+            str: Scrubbed text.
+        """
+        kept = sorted(
+            (mentionee["index"], mentionee["index"] + mentionee["length"])
+            for mentionee in mentionees
+            if mentionee.get("isSelf") and isinstance(mentionee.get("index"), int) and isinstance(mentionee.get("length"), int)
+        )
+
+        parts = []
+        position = 0
+        for start, end in kept:
+            if start < position:
+                continue
+            parts.append(_WORD.sub(lambda match: self.pseudonym(match.group()), text[position:start]))
+            parts.append(text[start:end])
+            position = end
+        parts.append(_WORD.sub(lambda match: self.pseudonym(match.group()), text[position:]))
+
+        return "".join(parts)
+
+class WebhookRecorder:
+    """
+    Appends scrubbed webhook bodies to a capture file for later replay.
+
+    `record` only buffers the raw body, so requests never wait for the
+    capture. A background task scrubs the buffered bodies and appends them
+    once per `flush_interval`, one JSON line per request with the Unix time
+    it was received. Paths ending in `.gz` are written as gzip members, which
+    `read_capture` reads back as one stream. When the buffer is full, the
+    oldest body is dropped and counted in `dropped`.
+    """
+
+    def __init__(self, path: str, sample_rate: float, salt: str, max_buffer: int, flush_interval: float = 1.0):
+        """
+        Initialize the recorder.
+
+        Args:
+            path: File to append to.
+            sample_rate: Fraction of the webhook requests recorded.
+            salt: Key of the pseudonyms; a random one is used if empty.
+            max_buffer: Maximum number of bodies waiting to be written.
+            flush_interval: Seconds between two writes.
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.flush_interval = flush_interval
+
+        self._scrubber = Scrubber(salt or os.urandom(16).hex())
+        self._buffer: Deque[Tuple[float, bytes]] = deque(maxlen=max_buffer)
+        self._task: Optional[asyncio.Task] = None
+        self._recorded = 0
+        self._written = 0
+        self._dropped = 0
+        self._invalid = 0
+        self._failed = 0
+
+    @property
+    def running(self) -> bool:
+        """Whether the write task has been started."""
+        return self._task is not None
+
+    def record(self, body: bytes) -> None:
+        """
+        Buffer a webhook body, subject to sampling.
+
+        Args:
+            body: Raw request body with a valid signature.
+        """
+        if random.random() >= self.sample_rate:
+            return
+
+        if len(self._buffer) == self._buffer.maxlen:
+            self._dropped += 1
+
+        self._buffer.append((time.time(), body))
+        self._recorded += 1
+
+    async def start(self) -> None:
+        """
+        Start writing in the background, once per `flush_interval`.
+        """
+        if self.running:
+            return
+
+        self._task = asyncio.create_task(self._run())
+
+        logger.info(f"Capturing {self.sample_rate:.0%} of the webhook requests to {self.path}")
+
+    async def stop(self) -> None:
+        """Stop and write everything still buffered."""
+        if not self.running:
+            return
+
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+        await self.flush()
+
+        logger.info("Stopped webhook capture")
+
+    async def flush(self) -> None:
+        """Scrub the buffered bodies and append them to the capture file."""
+        if not self._buffer:
+            return
+
+        records = [self._buffer.popleft() for _ in range(len(self._buffer))]
+
+        # Decoding and hashing every word is CPU work, so it runs in the thread with the write
+        try:
+            written, invalid = await asyncio.to_thread(self._write, records)
+            self._written += written
+            self._invalid += invalid
+
+        except OSError as e:
+            self._failed += len(records)
+            logger.warning(f"Could not write {len(records)} captured webhook requests: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get capture statistics.
+
+        Returns:
+            Dict[str, Any]: Capture statistics.
+        """
+        return {
+            "running": self.running,
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "recorded": self._recorded,
+            "buffered": len(self._buffer),
+            "written": self._written,
+            "dropped": self._dropped,
+            "invalid": self._invalid,
+            "failed": self._failed
+        }
+
+    def _write(self, records: List[Tuple[float, bytes]]) -> Tuple[int, int]:
+        """
+        Scrub records and append them to the capture file.
+
+        Args:
+            records: Unix times the bodies were received, and the raw bodies.
+
+        Returns:
+            Tuple[int, int]: Numbers of records written and of invalid bodies skipped.
+        """
+        lines: List[str] = []
+
+        for received_at, body in records:
+            try:
+                scrubbed = self._scrubber.scrub(json.loads(body))
+            except ValueError:
+                continue
+
+            lines.append(json.dumps({"t": received_at, "body": scrubbed}, ensure_ascii=False, separators=(",", ":")))
+
+        if lines:
+            opener = gzip.open if self.path.endswith(".gz") else open
+            with opener(self.path, "at", encoding="utf-8") as file:
+                file.write("".join(line + "\n" for line in lines))
+
+        return len(lines), len(records) - len(lines)
+
+    async def _run(self) -> None:
+        """Write the buffered bodies until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+def read_capture(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Read the records of a capture file.
+
+    A record cut off by a crash while it was being written ends the capture.
+
+    Args:
+        path: Capture file written by `WebhookRecorder`.
+
+    Yields:
+        Dict[str, Any]: Records with the Unix time `t` the request was received
+            and its scrubbed `body`.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+
+    with opener(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    return
+        except EOFError:
+            return
+
+# Application-wide webhook recorder, started in the FastAPI lifespan when WEBHOOK_CAPTURE_ENABLED is set
+webhook_recorder = WebhookRecorder(
+    path=settings.WEBHOOK_CAPTURE_PATH,
+    sample_rate=settings.WEBHOOK_CAPTURE_SAMPLE_RATE,
+    salt=settings.WEBHOOK_CAPTURE_SALT,
+    max_buffer=settings.WEBHOOK_CAPTURE_MAX_BUFFER
+)
@@ -0,0 +1,298 @@
+"""
+Micro-benchmarks of the pure-Python code run for every webhook request.
+
+Times signature validation, webhook parsing, the mention check, the
+`extract_*` helpers and the formatting of Makkaizou answers on small,
+typical and maximum-size payloads: a single short mention, a batch of a
+few events, and a batch of 100 events with 5000-character texts and an
+answer with 50 references.
+
+Each case is run in rounds of enough calls to take about 0.2 seconds, and
+the fastest round is reported, which filters out most of the noise of other
+processes. Results can be saved as a named baseline under
+`benchmarks/baselines/` and later runs compared with it, on the same machine.
+
+Usage:
+    python -m benchmarks.bench_hot_paths --save before
+    python -m benchmarks.bench_hot_paths --compare before --filter parse
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import platform
+import sys
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.services.message_service import MessageService
+from app.utils.auth import validate_line_signature
+from app.utils.validators import (
+    LineWebhookEvent,
+    extract_group_id,
+    extract_message_text,
+    extract_user_id,
+    is_mention_event,
+    orjson,
+    parse_webhook_request
+)
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Events per request, message text length and Makkaizou references per payload size
+PAYLOAD_SIZES = {
+    "small": {"events": 1, "text_length": 20, "references": 0},
+    "typical": {"events": 3, "text_length": 120, "references": 3},
+    "max": {"events": 100, "text_length": 5000, "references": 50}
+}
+
+def make_text(length: int) -> str:
+    """
+    Create a mention of the bot followed by Japanese and English text.
+
+    Args:
+        length: Length of the text in characters.
+
+    Returns:
+        str: Message text.
+    """
+    content = "営業時間を教えてください。 What are the opening hours? "
+    return ("@bot " + content * (length // len(content) + 1))[:length]
+
+def make_event(index: int, text_length: int) -> Dict[str, Any]:
+    """
+    Create a text message event mentioning the bot.
+
+    Args:
+        index: Event number, used for unique IDs.
+        text_length: Length of the message text.
+
+    Returns:
+        Dict[str, Any]: Webhook event.
+    """
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": 1700000000000 + index,
+        "source": {"type": "group", "groupId": f"C{index:032x}", "userId": f"U{index:032x}"},
+        "webhookEventId": f"01H{index:023d}",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": f"{index:032x}",
+        "message": {
+            "id": str(444573844083572737 + index),
+            "type": "text",
+            "quoteToken": "q3Plxr4AgKd...",
+            "text": make_text(text_length),
+            "mention": {"mentionees": [{"index": 0, "length": 4, "type": "user", "userId": "Ubot", "isSelf": True}]}
+        }
+    }
+
+def make_makkaizou_response(references: int) -> Dict[str, Any]:
+    """
+    Create a Makkaizou answer with references that each have a few files.
+
+    Args:
+        references: Number of references.
+
+    Returns:
+        Dict[str, Any]: Makkaizou response body.
+    """
+    return {
+        "message": "営業時間は平日9時から18時までです。" * 10,
+        "talk_id": "line-benchmark",
+        "references": [
+            {
+                "content": f"営業時間についての社内規程 第{number}条",
+                "files": [
+                    {"name": f"規程{number}-{file}.pdf", "download_url": f"https://example.com/files/{number}/{file}.pdf"}
+                    for file in range(5)
+                ]
+            }
+            for number in range(references)
+        ]
+    }
+
+def make_payload(size: str) -> Dict[str, Any]:
+    """
+    Create the inputs of the benchmarks for one payload size.
+
+    Args:
+        size: Key of `PAYLOAD_SIZES`.
+
+    Returns:
+        Dict[str, Any]: Webhook `body` with its `signature`, the parsed `events`,
+            and a Makkaizou `response`.
+    """
+    spec = PAYLOAD_SIZES[size]
+    events = [make_event(index, spec["text_length"]) for index in range(spec["events"])]
+    body = json.dumps({"destination": "Ubot", "events": events}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    digest = hmac.new(settings.LINE_CHANNEL_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+
+    return {
+        "body": body,
+        "signature": base64.b64encode(digest).decode("utf-8"),
+        "events": [LineWebhookEvent(**event) for event in events],
+        "response": make_makkaizou_response(spec["references"])
+    }
+
+def make_cases(size: str, payload: Dict[str, Any]) -> List[Tuple[str, Callable[[], Any]]]:
+    """
+    Create the benchmark cases of one payload size.
+
+    Args:
+        size: Payload size.
+        payload: Inputs returned by `make_payload`.
+
+    Returns:
+        List[Tuple[str, Callable[[], Any]]]: Case names and the functions to time.
+    """
+    body, signature, events, response = payload["body"], payload["signature"], payload["events"], payload["response"]
+    event = events[0]
+    message_service = MessageService.__new__(MessageService)
+
+    backends = ["json", "pydantic"] + (["orjson"] if orjson is not None else [])
+
+    return [
+        (f"validate_line_signature[{size}]", lambda: validate_line_signature(body, signature)),
+        *[
+            (f"parse_webhook_request[{backend}-{size}]", lambda backend=backend: parse_webhook_request(body, backend))
+            for backend in backends
+        ],
+        (f"is_mention_event[{size}]", lambda: [is_mention_event(event) for event in events]),
+        (f"extract_group_id[{size}]", lambda: extract_group_id(event)),
+        (f"extract_user_id[{size}]", lambda: extract_user_id(event)),
+        (f"extract_message_text[{size}]", lambda: extract_message_text(event)),
+        (f"extract_response_text[{size}]", lambda: message_service._extract_response_text(response))
+    ]
+
+def check_payload(payload: Dict[str, Any]) -> None:
+    """
+    Make sure the payloads take the full path instead of an early return.
+
+    Args:
+        payload: Inputs returned by `make_payload`.
+
+    Raises:
+        AssertionError: If a function does not accept the payload.
+    """
+    event = payload["events"][0]
+    assert validate_line_signature(payload["body"], payload["signature"])
+    assert all(is_mention_event(event) for event in payload["events"])
+    assert extract_group_id(event) and extract_user_id(event) and extract_message_text(event)
+
+def measure(function: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """
+    Time a function.
+
+    Args:
+        function: Function to time.
+        repeat: Number of rounds.
+        min_time: Minimum duration of a round in seconds.
+
+    Returns:
+        float: Seconds per call in the fastest round.
+    """
+    timer = timeit.Timer(function)
+
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+def format_time(seconds: float) -> str:
+    """
+    Format a duration per call.
+
+    Args:
+        seconds: Duration in seconds.
+
+    Returns:
+        str: Duration in ns, us or ms.
+    """
+    if seconds < 1e-6:
+        return f"{seconds * 1e9:.0f} ns"
+    if seconds < 1e-3:
+        return f"{seconds * 1e6:.2f} us"
+    return f"{seconds * 1e3:.2f} ms"
+
+def baseline_path(name: str) -> str:
+    """
+    Get the file of a named baseline.
+
+    Args:
+        name: Baseline name.
+
+    Returns:
+        str: Path of the baseline file.
+    """
+    return os.path.join(BASELINE_DIR, f"{name}.json")
+
+def main() -> int:
+    """
+    Run the benchmarks.
+
+    Returns:
+        int: Exit status, 1 if a case is slower than the compared baseline allows.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run cases whose name contains this text")
+    parser.add_argument("--sizes", default=",".join(PAYLOAD_SIZES), help="comma-separated payload sizes")
+    parser.add_argument("--repeat", type=int, default=5, help="rounds per case")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per round")
+    parser.add_argument("--save", metavar="NAME", help="save the results as a baseline")
+    parser.add_argument("--compare", metavar="NAME", help="compare the results with a saved baseline")
+    parser.add_argument("--threshold", type=float, default=1.1, help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    baseline: Optional[Dict[str, float]] = None
+    if args.compare:
+        with open(baseline_path(args.compare)) as file:
+            baseline = json.load(file)["results"]
+
+    results: Dict[str, float] = {}
+    regressions = []
+
+    print(f"{'case':<42} {'time':>12}" + (f" {'baseline':>12} {'ratio':>7}" if baseline is not None else ""))
+
+    for size in args.sizes.split(","):
+        payload = make_payload(size)
+        check_payload(payload)
+
+        for name, function in make_cases(size, payload):
+            if args.filter not in name:
+                continue
+
+            results[name] = measure(function, args.repeat, args.min_time)
+            line = f"{name:<42} {format_time(results[name]):>12}"
+
+            if baseline is not None and name in baseline:
+                ratio = results[name] / baseline[name]
+                line += f" {format_time(baseline[name]):>12} {ratio:>6.2f}x"
+                if ratio > args.threshold:
+                    regressions.append(name)
+                    line += "  REGRESSION"
+
+            print(line)
+
+    if args.save:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path(args.save), "w") as file:
+            json.dump({
+                "python": sys.version.split()[0],
+                "machine": f"{platform.system()} {platform.machine()} {platform.processor()}".strip(),
+                "results": results
+            }, file, indent=2)
+        print(f"\nSaved baseline {args.save} to {baseline_path(args.save)}")
+
+    if regressions:
+        print(f"\n{len(regressions)} case(s) slower than {args.threshold}x the baseline: {', '.join(regressions)}")
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
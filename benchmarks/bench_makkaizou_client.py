@@ -0,0 +1,115 @@
+"""
+Benchmark the shared Makkaizou HTTP client against a client per request.
+
+Starts a local stub Makkaizou server and sends the same prompts once with a
+new `httpx.AsyncClient` per request (the previous behaviour) and once through
+the pooled `PooledHTTPClient`.
+
+Usage:
+    python -m benchmarks.bench_makkaizou_client --requests 2000 --concurrency 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import Awaitable, Callable, List
+
+import httpx
+
+from app.services.http_client import PooledHTTPClient
+from benchmarks.stubs import create_makkaizou_stub, free_port, serve
+
+FORM_DATA = {
+    "external_integration_key": "benchmark-key",
+    "learning_model_code": "benchmark-model",
+    "message": "What are the opening hours?",
+    "talk_id": "line-benchmark"
+}
+
+async def run(send: Callable[[], Awaitable[None]], requests: int, concurrency: int) -> List[float]:
+    """
+    Send requests with bounded concurrency and collect their latencies.
+
+    Args:
+        send: Coroutine function sending one request.
+        requests: Total number of requests.
+        concurrency: Number of requests in flight at once.
+
+    Returns:
+        List[float]: Latency of each request in milliseconds.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def timed():
+        async with semaphore:
+            start_time = time.perf_counter()
+            await send()
+            latencies.append((time.perf_counter() - start_time) * 1000)
+
+    await asyncio.gather(*[timed() for _ in range(requests)])
+    return latencies
+
+def report(name: str, latencies: List[float], elapsed: float) -> None:
+    """
+    Print a summary line for one run.
+
+    Args:
+        name: Name of the run.
+        latencies: Request latencies in milliseconds.
+        elapsed: Wall-clock duration of the run in seconds.
+    """
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(
+        f"{name:<20} {len(latencies) / elapsed:>9.1f} req/s"
+        f"  p50 {quantiles[49]:>7.2f} ms  p95 {quantiles[94]:>7.2f} ms  p99 {quantiles[98]:>7.2f} ms"
+    )
+
+async def main(args: argparse.Namespace) -> None:
+    """
+    Run the benchmark.
+
+    Args:
+        args: Command line arguments.
+    """
+    async with serve(create_makkaizou_stub(args.latency_ms), free_port()) as url:
+
+        async def per_request_client():
+            async with httpx.AsyncClient() as client:
+                response = await client.post(url, data=FORM_DATA, timeout=30.0)
+                response.raise_for_status()
+
+        pooled = PooledHTTPClient(
+            name="benchmark",
+            max_connections=args.concurrency,
+            max_keepalive_connections=args.concurrency,
+            keepalive_expiry=30.0,
+            connect_timeout=5.0,
+            read_timeout=30.0,
+            write_timeout=10.0,
+            pool_timeout=5.0,
+            http2=args.http2
+        )
+        await pooled.start()
+
+        async def pooled_client():
+            response = await pooled.post(url, data=FORM_DATA)
+            response.raise_for_status()
+
+        print(f"{args.requests} requests, concurrency {args.concurrency}, stub latency {args.latency_ms} ms")
+
+        for name, send in [("client per request", per_request_client), ("pooled client", pooled_client)]:
+            start_time = time.perf_counter()
+            latencies = await run(send, args.requests, args.concurrency)
+            report(name, latencies, time.perf_counter() - start_time)
+
+        print(f"pool stats: {pooled.stats()}")
+        await pooled.stop()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000, help="total number of requests per run")
+    parser.add_argument("--concurrency", type=int, default=20, help="requests in flight at once")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="stub response latency")
+    parser.add_argument("--http2", action="store_true", help="enable HTTP/2 on the pooled client")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,451 @@
+"""
+Load test the webhook end to end against local stub LINE and Makkaizou servers.
+
+Starts stubs of the LINE reply/push API and the Makkaizou endpoint with the
+given latency distributions and error rates, runs the application with
+uvicorn pointed at them, and sends signed webhook requests of mixed group
+traffic to `/webhook` at a fixed rate. Requests are sent on schedule whether
+or not earlier ones have finished, so a slow server shows up as latency
+instead of a lower request rate.
+
+Reports the webhook latency percentiles and throughput, the time from each
+mention to its answer reaching the LINE stub, the requests the stubs served,
+and the rows written per database table.
+
+Latency distributions are `fixed:MS`, `uniform:LOW_MS:HIGH_MS` or
+`lognormal:MEDIAN_MS:SIGMA`.
+
+Usage:
+    python -m benchmarks.bench_webhook_load --rps 50 --duration 30 --makkaizou-latency lognormal:800:0.5
+    python -m benchmarks.bench_webhook_load --mode queue --env OUTBOX_ENABLED=False --output run.json
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from sqlalchemy import MetaData, create_engine, func, select
+
+from benchmarks.bench_webhook_parsing import make_event
+from benchmarks.stubs import StubBehaviour, create_line_stub, create_makkaizou_stub, free_port, serve
+
+CHANNEL_SECRET = "load-test-secret"
+
+def sign(body: bytes) -> str:
+    """
+    Sign a webhook body the way LINE does.
+
+    Args:
+        body: Request body.
+
+    Returns:
+        str: Value of the X-Line-Signature header.
+    """
+    digest = hmac.new(CHANNEL_SECRET.encode("utf-8"), body, hashlib.sha256).digest()
+    return base64.b64encode(digest).decode("utf-8")
+
+def make_request(rng: random.Random, index: int, mention_ratio: float) -> List[Dict[str, Any]]:
+    """
+    Create the events of one webhook request of one to three events.
+
+    Args:
+        rng: Random number generator.
+        index: Number of the first event.
+        mention_ratio: Probability that an event mentions the bot.
+
+    Returns:
+        List[Dict[str, Any]]: Webhook events.
+    """
+    return [make_event(rng, index + offset, mention_ratio) for offset in range(rng.choice([1, 1, 1, 2, 3]))]
+
+def is_mention(event: Dict[str, Any]) -> bool:
+    """
+    Check whether an event mentions the bot, the way LINE marks it.
+
+    Args:
+        event: Webhook event.
+
+    Returns:
+        bool: True if a mentionee is the bot itself.
+    """
+    mentionees = (event.get("message") or {}).get("mention", {}).get("mentionees", [])
+    return any(mentionee.get("isSelf") for mentionee in mentionees)
+
+def encode_request(run_id: str, first_index: int, events: List[Dict[str, Any]]) -> Tuple[bytes, List[str]]:
+    """
+    Encode a webhook request as it is sent, with fresh IDs and timestamps.
+
+    Every event gets a webhook event ID and reply token unique to the run, and
+    the current time as timestamp, so reply tokens are not taken for expired
+    however long the run is.
+
+    Args:
+        run_id: ID of the run.
+        first_index: Number of the first event of the request.
+        events: Webhook events.
+
+    Returns:
+        Tuple[bytes, List[str]]: Request body and the reply tokens of its mentions.
+    """
+    timestamp = int(time.time() * 1000)
+
+    events = [
+        {
+            **event,
+            "timestamp": timestamp,
+            "webhookEventId": f"{run_id}-{first_index + offset}",
+            "replyToken": f"{run_id}-reply-{first_index + offset}"
+        }
+        for offset, event in enumerate(events)
+    ]
+    reply_tokens = [event["replyToken"] for event in events if is_mention(event)]
+
+    body = json.dumps({"destination": "Ubot", "events": events}, ensure_ascii=False, separators=(",", ":"))
+    return body.encode("utf-8"), reply_tokens
+
+def count_rows(database_url: str) -> Dict[str, int]:
+    """
+    Count the rows of every table.
+
+    Args:
+        database_url: Synchronous database URL of the application.
+
+    Returns:
+        Dict[str, int]: Number of rows per table.
+    """
+    engine = create_engine(database_url)
+    metadata = MetaData()
+    metadata.reflect(engine)
+
+    with engine.connect() as connection:
+        counts = {
+            name: connection.execute(select(func.count()).select_from(table)).scalar_one()
+            for name, table in metadata.tables.items()
+        }
+
+    engine.dispose()
+    return counts
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    """
+    Get the p50, p95 and p99 of a list of values.
+
+    Args:
+        values: Values in milliseconds.
+
+    Returns:
+        Dict[str, Optional[float]]: Percentiles, None when there are too few values.
+    """
+    if len(values) < 2:
+        return {"p50": None, "p95": None, "p99": None}
+
+    quantiles = statistics.quantiles(values, n=100)
+    return {"p50": round(quantiles[49], 1), "p95": round(quantiles[94], 1), "p99": round(quantiles[98], 1)}
+
+async def start_app(args: argparse.Namespace, port: int, makkaizou_url: str, line_url: str) -> subprocess.Popen:
+    """
+    Start the application with uvicorn and wait until it serves requests.
+
+    Args:
+        args: Command line arguments; the application is run from `args.app_dir`
+            when it is set, e.g. another checkout of the repository.
+        port: Port to listen on.
+        makkaizou_url: Base URL of the Makkaizou stub.
+        line_url: Base URL of the LINE stub.
+
+    Returns:
+        subprocess.Popen: The uvicorn process.
+
+    Raises:
+        RuntimeError: If the application exits or does not answer within 30 seconds.
+    """
+    env = {
+        **os.environ,
+        "DEBUG": "False",
+        "DATABASE_URL": args.database_url,
+        "LINE_CHANNEL_SECRET": CHANNEL_SECRET,
+        "LINE_CHANNEL_ACCESS_TOKEN": "load-test-token",
+        "LINE_API_ENDPOINT": line_url,
+        "MAKKAIZOU_API_URL": makkaizou_url + "/",
+        "MAKKAIZOU_API_KEY": "load-test-key",
+        "MAKKAIZOU_LEARNING_MODEL_CODE": "load-test-model",
+        "WEBHOOK_PROCESSING_MODE": args.mode
+    }
+    env.update(setting.split("=", 1) for setting in args.env)
+
+    process = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(args.workers), "--log-level", "warning", "--no-access-log"
+        ],
+        env=env,
+        cwd=getattr(args, "app_dir", None)
+    )
+
+    async with httpx.AsyncClient() as client:
+        for _ in range(300):
+            if process.poll() is not None:
+                raise RuntimeError(f"Application exited with status {process.returncode}")
+            try:
+                if (await client.get(f"http://127.0.0.1:{port}/health")).status_code == 200:
+                    return process
+            except httpx.RequestError:
+                pass
+            await asyncio.sleep(0.1)
+
+    process.terminate()
+    raise RuntimeError("Application did not start within 30 seconds")
+
+async def wait_until_idle(client: httpx.AsyncClient, url: str, deliveries: list, timeout: float) -> bool:
+    """
+    Wait until the application has no more events or answers to process.
+
+    With several workers `/stats` reports only the worker that answers it,
+    so the application is also required to have sent nothing new to the LINE
+    stub for two consecutive polls.
+
+    Args:
+        client: HTTP client.
+        url: Base URL of the application.
+        deliveries: Deliveries recorded by the LINE stub.
+        timeout: Maximum seconds to wait.
+
+    Returns:
+        bool: True if the application became idle, False on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    idle_polls = 0
+    delivered = -1
+
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.5)
+        stats = (await client.get(f"{url}/stats")).json()
+        outbox = stats["outbox"]
+
+        busy = (
+            stats["event_scheduler"]["pending"]
+            or stats["event_queue"]["depth"]
+            or stats["mention_debouncer"]["open_batches"]
+            or outbox["in_flight"]
+            or outbox["enqueued"] > outbox["sent"] + outbox["failed"]
+            or len(deliveries) != delivered
+        )
+        delivered = len(deliveries)
+        idle_polls = 0 if busy else idle_polls + 1
+
+        if idle_polls >= 2:
+            return True
+
+    return False
+
+async def run(args: argparse.Namespace, requests: List[Tuple[float, List[Dict[str, Any]]]]) -> Dict[str, Any]:
+    """
+    Send webhook requests to the application running against the stubs.
+
+    Args:
+        args: Command line arguments, see `add_run_arguments`.
+        requests: Seconds after the start at which to send each request, and its events.
+
+    Returns:
+        Dict[str, Any]: Report of the run.
+    """
+    run_id = uuid.uuid4().hex[:8]
+
+    makkaizou_behaviour = StubBehaviour(args.makkaizou_latency, args.makkaizou_error_rate, seed=args.seed)
+    line_behaviour = StubBehaviour(args.line_latency, args.line_error_rate, seed=args.seed + 1)
+    line_stub = create_line_stub(line_behaviour)
+
+    async with serve(create_makkaizou_stub(behaviour=makkaizou_behaviour), free_port()) as makkaizou_url, \
+            serve(line_stub, free_port()) as line_url:
+
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        process = await start_app(args, port, makkaizou_url, line_url)
+
+        try:
+            rows_before = count_rows(args.database_url)
+
+            limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+            async with httpx.AsyncClient(limits=limits, timeout=args.request_timeout) as client:
+                latencies: List[float] = []
+                statuses: Dict[str, int] = {}
+                sent_at: Dict[str, float] = {}
+                events_sent = 0
+
+                async def send(first_index: int, events: List[Dict[str, Any]]) -> None:
+                    body, reply_tokens = encode_request(run_id, first_index, events)
+                    for reply_token in reply_tokens:
+                        sent_at[reply_token] = time.time()
+
+                    start_time = time.perf_counter()
+                    try:
+                        response = await client.post(
+                            f"{url}/webhook",
+                            content=body,
+                            headers={"Content-Type": "application/json", "X-Line-Signature": sign(body)}
+                        )
+                        outcome = str(response.status_code)
+                    except httpx.RequestError as e:
+                        outcome = type(e).__name__
+
+                    latencies.append((time.perf_counter() - start_time) * 1000)
+                    statuses[outcome] = statuses.get(outcome, 0) + 1
+
+                print(f"Sending {len(requests)} requests to {args.workers} worker(s) in {args.mode} mode")
+
+                # Send on schedule, whether or not earlier requests have finished
+                start_time = time.perf_counter()
+                tasks = []
+                for at, events in requests:
+                    delay = start_time + at - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    tasks.append(asyncio.create_task(send(events_sent, events)))
+                    events_sent += len(events)
+
+                await asyncio.gather(*tasks)
+                elapsed = time.perf_counter() - start_time
+
+                drained = await wait_until_idle(client, url, line_stub.state.deliveries, args.drain_timeout)
+
+        finally:
+            # Let the lifespan drain the queues and flush the log sink
+            process.send_signal(signal.SIGINT)
+            process.wait(timeout=args.drain_timeout + 30)
+
+    rows_after = count_rows(args.database_url)
+
+    deliveries = line_stub.state.deliveries
+    answer_latencies = [
+        (delivered_at - sent_at[target]) * 1000
+        for method, target, delivered_at in deliveries
+        if method == "reply" and target in sent_at
+    ]
+    succeeded = statuses.get("200", 0)
+
+    return {
+        "run_id": run_id,
+        "mode": args.mode,
+        "workers": args.workers,
+        "requests": len(requests),
+        "events": events_sent,
+        "mentions": len(sent_at),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(succeeded / elapsed, 1) if elapsed else 0.0,
+        "error_rate": round(1 - succeeded / len(requests), 4) if requests else 0.0,
+        "statuses": statuses,
+        "webhook_latency_ms": percentiles(latencies),
+        "answer_latency_ms": percentiles(answer_latencies),
+        "answers": {
+            "replies": sum(1 for method, _, _ in deliveries if method == "reply"),
+            "pushes": sum(1 for method, _, _ in deliveries if method == "push")
+        },
+        "drained": drained,
+        "stubs": {
+            "makkaizou": {"requests": makkaizou_behaviour.requests, "errors": makkaizou_behaviour.errors},
+            "line": {"requests": line_behaviour.requests, "errors": line_behaviour.errors}
+        },
+        "db_rows_written": {
+            table: rows_after.get(table, 0) - rows_before.get(table, 0)
+            for table in sorted(rows_after)
+            if rows_after.get(table, 0) != rows_before.get(table, 0)
+        }
+    }
+
+def print_report(report: Dict[str, Any]) -> None:
+    """
+    Print the report of a run.
+
+    Args:
+        report: Report returned by `run`.
+    """
+    def format_percentiles(values: Dict[str, Optional[float]]) -> str:
+        return "  ".join(f"{name} {value if value is not None else '-':>8} ms" for name, value in values.items())
+
+    print(f"requests     {report['requests']} ({report['events']} events, {report['mentions']} mentions), statuses {report['statuses']}")
+    print(f"throughput   {report['throughput_rps']} req/s, error rate {report['error_rate']:.2%}")
+    print(f"webhook      {format_percentiles(report['webhook_latency_ms'])}")
+    print(f"answer       {format_percentiles(report['answer_latency_ms'])}")
+    print(f"answers      {report['answers']}{'' if report['drained'] else ' (not drained before the timeout)'}")
+    print(f"stubs        {report['stubs']}")
+    print(f"db rows      {report['db_rows_written']}")
+
+def add_run_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the arguments shared by the load test and the replay tool.
+
+    Args:
+        parser: Argument parser.
+    """
+    parser.add_argument("--mode", choices=["inline", "queue"], default="inline", help="WEBHOOK_PROCESSING_MODE")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--makkaizou-latency", default="lognormal:500:0.5", help="Makkaizou stub latency distribution")
+    parser.add_argument("--makkaizou-error-rate", type=float, default=0.0, help="share of failed Makkaizou requests")
+    parser.add_argument("--line-latency", default="lognormal:50:0.3", help="LINE stub latency distribution")
+    parser.add_argument("--line-error-rate", type=float, default=0.0, help="share of failed LINE requests")
+    parser.add_argument("--database-url", help="database of the application (default: a new SQLite file)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra application setting")
+    parser.add_argument("--max-connections", type=int, default=200, help="connections to the application")
+    parser.add_argument("--request-timeout", type=float, default=60.0, help="webhook request timeout in seconds")
+    parser.add_argument("--drain-timeout", type=float, default=60.0, help="seconds to wait for pending answers")
+    parser.add_argument("--seed", type=int, default=1, help="random seed")
+    parser.add_argument("--output", help="also write the report to this JSON file")
+
+def finish(args: argparse.Namespace, report: Dict[str, Any]) -> None:
+    """
+    Print the report and save it if `--output` is given.
+
+    Args:
+        args: Command line arguments.
+        report: Report of the run.
+    """
+    print_report(report)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+def default_database_url(args: argparse.Namespace) -> None:
+    """
+    Use a new SQLite database when `--database-url` is not given.
+
+    Args:
+        args: Command line arguments, updated in place.
+    """
+    if args.database_url is None:
+        args.database_url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load_test.db')}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rps", type=float, default=20.0, help="webhook requests per second")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to send requests for")
+    parser.add_argument("--mention-ratio", type=float, default=0.3, help="share of events that mention the bot")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    default_database_url(args)
+
+    rng = random.Random(args.seed)
+    requests = []
+    index = 0
+    for number in range(int(args.rps * args.duration)):
+        events = make_request(rng, index, args.mention_ratio)
+        requests.append((number / args.rps, events))
+        index += len(events)
+
+    report = asyncio.run(run(args, requests))
+    report["target_rps"] = args.rps
+    finish(args, report)
@@ -0,0 +1,164 @@
+"""
+Benchmark webhook body parsing on realistic mixed group traffic.
+
+Compares the previous path (`json.loads`, `LineWebhookRequest(**data)` and
+`is_mention_event` on every event) with the raw-bytes fast path (byte
+prefilter, validation, mention filter) for each JSON backend.
+
+Usage:
+    python -m benchmarks.bench_webhook_parsing --bodies 5000 --mention-ratio 0.05
+"""
+import argparse
+import json
+import random
+import time
+from typing import Callable, List
+
+from app.utils.validators import (
+    LineWebhookRequest,
+    is_mention_event,
+    may_mention_self,
+    orjson,
+    parse_webhook_request
+)
+
+CHAT_LINES = [
+    "Good morning!",
+    "Is anyone joining lunch today?",
+    "I'll be 10 minutes late, sorry",
+    "Thanks, that helps a lot 🙏",
+    "Can someone share the slides from yesterday's meeting?"
+]
+
+def make_event(rng: random.Random, index: int, mention_ratio: float) -> dict:
+    """
+    Create one webhook event of mixed group traffic.
+
+    Args:
+        rng: Random number generator.
+        index: Event number, used for unique IDs.
+        mention_ratio: Probability that the event mentions the bot.
+
+    Returns:
+        dict: Webhook event.
+    """
+    roll = rng.random()
+    text = rng.choice(CHAT_LINES)
+
+    if roll < mention_ratio:
+        message = {
+            "id": str(index),
+            "type": "text",
+            "text": f"@bot {text}",
+            "mention": {"mentionees": [{"index": 0, "length": 4, "type": "user", "userId": "Ubot", "isSelf": True}]}
+        }
+    elif roll < mention_ratio + 0.1:
+        message = {
+            "id": str(index),
+            "type": "text",
+            "text": f"@alice {text}",
+            "mention": {"mentionees": [{"index": 0, "length": 6, "type": "user", "userId": "Ualice", "isSelf": False}]}
+        }
+    elif roll < mention_ratio + 0.2:
+        message = {"id": str(index), "type": "sticker", "packageId": "446", "stickerId": "1988"}
+    else:
+        message = {"id": str(index), "type": "text", "text": text}
+
+    return {
+        "type": "message",
+        "mode": "active",
+        "timestamp": 1700000000000 + index,
+        "source": {"type": "group", "groupId": f"G{rng.randrange(50)}", "userId": f"U{rng.randrange(500)}"},
+        "webhookEventId": f"01H{index:023d}",
+        "deliveryContext": {"isRedelivery": False},
+        "replyToken": f"reply-{index}",
+        "message": message
+    }
+
+def make_bodies(count: int, mention_ratio: float, seed: int) -> List[bytes]:
+    """
+    Create webhook bodies of one to three events each.
+
+    Args:
+        count: Number of bodies.
+        mention_ratio: Probability that an event mentions the bot.
+        seed: Random seed.
+
+    Returns:
+        List[bytes]: Encoded webhook bodies, as compact as LINE sends them.
+    """
+    rng = random.Random(seed)
+    bodies = []
+    index = 0
+
+    for _ in range(count):
+        events = []
+        for _ in range(rng.choice([1, 1, 1, 2, 3])):
+            events.append(make_event(rng, index, mention_ratio))
+            index += 1
+
+        bodies.append(json.dumps({"destination": "Ubot", "events": events}, separators=(",", ":")).encode("utf-8"))
+
+    return bodies
+
+def previous_path(body: bytes) -> int:
+    """Parse a body the way the webhook did before the fast path."""
+    webhook_request = LineWebhookRequest(**json.loads(body))
+    return sum(1 for event in webhook_request.events if is_mention_event(event))
+
+def fast_path(backend: str) -> Callable[[bytes], int]:
+    """Create a parser using the raw-bytes fast path with a JSON backend."""
+    def parse(body: bytes) -> int:
+        if not may_mention_self(body):
+            return 0
+        webhook_request = parse_webhook_request(body, backend)
+        return sum(1 for event in webhook_request.events if is_mention_event(event))
+
+    return parse
+
+def measure(name: str, parse: Callable[[bytes], int], bodies: List[bytes], rounds: int) -> float:
+    """
+    Run a parser over all bodies and print its throughput.
+
+    Args:
+        name: Name of the run.
+        parse: Parser returning the number of events for the bot.
+        bodies: Webhook bodies.
+        rounds: Number of passes over the bodies; the fastest pass is reported.
+
+    Returns:
+        float: Bodies per second of the fastest pass.
+    """
+    mentions = sum(parse(body) for body in bodies)
+    best = float("inf")
+
+    for _ in range(rounds):
+        start_time = time.perf_counter()
+        for body in bodies:
+            parse(body)
+        best = min(best, time.perf_counter() - start_time)
+
+    throughput = len(bodies) / best
+    print(f"{name:<20} {throughput:>12,.0f} bodies/s {best / len(bodies) * 1e6:>8.1f} us/body  mentions={mentions}")
+    return throughput
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bodies", type=int, default=5000, help="Number of webhook bodies")
+    parser.add_argument("--mention-ratio", type=float, default=0.05, help="Share of events that mention the bot")
+    parser.add_argument("--rounds", type=int, default=5, help="Passes over the bodies")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    args = parser.parse_args()
+
+    bodies = make_bodies(args.bodies, args.mention_ratio, args.seed)
+    print(f"{len(bodies)} bodies, mention ratio {args.mention_ratio}, "
+          f"{sum(may_mention_self(body) for body in bodies)} bodies need parsing")
+
+    baseline = measure("previous", previous_path, bodies, args.rounds)
+    for backend in ["json", "pydantic"] + (["orjson"] if orjson is not None else []):
+        throughput = measure(f"fast path ({backend})", fast_path(backend), bodies, args.rounds)
+        print(f"{'':<20} {throughput / baseline:>11.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Replay captured webhook traffic against the application and compare runs.
+
+Reads a capture written with WEBHOOK_CAPTURE_ENABLED and sends its requests
+to the application, running against stub LINE and Makkaizou servers as in
+`bench_webhook_load`, with the original spacing divided by `--speed`. Each
+request is signed again and its events get fresh IDs, reply tokens and
+timestamps, so a capture can be replayed any number of times.
+
+With `--baseline`, the latency percentiles, throughput and error rate are
+compared with the report of an earlier run, and the exit status is 1 when
+one of them got worse by more than the tolerance. Pass `--app-dir` to run
+another checkout of the application, e.g. the build about to be deployed.
+
+Usage:
+    python -m benchmarks.replay_webhooks webhook_capture.jsonl.gz --speed 10 --output baseline.json
+    python -m benchmarks.replay_webhooks webhook_capture.jsonl.gz --speed 10 --app-dir ../candidate --baseline baseline.json
+"""
+import argparse
+import asyncio
+import json
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.utils.webhook_capture import read_capture
+from benchmarks.bench_webhook_load import add_run_arguments, default_database_url, finish, run
+
+# Metrics compared with the baseline, and whether higher values are worse
+COMPARED_METRICS = [
+    ("webhook_latency_ms.p50", True),
+    ("webhook_latency_ms.p95", True),
+    ("webhook_latency_ms.p99", True),
+    ("answer_latency_ms.p50", True),
+    ("answer_latency_ms.p95", True),
+    ("answer_latency_ms.p99", True),
+    ("throughput_rps", False),
+    ("error_rate", True)
+]
+
+def load_requests(path: str, speed: float, limit: Optional[int]) -> List[Tuple[float, List[Dict[str, Any]]]]:
+    """
+    Load the requests of a capture with their replay schedule.
+
+    Args:
+        path: Capture file.
+        speed: Replay speed; 2 sends the requests twice as fast as they were received.
+        limit: Maximum number of requests, or None for all of them.
+
+    Returns:
+        List[Tuple[float, List[Dict[str, Any]]]]: Seconds after the start at which
+            to send each request, and its events.
+    """
+    requests = []
+    first_received_at = None
+
+    for record in read_capture(path):
+        if limit is not None and len(requests) >= limit:
+            break
+
+        events = record["body"].get("events") or []
+        if not events:
+            continue
+
+        if first_received_at is None:
+            first_received_at = record["t"]
+
+        requests.append(((record["t"] - first_received_at) / speed, events))
+
+    return requests
+
+def metric(report: Dict[str, Any], name: str) -> Optional[float]:
+    """
+    Get a metric of a report by its dotted name.
+
+    Args:
+        report: Report of a run.
+        name: Metric name, e.g. `webhook_latency_ms.p95`.
+
+    Returns:
+        Optional[float]: Value of the metric, or None if the report does not have it.
+    """
+    value: Any = report
+    for key in name.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+def compare(baseline: Dict[str, Any], report: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """
+    Print the report next to the baseline and find the regressions.
+
+    A latency regressed when it grew by more than `tolerance` and by more
+    than `min_delta_ms`, throughput when it fell by more than `tolerance`,
+    and the error rate when it grew by more than one percentage point.
+
+    Args:
+        baseline: Report of the earlier run.
+        report: Report of this run.
+        tolerance: Relative change tolerated, e.g. 0.2 for 20%.
+        min_delta_ms: Latency change always tolerated, in milliseconds.
+
+    Returns:
+        List[str]: Names of the regressed metrics.
+    """
+    regressions = []
+
+    print(f"{'metric':<24} {'baseline':>10} {'current':>10} {'change':>8}")
+
+    for name, higher_is_worse in COMPARED_METRICS:
+        before, after = metric(baseline, name), metric(report, name)
+        if before is None or after is None:
+            print(f"{name:<24} {before if before is not None else '-':>10} {after if after is not None else '-':>10}")
+            continue
+
+        change = (after - before) / before if before else 0.0
+
+        if name == "error_rate":
+            regressed = after - before > 0.01
+        elif higher_is_worse:
+            regressed = change > tolerance and after - before > min_delta_ms
+        else:
+            regressed = change < -tolerance
+
+        if regressed:
+            regressions.append(name)
+
+        print(f"{name:<24} {before:>10} {after:>10} {change:>+8.1%}{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("capture", help="capture file written with WEBHOOK_CAPTURE_ENABLED")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed relative to the original timing")
+    parser.add_argument("--limit", type=int, help="replay only the first requests of the capture")
+    parser.add_argument("--app-dir", help="checkout of the application to run (default: this one)")
+    parser.add_argument("--baseline", help="report of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="relative change tolerated before a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="latency change always tolerated")
+    add_run_arguments(parser)
+    args = parser.parse_args()
+    default_database_url(args)
+
+    if args.speed <= 0:
+        parser.error("--speed must be positive")
+
+    requests = load_requests(args.capture, args.speed, args.limit)
+    if not requests:
+        parser.error(f"{args.capture} holds no webhook events")
+
+    report = asyncio.run(run(args, requests))
+    report["capture"] = args.capture
+    report["speed"] = args.speed
+    finish(args, report)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+
+        print()
+        regressions = compare(baseline, report, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print(f"\nRegressed: {', '.join(regressions)}")
+            sys.exit(1)
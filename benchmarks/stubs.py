@@ -0,0 +1,198 @@
+"""
+Local stub servers used by the benchmarks.
+
+The stubs imitate the external APIs closely enough for the application to
+talk to them, with a configurable response latency and error rate, so
+benchmarks measure our own overhead instead of the real services.
+"""
+import asyncio
+import random
+import socket
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+def free_port() -> int:
+    """
+    Find a free local TCP port.
+
+    Returns:
+        int: Port number.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def parse_latency(spec: str, rng: Optional[random.Random] = None) -> Callable[[], float]:
+    """
+    Parse a latency distribution.
+
+    Args:
+        spec: `fixed:MS`, `uniform:LOW_MS:HIGH_MS` or `lognormal:MEDIAN_MS:SIGMA`.
+            A plain number is read as `fixed`.
+        rng: Random number generator.
+
+    Returns:
+        Callable[[], float]: Function drawing a latency in milliseconds.
+
+    Raises:
+        ValueError: If the specification cannot be parsed.
+    """
+    rng = rng or random.Random()
+    kind, _, params = spec.partition(":")
+
+    try:
+        if not params:
+            latency_ms = float(kind)
+            return lambda: latency_ms
+
+        values = [float(value) for value in params.split(":")]
+
+        if kind == "fixed" and len(values) == 1:
+            return lambda: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda: rng.uniform(values[0], values[1])
+        if kind == "lognormal" and len(values) == 2:
+            return lambda: values[0] * rng.lognormvariate(0.0, values[1])
+
+    except ValueError:
+        pass
+
+    raise ValueError(f"Invalid latency distribution: {spec}")
+
+class StubBehaviour:
+    """Latency and error rate of a stub server, with counters of the requests it served."""
+
+    def __init__(self, latency: str = "fixed:0", error_rate: float = 0.0, error_status: int = 500, seed: Optional[int] = None):
+        """
+        Initialize the behaviour.
+
+        Args:
+            latency: Latency distribution, see `parse_latency`.
+            error_rate: Fraction of requests answered with `error_status`.
+            error_status: HTTP status of failed requests.
+            seed: Random seed.
+        """
+        self.rng = random.Random(seed)
+        self.latency = parse_latency(latency, self.rng)
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+        self.requests = 0
+        self.errors = 0
+
+    async def respond(self) -> Optional[JSONResponse]:
+        """
+        Wait for the drawn latency and decide whether the request fails.
+
+        Returns:
+            Optional[JSONResponse]: Error response, or None if the request succeeds.
+        """
+        self.requests += 1
+
+        latency_ms = self.latency()
+        if latency_ms > 0:
+            await asyncio.sleep(latency_ms / 1000)
+
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            return JSONResponse({"message": "Stub error"}, status_code=self.error_status)
+
+        return None
+
+def create_makkaizou_stub(latency_ms: float = 0.0, behaviour: Optional[StubBehaviour] = None) -> FastAPI:
+    """
+    Create a stub of the Makkaizou prompt endpoint.
+
+    Args:
+        latency_ms: Delay before each response, in milliseconds.
+        behaviour: Latency distribution and error rate; overrides `latency_ms`.
+
+    Returns:
+        FastAPI: Stub application serving `POST /`.
+    """
+    app = FastAPI()
+    behaviour = behaviour or StubBehaviour(f"fixed:{latency_ms}")
+
+    @app.post("/")
+    async def prompt(request: Request):
+        form = parse_qs((await request.body()).decode("utf-8"))
+        error = await behaviour.respond()
+        if error is not None:
+            return error
+        return {
+            "message": f"Echo: {form.get('message', [''])[0]}",
+            "talk_id": form.get("talk_id", [""])[0],
+            "references": []
+        }
+
+    return app
+
+def create_line_stub(behaviour: Optional[StubBehaviour] = None) -> FastAPI:
+    """
+    Create a stub of the LINE reply and push message endpoints.
+
+    Delivered messages are recorded in `app.state.deliveries` as tuples of the
+    method (`reply` or `push`), the reply token or push target, and the
+    `time.time()` at which the stub accepted them.
+
+    Args:
+        behaviour: Latency distribution and error rate.
+
+    Returns:
+        FastAPI: Stub application serving `POST /v2/bot/message/reply` and `/push`.
+    """
+    app = FastAPI()
+    behaviour = behaviour or StubBehaviour()
+    deliveries: List[Tuple[str, str, float]] = []
+    app.state.deliveries = deliveries
+
+    @app.post("/v2/bot/message/reply")
+    async def reply(request: Request):
+        payload = await request.json()
+        error = await behaviour.respond()
+        if error is not None:
+            return error
+        deliveries.append(("reply", payload.get("replyToken", ""), time.time()))
+        return {}
+
+    @app.post("/v2/bot/message/push")
+    async def push(request: Request):
+        payload = await request.json()
+        error = await behaviour.respond()
+        if error is not None:
+            return error
+        deliveries.append(("push", payload.get("to", ""), time.time()))
+        return {}
+
+    return app
+
+@asynccontextmanager
+async def serve(app: FastAPI, port: int) -> AsyncIterator[str]:
+    """
+    Serve an application on localhost for the duration of the context.
+
+    Args:
+        app: Application to serve.
+        port: Port to listen on.
+
+    Yields:
+        str: Base URL of the server.
+    """
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+
+    while not server.started:
+        await asyncio.sleep(0.01)
+
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        await task
@@ -0,0 +1,110 @@
+import json
+import httpx
+import pytest
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.database.database import Base
+from app.services import makkaizou_service as makkaizou_service_module
+from app.services.http_client import PooledHTTPClient
+
+# Mentionee entry of a message starting with "@bot "
+BOT_MENTION = {"index": 0, "length": 4, "type": "user", "userId": "Ubot", "isSelf": True}
+
+@pytest_asyncio.fixture
+async def session_factory(tmp_path):
+    """Create a session factory for a temporary SQLite database."""
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+
+    yield async_sessionmaker(engine, expire_on_commit=False)
+
+    await engine.dispose()
+
+@pytest.fixture
+def webhook_event():
+    """
+    Build webhook events of a group text message.
+
+    The returned function takes the message text and keyword overrides of the
+    IDs: `group_id`, `user_id`, `event_id`, `reply_token`, `redelivery`, and
+    `mentionees` for a message with mentions.
+    """
+    def build(
+        text: str = "Good morning!",
+        mentionees=None,
+        group_id: str = "G1",
+        user_id: str = "U1",
+        event_id: str = "01H00000000000000000000001",
+        reply_token: str = "reply-1",
+        redelivery: bool = False
+    ) -> dict:
+        message = {"id": "444573844083572737", "type": "text", "text": text}
+        if mentionees is not None:
+            message["mention"] = {"mentionees": mentionees}
+
+        return {
+            "type": "message",
+            "mode": "active",
+            "timestamp": 1700000000000,
+            "source": {"type": "group", "groupId": group_id, "userId": user_id},
+            "webhookEventId": event_id,
+            "deliveryContext": {"isRedelivery": redelivery},
+            "replyToken": reply_token,
+            "message": message
+        }
+
+    return build
+
+@pytest.fixture
+def webhook_body():
+    """Encode webhook events as a request body sent to the bot `Ubot`."""
+    def encode(*events: dict) -> bytes:
+        return json.dumps({"destination": "Ubot", "events": list(events)}).encode("utf-8")
+
+    return encode
+
+@pytest.fixture
+def mock_http_client():
+    """
+    Build pooled HTTP clients whose requests are answered by a handler.
+
+    The handler receives an `httpx.Request` and returns an `httpx.Response`.
+    """
+    def build(handler) -> PooledHTTPClient:
+        http_client = PooledHTTPClient(
+            name="test",
+            max_connections=1,
+            max_keepalive_connections=1,
+            keepalive_expiry=1.0,
+            connect_timeout=1.0,
+            read_timeout=1.0,
+            write_timeout=1.0,
+            pool_timeout=1.0
+        )
+        http_client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return http_client
+
+    return build
+
+@pytest.fixture
+def makkaizou_api(monkeypatch):
+    """
+    Answer the requests of the shared Makkaizou client with a fixed JSON body.
+
+    The returned function takes the body and returns the list the requests
+    are recorded in.
+    """
+    def answer(body: dict) -> list:
+        requests = []
+
+        def handler(request):
+            requests.append(request)
+            return httpx.Response(200, json=body)
+
+        http_client = makkaizou_service_module.makkaizou_http_client
+        monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        return requests
+
+    return answer
@@ -0,0 +1,93 @@
+import asyncio
+import time
+import pytest
+
+from app.config import settings
+from app.services.admission import IN_FLIGHT, LOOP_LAG, QUEUE_DEPTH, AdmissionController
+from app.services.event_scheduler import GroupScheduler
+from app.utils.loop_lag import LoopLagMonitor
+from app.utils.validators import LineWebhookEvent
+
+@pytest.mark.asyncio
+async def test_mentions_over_the_in_flight_limit_are_shed():
+    """Test that events in processing and events of the same request count towards the limit."""
+    scheduler = GroupScheduler(max_concurrent_groups=4)
+    await scheduler.start()
+    release = asyncio.Event()
+    scheduler.submit("G1", release.wait)
+
+    controller = AdmissionController(scheduler, LoopLagMonitor(interval=1), max_in_flight=3, max_queue_depth=0, max_loop_lag=0)
+    admitted, shed = controller.admit(["a", "b", "c"])
+
+    assert (admitted, shed) == (["a", "b"], ["c"])
+    assert controller.stats()["shed_by_reason"][IN_FLIGHT] == 1
+
+    release.set()
+    await scheduler.stop(timeout=1)
+
+@pytest.mark.asyncio
+async def test_mentions_are_shed_while_events_wait_for_a_slot():
+    """Test that events waiting behind busy groups count towards the queue depth."""
+    scheduler = GroupScheduler(max_concurrent_groups=1)
+    await scheduler.start()
+    release = asyncio.Event()
+    scheduler.submit("G1", release.wait)
+    scheduler.submit("G2", release.wait)
+    await asyncio.sleep(0)
+
+    controller = AdmissionController(scheduler, LoopLagMonitor(interval=1), max_in_flight=0, max_queue_depth=1, max_loop_lag=0)
+
+    assert controller.overload() == QUEUE_DEPTH
+
+    release.set()
+    await scheduler.stop(timeout=1)
+    assert controller.overload() is None
+
+@pytest.mark.asyncio
+async def test_mentions_are_shed_while_the_event_loop_lags():
+    """Test that a blocked event loop sheds mentions."""
+    lag_monitor = LoopLagMonitor(interval=0.01)
+    await lag_monitor.start()
+    controller = AdmissionController(GroupScheduler(max_concurrent_groups=1), lag_monitor, max_in_flight=0, max_queue_depth=0, max_loop_lag=0.05)
+
+    await asyncio.sleep(0.02)
+    assert controller.overload() is None
+
+    # Block the event loop
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+
+    assert controller.overload() == LOOP_LAG
+    assert lag_monitor.stats()["max_lag_ms"] >= 50
+
+    await lag_monitor.stop()
+
+@pytest.mark.asyncio
+async def test_busy_replies_are_sent_in_the_background(monkeypatch, session_factory, webhook_event):
+    """Test that shed mentions are replied to without waiting for LINE, and stopping waits for the replies."""
+    monkeypatch.setattr(settings, "ADMISSION_BUSY_MESSAGE", "Busy, try again later.")
+    controller = AdmissionController(
+        GroupScheduler(max_concurrent_groups=1),
+        LoopLagMonitor(interval=1),
+        max_in_flight=0,
+        max_queue_depth=0,
+        max_loop_lag=0,
+        session_factory=session_factory
+    )
+    replied = []
+
+    async def reply_busy(db, events):
+        await asyncio.sleep(0.05)
+        replied.extend(event.replyToken for event in events)
+
+    monkeypatch.setattr(controller, "reply_busy", reply_busy)
+
+    controller.send_busy_replies([LineWebhookEvent(**webhook_event())])
+
+    assert replied == []
+    assert controller.stats()["busy_replies_in_flight"] == 1
+
+    await controller.stop(timeout=1)
+
+    assert replied == ["reply-1"]
+    assert controller.stats()["busy_replies_in_flight"] == 0
@@ -0,0 +1,34 @@
+import time
+
+from app.utils.cache import TTLCache
+
+def test_least_recently_used_entry_is_evicted():
+    """Test that the cache evicts the least recently used entry when full."""
+    cache = TTLCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_expired_entries_are_missing(monkeypatch):
+    """Test that entries expire after their time to live."""
+    now = time.monotonic()
+    monkeypatch.setattr(time, "monotonic", lambda: now)
+
+    cache = TTLCache(max_size=10, ttl=5)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+
+    monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+
+    assert cache.get("a") is None
+    assert cache.get("b") == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
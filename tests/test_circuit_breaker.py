@@ -0,0 +1,93 @@
+import pytest
+
+from app.services import makkaizou_service as makkaizou_service_module
+from app.services.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from app.services.makkaizou_service import MakkaizouService
+
+@pytest.fixture
+def breaker() -> CircuitBreaker:
+    """Circuit breaker opening after 3 failures, with a timeout adapting after 10 calls."""
+    return CircuitBreaker(
+        name="test",
+        failure_threshold=3,
+        recovery_timeout=60,
+        half_open_max_calls=1,
+        window_size=100,
+        min_samples=10,
+        timeout_multiplier=2,
+        min_timeout=0.5,
+        max_timeout=30
+    )
+
+def test_circuit_opens_after_consecutive_failures(breaker):
+    """Test that the circuit opens after the failure threshold and rejects calls."""
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    stats = breaker.stats()
+    assert stats["trips"] == 1
+    assert stats["rejected"] == 1
+
+def test_success_resets_the_failure_count(breaker):
+    """Test that failures must be consecutive to open the circuit."""
+    for _ in range(5):
+        breaker.record_failure()
+        breaker.record_failure()
+        breaker.record_success(0.1)
+
+    assert breaker.state == CLOSED
+
+def test_half_open_trial_closes_or_reopens_the_circuit(breaker):
+    """Test that one trial call is let through after the recovery timeout."""
+    breaker.failure_threshold = 1
+    breaker.recovery_timeout = 0
+
+    breaker.record_failure()
+    assert breaker.state == HALF_OPEN
+
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_failure()
+    assert breaker.stats()["trips"] == 2
+
+    breaker.before_call()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+
+def test_timeout_follows_the_p99_latency(breaker):
+    """Test that the timeout adapts to recent latencies within its bounds."""
+    assert breaker.timeout() == 30
+
+    for _ in range(99):
+        breaker.record_success(1.0)
+    breaker.record_success(2.0)
+    assert breaker.timeout() == 2.0
+
+    for _ in range(100):
+        breaker.record_success(0.01)
+    assert breaker.timeout() == 0.5
+
+    for _ in range(100):
+        breaker.record_success(60.0)
+    assert breaker.timeout() == 30
+
+@pytest.mark.asyncio
+async def test_open_circuit_skips_the_request(monkeypatch, makkaizou_api, breaker):
+    """Test that MakkaizouService fails fast without calling the API while the circuit is open."""
+    requests = makkaizou_api({"message": "hi"})
+    breaker.failure_threshold = 1
+    breaker.record_failure()
+    monkeypatch.setattr(makkaizou_service_module, "makkaizou_circuit_breaker", breaker)
+
+    result = await MakkaizouService(None).process_prompt("talk", "hello")
+
+    assert result["status"] == "error"
+    assert result["circuit_open"] is True
+    assert requests == []
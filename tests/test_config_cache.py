@@ -0,0 +1,78 @@
+import pytest
+from datetime import datetime
+from sqlalchemy import update
+
+from app.database.models import LineAccount, MakkaizouConfig
+from app.services.config_cache import ConfigCache
+
+def make_account(name: str, is_active: bool = True) -> LineAccount:
+    """
+    Create a LINE account for testing.
+
+    Args:
+        name: Account name.
+        is_active: Whether the account is active.
+
+    Returns:
+        LineAccount: Generated account.
+    """
+    return LineAccount(
+        account_name=name,
+        channel_id=f"channel-{name}",
+        channel_secret="secret",
+        channel_access_token=f"token-{name}",
+        webhook_url="https://example.com/webhook",
+        is_active=is_active
+    )
+
+@pytest.mark.asyncio
+async def test_default_row_is_loaded_once(session_factory):
+    """Test that repeated lookups of the default row are served from the cache."""
+    cache = ConfigCache(session_factory, ttl=60, refresh_interval=0)
+
+    async with session_factory() as db:
+        db.add_all([make_account("inactive", is_active=False), make_account("main")])
+        await db.commit()
+
+    async with session_factory() as db:
+        first = await cache.get(db, LineAccount)
+        second = await cache.get(db, LineAccount)
+
+    assert first is second
+    assert first.channel_access_token == "token-main"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["reloads"] == 1
+
+@pytest.mark.asyncio
+async def test_missing_row_is_cached(session_factory):
+    """Test that the absence of an active row is cached as well."""
+    cache = ConfigCache(session_factory, ttl=60, refresh_interval=0)
+
+    async with session_factory() as db:
+        assert await cache.get(db, MakkaizouConfig) is None
+        assert await cache.get(db, MakkaizouConfig) is None
+
+    assert cache.stats()["reloads"] == 1
+
+@pytest.mark.asyncio
+async def test_refresh_detects_changes_from_other_processes(session_factory):
+    """Test that a change signature mismatch invalidates the cached rows."""
+    cache = ConfigCache(session_factory, ttl=60, refresh_interval=0)
+
+    async with session_factory() as db:
+        db.add(make_account("main"))
+        await db.commit()
+
+    async with session_factory() as db:
+        await cache.get(db, LineAccount)
+        await cache._check_for_changes(db, LineAccount)
+
+        # A bulk UPDATE does not fire ORM events, like a write from another process
+        await db.execute(update(LineAccount).values(channel_access_token="rotated", updated_at=datetime(2030, 1, 1)))
+        await db.commit()
+
+        await cache._check_for_changes(db, LineAccount)
+        account = await cache.get(db, LineAccount)
+
+    assert account.channel_access_token == "rotated"
+    assert cache.stats()["reloads"] == 2
@@ -0,0 +1,107 @@
+import asyncio
+import time
+import pytest
+
+from app.services.message_service import Mention, MessageService
+from app.utils.debounce import Debouncer
+
+def make_debouncer(window_seconds: float = 0.05, max_items: int = 3):
+    """
+    Create a started debouncer that records its batches.
+
+    Args:
+        window_seconds: Seconds a batch stays open.
+        max_items: Number of items after which a batch is flushed.
+
+    Returns:
+        Tuple[Debouncer, list]: The debouncer and the (key, items) batches it flushed.
+    """
+    batches = []
+
+    async def flush(key, items):
+        batches.append((key, items))
+
+    debouncer = Debouncer(window_seconds=window_seconds, max_items=max_items, flush=flush)
+    debouncer._running = True
+    return debouncer, batches
+
+@pytest.mark.asyncio
+async def test_items_within_the_window_are_merged():
+    """Test that items of a key added within the window are flushed together."""
+    debouncer, batches = make_debouncer()
+
+    assert debouncer.add("a", 1) == 1
+    assert debouncer.add("a", 2) == 2
+    debouncer.add("b", 3)
+    await asyncio.sleep(0.1)
+
+    assert sorted(batches) == [("a", [1, 2]), ("b", [3])]
+    assert debouncer.stats()["merged"] == 1
+
+@pytest.mark.asyncio
+async def test_full_batch_is_flushed_right_away():
+    """Test that a batch holding the maximum number of items does not wait for the window."""
+    debouncer, batches = make_debouncer(window_seconds=60, max_items=2)
+
+    debouncer.add("a", 1)
+    assert debouncer.add("a", 2) == 0
+    await asyncio.sleep(0)
+
+    assert batches == [("a", [1, 2])]
+    assert debouncer.stats()["open_batches"] == 0
+
+@pytest.mark.asyncio
+async def test_stop_flushes_open_batches():
+    """Test that stopping the debouncer does not lose the open batches."""
+    debouncer, batches = make_debouncer(window_seconds=60)
+
+    debouncer.add("a", 1)
+    await debouncer.stop(timeout=1)
+
+    assert batches == [("a", [1])]
+    with pytest.raises(RuntimeError):
+        debouncer.add("a", 2)
+
+class FakeMakkaizouService:
+    """Makkaizou service recording the prompts it was sent."""
+
+    api_key = "key"
+    learning_model_code = "model"
+
+    def __init__(self):
+        self.prompts = []
+
+    async def process_prompt(self, talk_id, prompt, deadline=None):
+        self.prompts.append(prompt)
+        return {"status": "success", "response": {"message": "answer"}}
+
+class FakeLineService:
+    """LINE service recording the answers it delivered."""
+
+    line_account = None
+
+    def __init__(self):
+        self.deliveries = []
+
+    async def deliver(self, reply_token, to, message, reply_deadline):
+        self.deliveries.append((reply_token, message))
+        return {"status": "success", "method": "reply"}
+
+@pytest.mark.asyncio
+async def test_merged_mentions_are_answered_once(session_factory):
+    """Test that merged mentions are sent as one prompt and answered with the newest reply token."""
+    makkaizou_service = FakeMakkaizouService()
+    line_service = FakeLineService()
+    now = time.time()
+    mentions = [
+        Mention("G1", "U1", "@bot hello", "token-1", now + 60, now),
+        Mention("G1", "U1", "@bot are you there?", "token-2", now + 61, now + 1)
+    ]
+
+    async with session_factory() as db:
+        service = MessageService(db, line_service, makkaizou_service)
+        result = await service._answer("talk-1", mentions)
+
+    assert result["status"] == "success"
+    assert makkaizou_service.prompts == ["@bot hello\n@bot are you there?"]
+    assert line_service.deliveries == [("token-2", "answer")]
@@ -0,0 +1,117 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update
+
+from app.database.models import ProcessedEvent
+from app.services import message_service as message_service_module
+from app.services.event_dedup import EventDeduplicator
+from app.services.message_service import MessageService
+from app.utils.validators import LineWebhookEvent
+from tests.conftest import BOT_MENTION
+
+@pytest.mark.asyncio
+async def test_redelivered_event_is_rejected_from_memory(session_factory, webhook_event):
+    """Test that the same process rejects a redelivery without the database."""
+    deduplicator = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+
+    event = LineWebhookEvent(**webhook_event(event_id="event-1"))
+    redelivery = LineWebhookEvent(**webhook_event(event_id="event-1", redelivery=True))
+
+    async with session_factory() as db:
+        assert await deduplicator.claim(db, event) is True
+        assert await deduplicator.claim(db, redelivery) is False
+
+    stats = deduplicator.stats()
+    assert stats["memory_hits"] == 1
+    assert stats["redeliveries"] == 1
+    assert stats["hit_rate"] == 0.5
+
+@pytest.mark.asyncio
+async def test_event_claimed_by_another_worker_is_rejected(session_factory, webhook_event):
+    """Test that the database tier catches events claimed by another process."""
+    first_worker = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+    second_worker = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+
+    event = LineWebhookEvent(**webhook_event(event_id="event-1"))
+    redelivery = LineWebhookEvent(**webhook_event(event_id="event-1", redelivery=True))
+
+    async with session_factory() as db:
+        assert await first_worker.claim(db, event) is True
+        assert await second_worker.claim(db, redelivery) is False
+
+    assert second_worker.stats()["database_hits"] == 1
+
+@pytest.mark.asyncio
+async def test_events_without_id_are_always_claimed(session_factory, webhook_event):
+    """Test that events without a webhookEventId are never treated as duplicates."""
+    deduplicator = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+    event = LineWebhookEvent(**webhook_event(event_id=None))
+
+    async with session_factory() as db:
+        assert await deduplicator.claim(db, event) is True
+        assert await deduplicator.claim(db, event) is True
+
+    assert deduplicator.stats()["checks"] == 0
+
+@pytest.mark.asyncio
+async def test_released_event_is_processed_again(session_factory, webhook_event):
+    """Test that a redelivery of an event whose processing failed is claimed again, unlike a completed one."""
+    deduplicator = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+    failed = LineWebhookEvent(**webhook_event(event_id="event-1"))
+    answered = LineWebhookEvent(**webhook_event(event_id="event-2"))
+
+    async with session_factory() as db:
+        assert await deduplicator.claim(db, failed) is True
+        await deduplicator.release(db, failed)
+
+        assert await deduplicator.claim(db, answered) is True
+        await deduplicator.complete(db, answered)
+
+    # Another worker gets the redeliveries
+    other_worker = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=0)
+
+    async with session_factory() as db:
+        assert await deduplicator.claim(db, failed) is True
+        assert await other_worker.claim(db, answered) is False
+
+@pytest.mark.asyncio
+async def test_stale_claim_of_a_dead_worker_is_taken_over(session_factory, webhook_event):
+    """Test that a claim never completed is taken over after the claim timeout only."""
+    event = LineWebhookEvent(**webhook_event(event_id="event-1"))
+    dead_worker = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+    other_worker = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+    later_worker = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+
+    async with session_factory() as db:
+        assert await dead_worker.claim(db, event) is True
+        assert await other_worker.claim(db, event) is False
+
+        claimed_at = datetime.now(timezone.utc) - timedelta(seconds=120)
+        await db.execute(update(ProcessedEvent).values(created_at=claimed_at))
+        await db.commit()
+
+        assert await later_worker.claim(db, event) is True
+
+    assert later_worker.stats()["takeovers"] == 1
+
+@pytest.mark.asyncio
+async def test_failed_processing_gives_the_event_back(session_factory, webhook_event, monkeypatch):
+    """Test that MessageService releases the claim when processing a mention raises."""
+    deduplicator = EventDeduplicator(ttl_seconds=60, memory_size=10, purge_interval=60, claim_timeout=60)
+    monkeypatch.setattr(message_service_module, "event_deduplicator", deduplicator)
+
+    async def fail(event, start_time):
+        raise RuntimeError("database is gone")
+
+    event = LineWebhookEvent(**webhook_event("@bot hello", [BOT_MENTION], event_id="event-1"))
+
+    async with session_factory() as db:
+        service = MessageService(db, None, None)
+        monkeypatch.setattr(service, "_process_mention", fail)
+
+        with pytest.raises(RuntimeError):
+            await service.process_event(event)
+
+        assert await deduplicator.claim(db, event) is True
+
+    assert deduplicator.stats()["released"] == 1
@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+
+from app.services import event_queue as event_queue_module
+from app.services.event_queue import EventQueue
+from app.services.event_scheduler import GroupScheduler
+from app.utils.validators import LineWebhookEvent
+
+class RecordingMessageService:
+    """Stand-in for MessageService that records processed events."""
+
+    processed = []
+
+    def __init__(self, db):
+        self.db = db
+
+    @classmethod
+    async def create(cls, db):
+        return cls(db)
+
+    async def process_event(self, event):
+        await asyncio.sleep(0.01)
+        RecordingMessageService.processed.append(event.message["text"])
+
+@pytest.fixture
+def recording_service(monkeypatch):
+    """Replace MessageService in the event queue with a recording stand-in."""
+    RecordingMessageService.processed = []
+    monkeypatch.setattr(event_queue_module, "MessageService", RecordingMessageService)
+    return RecordingMessageService
+
+@pytest.mark.asyncio
+async def test_enqueue_requires_running_queue(recording_service, webhook_event):
+    """Test that events are not accepted before the queue is started."""
+    scheduler = GroupScheduler(max_concurrent_groups=2)
+    await scheduler.start()
+    queue = EventQueue(scheduler, max_size=10)
+
+    assert queue.enqueue(LineWebhookEvent(**webhook_event("hello"))) is False
+
+    await scheduler.stop(timeout=1.0)
+
+@pytest.mark.asyncio
+async def test_stop_drains_queued_events(recording_service, webhook_event):
+    """Test that stopping the scheduler processes everything already queued."""
+    scheduler = GroupScheduler(max_concurrent_groups=2)
+    await scheduler.start()
+    queue = EventQueue(scheduler, max_size=10)
+    queue.start()
+
+    for n in range(5):
+        assert queue.enqueue(LineWebhookEvent(**webhook_event(f"message {n}")))
+
+    queue.stop()
+    await scheduler.stop(timeout=5.0)
+
+    assert recording_service.processed == [f"message {n}" for n in range(5)]
+    assert queue.stats()["accepted"] == 5
+    assert queue.depth == 0
+
+@pytest.mark.asyncio
+async def test_enqueue_rejects_when_full(recording_service, webhook_event):
+    """Test that a full queue rejects new events instead of blocking."""
+    scheduler = GroupScheduler(max_concurrent_groups=1)
+    await scheduler.start()
+    queue = EventQueue(scheduler, max_size=1)
+    queue.start()
+
+    results = [queue.enqueue(LineWebhookEvent(**webhook_event(f"message {n}"))) for n in range(3)]
+
+    await scheduler.stop(timeout=5.0)
+
+    assert results == [True, False, False]
@@ -0,0 +1,95 @@
+import asyncio
+import pytest
+
+from app.services.event_scheduler import GroupScheduler, event_group_key
+from app.utils.validators import LineWebhookEvent
+
+@pytest.mark.asyncio
+async def test_jobs_of_one_group_run_in_order():
+    """Test that jobs of the same group run one after another in submission order."""
+    scheduler = GroupScheduler(max_concurrent_groups=4)
+    await scheduler.start()
+
+    order = []
+
+    async def job(n):
+        # Later jobs finish faster, so any overlap would reorder them
+        await asyncio.sleep(0.01 * (5 - n))
+        order.append(n)
+
+    futures = [scheduler.submit("group-1", lambda n=n: job(n)) for n in range(5)]
+    await asyncio.gather(*futures)
+    await scheduler.stop(timeout=1.0)
+
+    assert order == [0, 1, 2, 3, 4]
+
+@pytest.mark.asyncio
+async def test_groups_run_in_parallel_up_to_limit():
+    """Test that different groups run concurrently, bounded by the limit."""
+    scheduler = GroupScheduler(max_concurrent_groups=2)
+    await scheduler.start()
+
+    running = 0
+    max_running = 0
+
+    async def job():
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    futures = [scheduler.submit(f"group-{n}", job) for n in range(6)]
+    await asyncio.gather(*futures)
+    await scheduler.stop(timeout=1.0)
+
+    assert max_running == 2
+
+@pytest.mark.asyncio
+async def test_idle_lanes_are_evicted():
+    """Test that a lane is removed once its jobs are done."""
+    scheduler = GroupScheduler(max_concurrent_groups=2)
+    await scheduler.start()
+
+    async def job():
+        return "done"
+
+    results = await asyncio.gather(*[scheduler.submit(f"group-{n}", job) for n in range(3)])
+    await asyncio.sleep(0)
+
+    stats = scheduler.stats()
+    await scheduler.stop(timeout=1.0)
+
+    assert results == ["done", "done", "done"]
+    assert stats["active_lanes"] == 0
+    assert stats["evicted_lanes"] == 3
+    assert stats["pending"] == 0
+
+@pytest.mark.asyncio
+async def test_job_errors_are_returned_to_caller():
+    """Test that a failing job does not stop the rest of its lane."""
+    scheduler = GroupScheduler(max_concurrent_groups=1)
+    await scheduler.start()
+
+    async def failing():
+        raise ValueError("boom")
+
+    async def succeeding():
+        return "ok"
+
+    failed = scheduler.submit("group-1", failing)
+    succeeded = scheduler.submit("group-1", succeeding)
+
+    with pytest.raises(ValueError):
+        await failed
+    assert await succeeded == "ok"
+
+    await scheduler.stop(timeout=1.0)
+
+def test_event_group_key_falls_back_to_user(webhook_event):
+    """Test the scheduling key for group and one-to-one events."""
+    group_event = LineWebhookEvent(**webhook_event(group_id="group-1", user_id="user-1"))
+    user_event = LineWebhookEvent(**{**webhook_event(), "source": {"type": "user", "userId": "user-1"}})
+
+    assert event_group_key(group_event) == "group-1"
+    assert event_group_key(user_event) == "user-1"
@@ -0,0 +1,134 @@
+import asyncio
+import httpx
+import pytest
+import pytest_asyncio
+
+from app.services.http_client import PooledHTTPClient
+
+class KeepAliveServer:
+    """HTTP/1.1 server answering every request with `{}`, counting its connections."""
+
+    def __init__(self):
+        self.delay = 0.0
+        self.opened = 0
+        self.open = 0
+        self.max_open = 0
+        self.closed = asyncio.Event()
+        self.url = ""
+        self._server = None
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.url = f"http://127.0.0.1:{self._server.sockets[0].getsockname()[1]}/"
+
+    async def stop(self) -> None:
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.opened += 1
+        self.open += 1
+        self.max_open = max(self.max_open, self.open)
+
+        try:
+            while True:
+                try:
+                    await reader.readuntil(b"\r\n\r\n")
+                except asyncio.IncompleteReadError:
+                    break
+
+                await asyncio.sleep(self.delay)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+
+        finally:
+            self.open -= 1
+            self.closed.set()
+            writer.close()
+
+@pytest_asyncio.fixture
+async def server():
+    """Start a local keep-alive HTTP server."""
+    server = KeepAliveServer()
+    await server.start()
+    yield server
+    await server.stop()
+
+def pooled_client(max_connections: int, pool_timeout: float = 1.0) -> PooledHTTPClient:
+    """
+    Create a pooled client keeping all of its connections alive.
+
+    Args:
+        max_connections: Maximum number of open connections.
+        pool_timeout: Seconds to wait for a free connection.
+
+    Returns:
+        PooledHTTPClient: Client, not started.
+    """
+    return PooledHTTPClient(
+        name="test",
+        max_connections=max_connections,
+        max_keepalive_connections=max_connections,
+        keepalive_expiry=60,
+        connect_timeout=1.0,
+        read_timeout=1.0,
+        write_timeout=1.0,
+        pool_timeout=pool_timeout
+    )
+
+@pytest.mark.asyncio
+async def test_connection_is_reused_across_requests(server):
+    """Test that sequential requests of a started client share one connection."""
+    client = pooled_client(max_connections=4)
+    await client.start()
+
+    for _ in range(3):
+        assert (await client.request("GET", server.url)).json() == {}
+
+    stats = client.stats()
+    await client.stop()
+
+    assert server.opened == 1
+    assert (stats["requests"], stats["connections"], stats["idle_connections"]) == (3, 1, 1)
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_are_bounded_by_the_pool(server):
+    """Test that concurrent requests never open more than the maximum number of connections."""
+    server.delay = 0.05
+    client = pooled_client(max_connections=2)
+    await client.start()
+
+    await asyncio.gather(*[client.request("GET", server.url) for _ in range(6)])
+
+    assert server.max_open == 2
+    assert client.stats()["max_in_flight"] == 6
+
+    # A request waiting longer than the pool timeout for a connection fails
+    client.timeout = httpx.Timeout(1.0, pool=0.01)
+    await client.stop()
+    await client.start()
+
+    results = await asyncio.gather(*[client.request("GET", server.url) for _ in range(3)], return_exceptions=True)
+    await client.stop()
+
+    assert sum(isinstance(result, httpx.PoolTimeout) for result in results) == 1
+    assert client.stats()["errors"] == 1
+
+@pytest.mark.asyncio
+async def test_stop_closes_the_pooled_connections(server):
+    """Test that stopping the client closes its idle connections and later calls use their own."""
+    client = pooled_client(max_connections=1)
+    await client.start()
+    await client.request("GET", server.url)
+
+    await client.stop()
+    await asyncio.wait_for(server.closed.wait(), timeout=1)
+
+    assert server.open == 0
+    assert not client.running
+
+    # Without the shared client, each call opens and closes a connection of its own
+    await client.request("GET", server.url)
+    await client.request("GET", server.url)
+
+    assert server.opened == 3
@@ -0,0 +1,61 @@
+import json
+import httpx
+import pytest
+from linebot.exceptions import LineBotApiError
+
+from app.services.line_client import LineMessagingClient
+
+API_ENDPOINT = "https://api.line.test/"
+
+@pytest.mark.asyncio
+async def test_reply_message_sends_token_and_messages(mock_http_client):
+    """Test the reply request sent to LINE API."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={})
+
+    client = LineMessagingClient(mock_http_client(handler), API_ENDPOINT)
+    response = await client.reply_message("access-token", "reply-token", [{"type": "text", "text": "hi"}])
+
+    assert response == {}
+    assert str(requests[0].url) == "https://api.line.test/v2/bot/message/reply"
+    assert requests[0].headers["Authorization"] == "Bearer access-token"
+    assert json.loads(requests[0].content) == {
+        "replyToken": "reply-token",
+        "messages": [{"type": "text", "text": "hi"}]
+    }
+
+@pytest.mark.asyncio
+async def test_push_message_raises_line_bot_api_error(mock_http_client):
+    """Test that LINE API error responses raise LineBotApiError."""
+    def handler(request):
+        return httpx.Response(
+            400,
+            json={"message": "Invalid reply token"},
+            headers={"x-line-request-id": "request-1"}
+        )
+
+    client = LineMessagingClient(mock_http_client(handler), API_ENDPOINT)
+
+    with pytest.raises(LineBotApiError) as exc_info:
+        await client.push_message("access-token", "group-1", [{"type": "text", "text": "hi"}])
+
+    assert exc_info.value.status_code == 400
+    assert exc_info.value.request_id == "request-1"
+    assert exc_info.value.error.message == "Invalid reply token"
+
+@pytest.mark.asyncio
+async def test_push_message_sends_retry_key(mock_http_client):
+    """Test that the retry key is sent with push messages."""
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={})
+
+    client = LineMessagingClient(mock_http_client(handler), API_ENDPOINT)
+    await client.push_message("access-token", "G1", [{"type": "text", "text": "hi"}], retry_key="key-1")
+
+    assert requests[0].headers["X-Line-Retry-Key"] == "key-1"
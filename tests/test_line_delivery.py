@@ -0,0 +1,82 @@
+import time
+import httpx
+import pytest
+
+from app.services.line_client import LineMessagingClient
+from app.services.line_service import LineService
+from app.services.retry import line_retry_policy
+
+INVALID_REPLY_TOKEN = httpx.Response(400, json={"message": "Invalid reply token"})
+
+@pytest.fixture
+def line_api(mock_http_client):
+    """
+    Build LINE services whose LINE API answers replies in a given way.
+
+    The returned function takes the outcomes of the reply attempts, responses
+    or exceptions to raise, the last one repeating, and returns the service
+    and the paths of the requests it sent. Other requests succeed.
+    """
+    def build(*replies):
+        replies = list(replies) or [httpx.Response(200, json={})]
+        paths = []
+
+        def handler(request):
+            paths.append(request.url.path)
+            if not request.url.path.endswith("/reply"):
+                return httpx.Response(200, json={})
+
+            reply = replies.pop(0) if len(replies) > 1 else replies[0]
+            if isinstance(reply, Exception):
+                raise reply
+            return reply
+
+        service = LineService(None)
+        service.line_client = LineMessagingClient(mock_http_client(handler), "https://api.line.test/")
+        return service, paths
+
+    return build
+
+@pytest.mark.asyncio
+async def test_fresh_token_is_used_for_a_reply(line_api):
+    """Test that a message is replied while the token is fresh."""
+    service, paths = line_api()
+
+    result = await service.deliver("reply-token", "G1", "hi", time.time() + 60)
+
+    assert result["status"] == "success"
+    assert result["method"] == "reply"
+    assert paths == ["/v2/bot/message/reply"]
+
+@pytest.mark.asyncio
+async def test_expiring_token_falls_back_to_push(line_api):
+    """Test that a token about to expire is not used."""
+    service, paths = line_api()
+
+    result = await service.deliver("reply-token", "G1", "hi", time.time() + 1)
+
+    assert result["method"] == "push"
+    assert paths == ["/v2/bot/message/push"]
+
+@pytest.mark.asyncio
+async def test_rejected_token_falls_back_to_push(line_api):
+    """Test that a push message is sent when LINE rejects the reply token."""
+    service, paths = line_api(INVALID_REPLY_TOKEN)
+
+    result = await service.deliver("reply-token", "G1", "hi", time.time() + 60)
+
+    assert result["status"] == "success"
+    assert result["method"] == "push"
+    assert paths == ["/v2/bot/message/reply", "/v2/bot/message/push"]
+
+@pytest.mark.asyncio
+async def test_token_rejected_after_a_timeout_is_not_pushed(line_api, monkeypatch):
+    """Test that a reply timing out and then rejected for its token is taken as delivered."""
+    monkeypatch.setattr(line_retry_policy, "base_delay", 0)
+    service, paths = line_api(httpx.ReadTimeout("no response"), INVALID_REPLY_TOKEN)
+
+    result = await service.deliver("reply-token", "G1", "hi", time.time() + 60)
+
+    assert result["status"] == "success"
+    assert result["uncertain"] is True
+    assert paths == ["/v2/bot/message/reply", "/v2/bot/message/reply"]
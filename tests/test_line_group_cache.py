@@ -0,0 +1,91 @@
+import asyncio
+import pytest
+from sqlalchemy import func, select
+
+from app.database.models import LineGroup
+from app.services.line_group_cache import LineGroupCache
+
+async def count_groups(session_factory) -> int:
+    """
+    Count the LINE group rows.
+
+    Args:
+        session_factory: Async session factory.
+
+    Returns:
+        int: Number of rows.
+    """
+    async with session_factory() as db:
+        return (await db.execute(select(func.count(LineGroup.id)))).scalar_one()
+
+@pytest.mark.asyncio
+async def test_group_is_created_once_and_cached(session_factory):
+    """Test that a new group is inserted once and then served from memory."""
+    cache = LineGroupCache(max_size=10)
+
+    async with session_factory() as db:
+        first = await cache.get_or_create(db, "group-1")
+        second = await cache.get_or_create(db, "group-1")
+
+    assert first == second
+    assert first.makkaizou_talk_id.startswith("line-")
+    assert await count_groups(session_factory) == 1
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["created"] == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_are_coalesced(session_factory):
+    """Test that concurrent lookups of the same group share a single query."""
+    cache = LineGroupCache(max_size=10)
+
+    async def lookup():
+        async with session_factory() as db:
+            return await cache.get_or_create(db, "group-1")
+
+    results = await asyncio.gather(*[lookup() for _ in range(5)])
+
+    assert len(set(results)) == 1
+    assert cache.stats()["coalesced"] == 4
+    assert await count_groups(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_the_leading_lookup_is_cancelled(session_factory, monkeypatch):
+    """Test that a lookup waiting for a cancelled one runs the lookup itself."""
+    cache = LineGroupCache(max_size=10)
+    load = cache._load
+    started = asyncio.Event()
+
+    async def slow_load(db, group_id):
+        started.set()
+        await asyncio.sleep(0.05)
+        return await load(db, group_id)
+
+    monkeypatch.setattr(cache, "_load", slow_load)
+
+    async def lookup():
+        async with session_factory() as db:
+            return await cache.get_or_create(db, "group-1")
+
+    leader = asyncio.create_task(lookup())
+    await started.wait()
+    waiter = asyncio.create_task(lookup())
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    group = await waiter
+
+    assert leader.cancelled()
+    assert group.makkaizou_talk_id.startswith("line-")
+    assert await count_groups(session_factory) == 1
+
+@pytest.mark.asyncio
+async def test_upsert_returns_the_existing_row(session_factory):
+    """Test that a second worker creating the same group gets the first worker's talk_id."""
+    async with session_factory() as db:
+        first = await LineGroupCache(max_size=10)._insert(db, "group-1", None)
+        second = await LineGroupCache(max_size=10)._insert(db, "group-1", None)
+
+    assert first == second
+    assert await count_groups(session_factory) == 1
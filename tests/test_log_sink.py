@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from sqlalchemy import func, select
+
+from app.database.models import ErrorLog, MessageLog
+from app.utils.log_sink import LogSink
+
+async def count(session_factory, model) -> int:
+    """
+    Count the rows of a table.
+
+    Args:
+        session_factory: Session factory of the database.
+        model: Model of the table.
+
+    Returns:
+        int: Number of rows.
+    """
+    async with session_factory() as db:
+        return (await db.execute(select(func.count()).select_from(model))).scalar_one()
+
+def message_values(n: int) -> dict:
+    """
+    Create the column values of a message log.
+
+    Args:
+        n: Message number.
+
+    Returns:
+        dict: Column values.
+    """
+    return {"line_group_id": "group-1", "user_id": "user-1", "message_text": f"message {n}", "is_mention": True}
+
+@pytest.mark.asyncio
+async def test_stop_flushes_buffered_records(session_factory):
+    """Test that buffered records of both tables are written on shutdown."""
+    sink = LogSink(session_factory, batch_size=100, flush_interval_ms=60000, max_buffer=100)
+    await sink.start()
+
+    for n in range(3):
+        sink.submit(MessageLog, message_values(n))
+    sink.submit(ErrorLog, {"error_type": "TestError", "error_message": "boom"})
+
+    assert await count(session_factory, MessageLog) == 0
+
+    await sink.stop()
+
+    assert await count(session_factory, MessageLog) == 3
+    assert await count(session_factory, ErrorLog) == 1
+    assert sink.stats()["written"] == 4
+
+@pytest.mark.asyncio
+async def test_full_batch_is_flushed_without_waiting(session_factory):
+    """Test that reaching the batch size triggers a flush before the interval."""
+    sink = LogSink(session_factory, batch_size=2, flush_interval_ms=60000, max_buffer=100)
+    await sink.start()
+
+    sink.submit(MessageLog, message_values(0))
+    sink.submit(MessageLog, message_values(1))
+
+    # Give the flush task a chance to run
+    for _ in range(50):
+        if sink.stats()["written"] == 2:
+            break
+        await asyncio.sleep(0.01)
+
+    written = sink.stats()["written"]
+    await sink.stop()
+
+    assert written == 2
+
+@pytest.mark.asyncio
+async def test_overflow_drops_oldest_records(session_factory):
+    """Test that a full buffer drops its oldest records."""
+    sink = LogSink(session_factory, batch_size=100, flush_interval_ms=60000, max_buffer=3)
+    await sink.start()
+
+    for n in range(5):
+        sink.submit(MessageLog, message_values(n))
+
+    await sink.stop()
+
+    async with session_factory() as db:
+        texts = (await db.execute(select(MessageLog.message_text).order_by(MessageLog.id))).scalars().all()
+
+    assert texts == ["message 2", "message 3", "message 4"]
+    assert sink.stats()["dropped"] == 2
@@ -0,0 +1,48 @@
+import asyncio
+import time
+import pytest
+
+from app.utils.loop_lag import LoopLagMonitor
+
+def block_the_loop(seconds: float) -> None:
+    """Block the event loop like a synchronous call in a handler."""
+    time.sleep(seconds)
+
+@pytest.mark.asyncio
+async def test_watchdog_samples_the_stack_of_blocking_code():
+    """Test that a stall longer than the threshold is counted with the stack of the blocking code."""
+    monitor = LoopLagMonitor(interval=0.01, block_threshold=0.05)
+    await monitor.start()
+    await asyncio.sleep(0.05)
+
+    block_the_loop(0.3)
+    await asyncio.sleep(0.05)
+
+    stats = monitor.stats()
+    await monitor.stop()
+
+    assert stats["stalls"] == 1
+    assert stats["max_lag_ms"] >= 250
+    assert stats["lag_percentiles_ms"]["p99"] is not None
+
+    sample = stats["stack_samples"][0]
+    assert sample["lag_ms"] >= 250
+    assert "block_the_loop" in sample["stack"][-1]
+
+@pytest.mark.asyncio
+async def test_short_pauses_are_not_stalls_and_debug_mode_is_restored():
+    """Test that pauses under the threshold are not sampled and that debug mode is switched off on stop."""
+    loop = asyncio.get_running_loop()
+    monitor = LoopLagMonitor(interval=0.01, block_threshold=0.2, debug=True)
+    await monitor.start()
+
+    assert loop.get_debug()
+    assert loop.slow_callback_duration == 0.2
+
+    block_the_loop(0.03)
+    await asyncio.sleep(0.05)
+    await monitor.stop()
+
+    assert monitor.stats()["stalls"] == 0
+    assert monitor.stats()["stack_samples"] == []
+    assert not loop.get_debug()
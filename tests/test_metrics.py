@@ -0,0 +1,87 @@
+import json
+import os
+import time
+import pytest
+
+from app.utils.metrics import MetricsRegistry
+
+def make_registry(directory: str = "") -> MetricsRegistry:
+    """
+    Create a registry with one metric of each type.
+
+    Args:
+        directory: Directory shared by the workers.
+
+    Returns:
+        MetricsRegistry: Registry with the metrics `events`, `in_flight` and `duration`.
+    """
+    registry = MetricsRegistry(directory=directory, write_interval=1)
+    registry.counter("events", "Events", ["outcome"])
+    registry.gauge("in_flight", "Events in flight")
+    registry.histogram("duration", "Duration", ["stage"], buckets=(0.1, 1.0))
+    return registry
+
+def test_histogram_buckets_are_cumulative():
+    """Test that histograms are rendered with cumulative buckets, sum and count."""
+    registry = make_registry()
+    duration = registry._metrics["duration"]
+
+    for value in (0.05, 0.1, 0.5, 5):
+        duration.observe(value, stage="parse")
+
+    lines = registry.render().splitlines()
+
+    assert 'duration_bucket{stage="parse",le="0.1"} 2' in lines
+    assert 'duration_bucket{stage="parse",le="1.0"} 3' in lines
+    assert 'duration_bucket{stage="parse",le="+Inf"} 4' in lines
+    assert 'duration_sum{stage="parse"} 5.65' in lines
+    assert 'duration_count{stage="parse"} 4' in lines
+
+def test_labels_must_match_the_label_names():
+    """Test that samples with missing or unknown labels are rejected."""
+    registry = make_registry()
+
+    with pytest.raises(ValueError):
+        registry._metrics["events"].inc(status="success")
+
+def test_workers_are_aggregated(tmp_path):
+    """Test that counters and histograms are summed over all workers, gauges over running ones."""
+    directory = str(tmp_path)
+    workers = [make_registry(directory), make_registry(directory)]
+
+    for worker in workers:
+        worker._metrics["events"].inc(outcome="success")
+        worker._metrics["in_flight"].set(2)
+        worker._metrics["duration"].observe(0.5, stage="makkaizou")
+
+    # Snapshot of another worker, written by a process with a different PID
+    snapshot_path = os.path.join(directory, "1.json")
+    workers[1].write_snapshot()
+    os.replace(os.path.join(directory, f"{os.getpid()}.json"), snapshot_path)
+
+    lines = workers[0].render().splitlines()
+    assert 'events{outcome="success"} 2.0' in lines
+    assert "in_flight 4.0" in lines
+    assert 'duration_count{stage="makkaizou"} 2' in lines
+
+    # The other worker stopped writing snapshots
+    stale = time.time() - 60
+    os.utime(snapshot_path, (stale, stale))
+
+    lines = workers[0].render().splitlines()
+    assert 'events{outcome="success"} 2.0' in lines
+    assert "in_flight 2.0" in lines
+
+@pytest.mark.asyncio
+async def test_stop_writes_a_last_snapshot(tmp_path):
+    """Test that the snapshot written in the background on stop holds the latest counts."""
+    registry = make_registry(str(tmp_path))
+    await registry.start()
+
+    registry._metrics["events"].inc(outcome="success")
+    await registry.stop()
+
+    with open(tmp_path / f"{os.getpid()}.json") as file:
+        snapshot = json.load(file)
+
+    assert snapshot == registry.snapshot()
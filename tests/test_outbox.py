@@ -0,0 +1,190 @@
+import asyncio
+import time
+import pytest
+from datetime import datetime, timezone
+from sqlalchemy import select
+
+from app.database.models import OutboxMessage
+from app.services.outbox import FAILED, PENDING, SENT, UNCERTAIN_REPLY, OutboxSender
+
+@pytest.fixture
+def sender(session_factory) -> OutboxSender:
+    """Outbox sender without rate limiting or retry delays, giving up after 2 attempts."""
+    return OutboxSender(
+        session_factory=session_factory,
+        batch_size=10,
+        max_concurrency=2,
+        rate_limit=1000,
+        rate_burst=1000,
+        poll_interval=0.05,
+        lease_seconds=60,
+        max_attempts=2,
+        retry_delay=0,
+        retention_seconds=60
+    )
+
+async def add_messages(session_factory, count: int) -> None:
+    """
+    Add due messages `answer 0` to `answer <count - 1>` to the outbox.
+
+    Args:
+        session_factory: Async session factory.
+        count: Number of messages.
+    """
+    async with session_factory() as db:
+        for index in range(count):
+            db.add(OutboxMessage(
+                line_group_id="G1",
+                message=f"answer {index}",
+                retry_key=f"key-{index}",
+                status=PENDING,
+                attempts=0,
+                next_attempt_at=datetime.now(timezone.utc)
+            ))
+        await db.commit()
+
+async def load_messages(session_factory):
+    """
+    Load all outbox messages.
+
+    Args:
+        session_factory: Async session factory.
+
+    Returns:
+        List[OutboxMessage]: Messages ordered by ID.
+    """
+    async with session_factory() as db:
+        result = await db.execute(select(OutboxMessage).order_by(OutboxMessage.id))
+        return list(result.scalars().all())
+
+@pytest.mark.asyncio
+async def test_claimed_messages_are_leased(session_factory, sender):
+    """Test that a claimed message is not claimed again while its lease lasts."""
+    await add_messages(session_factory, 3)
+
+    async with session_factory() as db:
+        first = await sender._claim(db, 2)
+        second = await sender._claim(db, 2)
+        third = await sender._claim(db, 2)
+
+    assert [message.message for message in first] == ["answer 0", "answer 1"]
+    assert [message.message for message in second] == ["answer 2"]
+    assert third == []
+
+@pytest.mark.asyncio
+async def test_concurrent_claims_are_disjoint(session_factory, sender):
+    """Test that two workers claiming at the same time never claim the same message."""
+    await add_messages(session_factory, 10)
+
+    async def claim():
+        async with session_factory() as db:
+            return [message.id for message in await sender._claim(db, 10)]
+
+    claims = await asyncio.gather(*[claim() for _ in range(4)], return_exceptions=True)
+    claimed = [message_id for result in claims if isinstance(result, list) for message_id in result]
+
+    assert sorted(claimed) == sorted(set(claimed))
+    assert len(claimed) == 10
+
+@pytest.mark.asyncio
+async def test_slow_message_does_not_hold_up_the_others(session_factory, sender, monkeypatch):
+    """Test that a free send slot is filled while another message is still being sent."""
+    released = asyncio.Event()
+    delivered = []
+
+    async def deliver(db, outbox_message):
+        if outbox_message.message == "answer 0":
+            await released.wait()
+        delivered.append(outbox_message.message)
+        return {"status": "success", "method": "reply"}
+
+    monkeypatch.setattr(sender, "_deliver", deliver)
+    await add_messages(session_factory, 4)
+    await sender.start()
+
+    for _ in range(100):
+        if len(delivered) == 3 and sender.stats()["in_flight"] == 1:
+            break
+        await asyncio.sleep(0.01)
+
+    assert delivered == ["answer 1", "answer 2", "answer 3"]
+    assert sender.stats()["in_flight"] == 1
+
+    released.set()
+    await sender.stop(timeout=5)
+
+    assert [message.status for message in await load_messages(session_factory)] == [SENT] * 4
+
+@pytest.mark.asyncio
+async def test_lease_is_renewed_while_sending(session_factory, sender, monkeypatch):
+    """Test that a message sent for longer than its lease is not claimed by another worker."""
+    sender.lease_seconds = 0.3
+
+    async def deliver(db, outbox_message):
+        await asyncio.sleep(0.6)
+        return {"status": "success", "method": "reply"}
+
+    monkeypatch.setattr(sender, "_deliver", deliver)
+    await add_messages(session_factory, 1)
+    await sender.start()
+
+    await asyncio.sleep(0.45)
+    async with session_factory() as db:
+        assert await sender._claim(db, 10) == []
+
+    await sender.stop(timeout=5)
+
+    outbox_message, = await load_messages(session_factory)
+    assert (outbox_message.status, outbox_message.attempts) == (SENT, 1)
+    assert sender.stats()["lease_renewals"] >= 1
+
+@pytest.mark.asyncio
+async def test_sender_delivers_and_retries(session_factory, sender, monkeypatch):
+    """Test that the sender marks delivered messages as sent and gives up after the attempts."""
+    delivered = []
+
+    async def deliver(db, outbox_message):
+        delivered.append(outbox_message.message)
+        if outbox_message.message == "bad":
+            return {"status": "error", "error": "LINE is down"}
+        return {"status": "success", "method": "reply"}
+
+    monkeypatch.setattr(sender, "_deliver", deliver)
+    await sender.start()
+
+    async with session_factory() as db:
+        await sender.enqueue(db, None, "G1", "token-1", time.time() + 60, "good")
+        await sender.enqueue(db, None, "G1", "token-2", time.time() + 60, "bad")
+
+    await sender.stop(timeout=5)
+
+    good, bad = await load_messages(session_factory)
+    assert (good.status, good.attempts, good.delivery_method) == (SENT, 1, "reply")
+    assert (bad.status, bad.attempts, bad.last_error) == (FAILED, 2, "LINE is down")
+    assert sorted(delivered) == ["bad", "bad", "good"]
+    assert sender.stats()["retried"] == 1
+
+@pytest.mark.asyncio
+async def test_uncertain_reply_is_remembered_for_later_attempts(session_factory, sender):
+    """Test that a reply that may have been delivered keeps later attempts from pushing."""
+    async with session_factory() as db:
+        db.add(OutboxMessage(
+            line_group_id="G1",
+            message="answer",
+            retry_key="key-1",
+            status=PENDING,
+            attempts=0,
+            next_attempt_at=datetime.now(timezone.utc)
+        ))
+        await db.commit()
+
+    for result in (
+        {"status": "error", "error": "timed out", "uncertain": True, "method": "reply"},
+        {"status": "error", "error": "refused", "uncertain": False, "method": "reply"}
+    ):
+        outbox_message, = await load_messages(session_factory)
+        async with session_factory() as db:
+            await sender._record(db, outbox_message, result)
+
+    outbox_message, = await load_messages(session_factory)
+    assert outbox_message.delivery_method == UNCERTAIN_REPLY
@@ -0,0 +1,17 @@
+import pytest
+
+from app.utils.rate_limit import TokenBucket
+
+def test_bucket_allows_a_burst_up_to_its_capacity():
+    """Test that tokens run out after the burst."""
+    bucket = TokenBucket(rate=0.001, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+
+@pytest.mark.asyncio
+async def test_acquire_waits_for_the_next_token():
+    """Test that acquire waits for a token once the bucket is empty."""
+    bucket = TokenBucket(rate=100, capacity=1)
+
+    assert await bucket.acquire() == 0
+    assert await bucket.acquire() == pytest.approx(0.01, abs=0.005)
@@ -0,0 +1,68 @@
+import pytest
+
+from app.services.rate_limiter import CONFIG_SCOPE, GROUP_SCOPE, USER_SCOPE, RateLimit, RateLimiter
+
+def make_limiter(backend: str = "memory", user_burst: int = 2, group_burst: int = 3, config_rate: float = 0):
+    """
+    Create a rate limiter whose buckets do not refill during a test.
+
+    Args:
+        backend: "memory" or "database".
+        user_burst: Tokens per user.
+        group_burst: Tokens per group.
+        config_rate: Refill rate per Makkaizou configuration; 0 disables the limit.
+
+    Returns:
+        RateLimiter: Rate limiter.
+    """
+    return RateLimiter(
+        limits={
+            USER_SCOPE: RateLimit(0.001, user_burst),
+            GROUP_SCOPE: RateLimit(0.001, group_burst),
+            CONFIG_SCOPE: RateLimit(config_rate, 1)
+        },
+        backend=backend,
+        max_keys=100
+    )
+
+def keys(user_id: str, group_id: str = "G1") -> dict:
+    """Build the rate limit keys of a mention."""
+    return {USER_SCOPE: user_id, GROUP_SCOPE: group_id, CONFIG_SCOPE: "1"}
+
+@pytest.mark.asyncio
+async def test_users_are_limited_separately():
+    """Test that one user reaching their limit does not throttle another."""
+    limiter = make_limiter()
+
+    assert await limiter.acquire(None, keys("U1")) is None
+    assert await limiter.acquire(None, keys("U1")) is None
+    assert await limiter.acquire(None, keys("U1")) == USER_SCOPE
+    assert await limiter.acquire(None, keys("U2")) is None
+
+    stats = limiter.stats()
+    assert stats["throttled"][USER_SCOPE] == 1
+    assert CONFIG_SCOPE not in stats["throttled"]
+
+@pytest.mark.asyncio
+async def test_tokens_are_given_back_when_a_later_scope_throttles():
+    """Test that a throttled call does not use up the tokens of the narrower scopes."""
+    limiter = make_limiter(user_burst=2, group_burst=1)
+
+    assert await limiter.acquire(None, keys("U1")) is None
+    assert await limiter.acquire(None, keys("U1")) == GROUP_SCOPE
+    assert await limiter.acquire(None, keys("U1", group_id="G2")) is None
+
+@pytest.mark.asyncio
+async def test_database_buckets_are_shared_between_workers(session_factory):
+    """Test that limiters of different workers take tokens from the same buckets."""
+    workers = [make_limiter("database"), make_limiter("database")]
+
+    async with session_factory() as db:
+        results = [await workers[index % 2].acquire(db, keys("U1")) for index in range(3)]
+        assert results == [None, None, USER_SCOPE]
+
+        # The group has one token left for other users
+        assert await workers[0].acquire(db, keys("U2")) is None
+        assert await workers[1].acquire(db, keys("U3")) == GROUP_SCOPE
+
+    assert all(worker.stats()["errors"] == 0 for worker in workers)
@@ -0,0 +1,84 @@
+import asyncio
+import pytest
+
+from app.config import settings
+from app.services import makkaizou_service as makkaizou_service_module
+from app.services.makkaizou_service import MakkaizouService
+from app.services.response_cache import ResponseCache, normalize_prompt
+from app.utils.single_flight import SingleFlight
+
+def test_trivially_different_prompts_share_an_entry():
+    """Test that case, width, whitespace and trailing punctuation are ignored."""
+    assert normalize_prompt("@bot  What are the Opening hours?") == normalize_prompt("@bot what are the opening hours")
+    assert normalize_prompt("ＡＢＣ？") == "abc"
+    assert normalize_prompt("opening hours") != normalize_prompt("closing hours")
+
+def test_group_scope_keeps_answers_per_talk():
+    """Test that the group scope does not share answers between talks."""
+    group_cache = ResponseCache(max_size=10, ttl=60, scope="group")
+    global_cache = ResponseCache(max_size=10, ttl=60, scope="global")
+
+    for cache in (group_cache, global_cache):
+        cache.set("model", "talk-1", "hello", {"message": "hi"}, 800)
+
+    assert group_cache.get("model", "talk-2", "hello") is None
+    assert global_cache.get("model", "talk-2", "Hello!").response == {"message": "hi"}
+    assert global_cache.get("other-model", "talk-2", "hello") is None
+    assert global_cache.stats()["latency_saved_ms"] == 800
+
+@pytest.mark.asyncio
+async def test_cache_hit_skips_the_request(monkeypatch, makkaizou_api):
+    """Test that a repeated prompt is answered without calling Makkaizou."""
+    requests = makkaizou_api({"message": "We open at 9."})
+
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(settings, "MAKKAIZOU_BREAKER_ENABLED", False)
+    monkeypatch.setattr(makkaizou_service_module, "response_cache", ResponseCache(max_size=10, ttl=60, scope="group"))
+
+    service = MakkaizouService(None)
+    service.api_url = "https://makkaizou.test/"
+
+    first = await service.process_prompt("talk-1", "@bot Opening hours?")
+    second = await service.process_prompt("talk-1", "@bot opening hours")
+
+    assert len(requests) == 1
+    assert "cache_hit" not in first
+    assert second["cache_hit"] is True
+    assert second["response"] == {"message": "We open at 9."}
+
+@pytest.mark.asyncio
+async def test_single_flight_only_shares_concurrent_prompts(monkeypatch, makkaizou_api):
+    """Test that identical prompts share a request only while it is in flight by default."""
+    requests = makkaizou_api({"message": "We open at 9."})
+
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "SINGLE_FLIGHT_ENABLED", True)
+    monkeypatch.setattr(settings, "MAKKAIZOU_BREAKER_ENABLED", False)
+    monkeypatch.setattr(
+        makkaizou_service_module,
+        "prompt_flights",
+        SingleFlight(grace_seconds=settings.SINGLE_FLIGHT_GRACE_SECONDS)
+    )
+
+    service = MakkaizouService(None)
+    service.api_url = "https://makkaizou.test/"
+
+    # The mocked API answers without suspending, so keep the request in flight for a moment
+    request_prompt = service._request_prompt
+
+    async def slow_request_prompt(*args):
+        await asyncio.sleep(0.01)
+        return await request_prompt(*args)
+
+    monkeypatch.setattr(service, "_request_prompt", slow_request_prompt)
+
+    first, second = await asyncio.gather(
+        service.process_prompt("talk-1", "@bot Opening hours?"),
+        service.process_prompt("talk-1", "@bot opening hours")
+    )
+    third = await service.process_prompt("talk-1", "@bot opening hours")
+
+    assert len(requests) == 2
+    assert "coalesced" not in first
+    assert second["coalesced"] is True
+    assert "coalesced" not in third
@@ -0,0 +1,113 @@
+import time
+import httpx
+import pytest
+
+from app.services.retry import RetryBudget, RetryPolicy, is_retryable_error
+
+def make_policy(max_attempts: int = 3, budget: RetryBudget = None) -> RetryPolicy:
+    """
+    Create a retry policy without backoff delays for testing.
+
+    Args:
+        max_attempts: Maximum number of attempts.
+        budget: Retry budget, or None for an ample one.
+
+    Returns:
+        RetryPolicy: Retry policy.
+    """
+    budget = budget or RetryBudget(ratio=1.0, min_retries=100, window_seconds=60)
+    return RetryPolicy("test", max_attempts=max_attempts, base_delay=0, max_delay=0, budget=budget)
+
+def status_error(status_code: int) -> httpx.HTTPStatusError:
+    """
+    Create an HTTP status error.
+
+    Args:
+        status_code: Response status code.
+
+    Returns:
+        httpx.HTTPStatusError: The error.
+    """
+    request = httpx.Request("POST", "https://api.test/")
+    return httpx.HTTPStatusError("error", request=request, response=httpx.Response(status_code, request=request))
+
+def failing(errors):
+    """
+    Create an attempt function raising the given errors before succeeding.
+
+    Args:
+        errors: Errors raised by the first attempts.
+
+    Returns:
+        Callable: Coroutine function, with the number of calls in its `calls` list.
+    """
+    calls = []
+
+    async def attempt():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    attempt.calls = calls
+    return attempt
+
+def test_non_idempotent_requests_retry_only_unprocessed_failures():
+    """Test that possibly processed failures are only retried for idempotent requests."""
+    assert is_retryable_error(httpx.ConnectError("refused"), idempotent=False)
+    assert is_retryable_error(status_error(503), idempotent=False)
+    assert not is_retryable_error(status_error(500), idempotent=False)
+    assert not is_retryable_error(httpx.ReadTimeout("slow"), idempotent=False)
+
+    assert is_retryable_error(status_error(500), idempotent=True)
+    assert is_retryable_error(httpx.ReadTimeout("slow"), idempotent=True)
+    assert not is_retryable_error(status_error(400), idempotent=True)
+
+@pytest.mark.asyncio
+async def test_retryable_failures_are_retried():
+    """Test that a call succeeds after retryable failures."""
+    policy = make_policy()
+    attempt = failing([status_error(503), httpx.ConnectError("refused")])
+
+    assert await policy.run(attempt, idempotent=False) == "ok"
+    assert len(attempt.calls) == 3
+    assert policy.stats()["recovered"] == 1
+
+@pytest.mark.asyncio
+async def test_attempts_are_bounded():
+    """Test that the last error is raised once the attempts are used up."""
+    policy = make_policy(max_attempts=2)
+    attempt = failing([status_error(503)] * 5)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        await policy.run(attempt, idempotent=True)
+
+    assert len(attempt.calls) == 2
+
+@pytest.mark.asyncio
+async def test_budget_stops_retry_storms():
+    """Test that retries stop once the shared budget is spent."""
+    budget = RetryBudget(ratio=0.0, min_retries=1, window_seconds=60)
+    policy = make_policy(budget=budget)
+
+    with pytest.raises(httpx.ConnectError):
+        await policy.run(failing([httpx.ConnectError("refused")] * 5), idempotent=True)
+
+    attempt = failing([httpx.ConnectError("refused")])
+    with pytest.raises(httpx.ConnectError):
+        await policy.run(attempt, idempotent=True)
+
+    assert len(attempt.calls) == 1
+    assert budget.stats()["exhausted"] == 2
+
+@pytest.mark.asyncio
+async def test_no_retry_after_the_deadline():
+    """Test that no retry is started once the reply token has expired."""
+    policy = make_policy()
+    attempt = failing([httpx.ConnectError("refused")])
+
+    with pytest.raises(httpx.ConnectError):
+        await policy.run(attempt, idempotent=True, deadline=time.time() - 1)
+
+    assert len(attempt.calls) == 1
+    assert policy.stats()["deadline_exceeded"] == 1
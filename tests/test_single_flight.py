@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+
+from app.utils.single_flight import SingleFlight
+
+def make_call(results, delay: float = 0.01):
+    """
+    Create a call returning the next result after a delay.
+
+    Args:
+        results: Results to return, or exceptions to raise, in order.
+        delay: Seconds the call takes.
+
+    Returns:
+        Callable: Coroutine function, with the number of calls in its `calls` list.
+    """
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(delay)
+        result = results[len(calls) - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    call.calls = calls
+    return call
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_flight():
+    """Test that concurrent callers of a key wait for the first call."""
+    flights = SingleFlight()
+    call = make_call(["answer"])
+
+    results = await asyncio.gather(*[flights.run("key", call) for _ in range(3)])
+
+    assert results == [("answer", False), ("answer", True), ("answer", True)]
+    assert len(call.calls) == 1
+    assert flights.stats()["coalesced"] == 2
+
+@pytest.mark.asyncio
+async def test_errors_are_shared_but_not_kept():
+    """Test that waiting callers get the error and later callers try again."""
+    flights = SingleFlight(grace_seconds=60)
+    call = make_call([ValueError("down"), "answer"])
+
+    results = await asyncio.gather(*[flights.run("key", call) for _ in range(2)], return_exceptions=True)
+
+    assert all(isinstance(result, ValueError) for result in results)
+    assert await flights.run("key", call) == ("answer", False)
+
+@pytest.mark.asyncio
+async def test_results_are_reused_within_the_grace_period():
+    """Test that reusable results are shared with callers arriving after the call."""
+    flights = SingleFlight(grace_seconds=60, is_reusable=lambda result: result != "partial")
+    call = make_call(["partial", "answer", "unused"])
+
+    assert await flights.run("key", call) == ("partial", False)
+    assert await flights.run("key", call) == ("answer", False)
+    assert await flights.run("key", call) == ("answer", True)
+    assert flights.stats()["reused"] == 1
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_when_the_leader_is_cancelled():
+    """Test that a waiting caller runs the call itself if the first caller is cancelled."""
+    flights = SingleFlight()
+    call = make_call(["first", "second"], delay=0.05)
+
+    leader = asyncio.create_task(flights.run("key", call))
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(flights.run("key", call))
+    await asyncio.sleep(0.01)
+    leader.cancel()
+
+    assert await waiter == ("second", False)
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import pytest
+from sqlalchemy import select
+
+from app.database.models import MessageLog
+from app.utils.logging import log_message
+from app.utils.tracing import NOOP_SPAN, STATUS_ERROR, JSONFileExporter, Tracer, tracer
+
+class ListExporter:
+    """Exporter keeping the exported spans in memory."""
+
+    def __init__(self):
+        self.spans = []
+
+    async def export(self, spans):
+        self.spans.extend(spans)
+
+    async def close(self):
+        pass
+
+def make_tracer(sample_rate: float = 1.0, exporter=None) -> Tracer:
+    """
+    Create an enabled tracer.
+
+    Args:
+        sample_rate: Fraction of traces exported.
+        exporter: Span exporter, a `ListExporter` if None.
+
+    Returns:
+        Tracer: The tracer.
+    """
+    return Tracer(
+        enabled=True,
+        sample_rate=sample_rate,
+        exporter=exporter or ListExporter(),
+        batch_size=100,
+        export_interval=60,
+        max_queue=100
+    )
+
+@pytest.mark.asyncio
+async def test_spans_follow_the_trace_across_scheduled_jobs():
+    """Test that nested and propagated spans share the trace of their root span."""
+    tracer = make_tracer()
+    jobs = asyncio.Queue()
+
+    async def lane():
+        # Like a scheduler lane, the task is created outside of the request
+        job = await jobs.get()
+        await job()
+
+    lane_task = asyncio.create_task(lane())
+
+    async def job():
+        with tracer.span("job"):
+            pass
+
+    with tracer.span("request") as root:
+        with tracer.span("parse") as child:
+            pass
+        await jobs.put(tracer.propagate(job))
+
+    await lane_task
+    await tracer.export()
+
+    spans = {span.name: span for span in tracer.exporter.spans}
+
+    assert spans["parse"].trace_id == root.trace_id
+    assert spans["parse"].parent_span_id == root.span_id
+    assert spans["job"].trace_id == root.trace_id
+    assert spans["job"].parent_span_id == root.span_id
+    assert spans["request"].parent_span_id is None
+    assert child.end_time_ns >= child.start_time_ns
+    assert tracer.current_trace_id() is None
+
+@pytest.mark.asyncio
+async def test_sampling_is_decided_per_trace():
+    """Test that unsampled traces and disabled tracing export nothing."""
+    unsampled = make_tracer(sample_rate=0.0)
+
+    with unsampled.span("request"):
+        with unsampled.span("parse"):
+            assert unsampled.current_trace_id() is not None
+
+    assert unsampled.stats()["traces"] == 1
+    assert unsampled.stats()["buffered_spans"] == 0
+
+    disabled = Tracer(False, 1.0, ListExporter(), 100, 60, 100)
+
+    with disabled.span("request") as span:
+        assert span is NOOP_SPAN
+        assert disabled.current_trace_id() is None
+
+@pytest.mark.asyncio
+async def test_file_exporter_writes_failed_spans_as_otlp(tmp_path):
+    """Test that spans are written as OTLP/JSON and exceptions mark them as failed."""
+    path = tmp_path / "traces.jsonl"
+    tracer = make_tracer(exporter=JSONFileExporter(str(path), "test-service"))
+
+    with pytest.raises(ValueError):
+        with tracer.span("makkaizou.request", status=503):
+            raise ValueError("unavailable")
+
+    await tracer.export()
+
+    request = json.loads(path.read_text().splitlines()[0])
+    resource_spans = request["resourceSpans"][0]
+    span = resource_spans["scopeSpans"][0]["spans"][0]
+
+    assert resource_spans["resource"]["attributes"][0]["value"] == {"stringValue": "test-service"}
+    assert span["name"] == "makkaizou.request"
+    assert len(span["traceId"]) == 32 and len(span["spanId"]) == 16
+    assert span["attributes"] == [{"key": "status", "value": {"intValue": "503"}}]
+    assert span["status"] == {"code": STATUS_ERROR, "message": "ValueError: unavailable"}
+
+@pytest.mark.asyncio
+async def test_message_log_records_the_trace_id(session_factory, monkeypatch):
+    """Test that logged messages carry the ID of the current trace only if it is exported."""
+    monkeypatch.setattr(tracer, "enabled", True)
+
+    async with session_factory() as db:
+        for sample_rate in (1.0, 0.0):
+            monkeypatch.setattr(tracer, "sample_rate", sample_rate)
+            with tracer.span("request"):
+                await log_message(db, None, "U1", "@bot hello", is_mention=True)
+
+        result = await db.execute(select(MessageLog).order_by(MessageLog.id))
+        sampled, unsampled = result.scalars().all()
+
+    assert sampled.trace_id is not None and len(sampled.trace_id) == 32
+    assert unsampled.trace_id is None
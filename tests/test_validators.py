@@ -0,0 +1,33 @@
+import pytest
+
+from app.utils.validators import is_mention_event, may_mention_self, parse_webhook_request
+from tests.conftest import BOT_MENTION
+
+USER_MENTION = [{"index": 0, "length": 6, "type": "user", "userId": "U2", "isSelf": False}]
+
+def test_plain_chat_is_skipped_without_parsing(webhook_event, webhook_body):
+    """Test that a body without any mentionee cannot mention the bot."""
+    assert not may_mention_self(webhook_body(webhook_event("hello everyone")))
+    assert may_mention_self(webhook_body(webhook_event("@bot hello", [BOT_MENTION])))
+
+@pytest.mark.parametrize("backend", ["orjson", "json", "pydantic"])
+def test_backends_parse_the_same_request(backend, webhook_event, webhook_body):
+    """Test that all JSON backends produce the same validated request."""
+    body = webhook_body(webhook_event("@bot hello", [BOT_MENTION]))
+
+    webhook_request = parse_webhook_request(body, backend)
+
+    assert webhook_request.model_dump() == parse_webhook_request(body, "json").model_dump()
+    assert is_mention_event(webhook_request.events[0])
+
+def test_invalid_body_raises_value_error():
+    """Test that malformed bodies raise a ValueError."""
+    with pytest.raises(ValueError):
+        parse_webhook_request(b'{"events": [')
+
+def test_mention_of_another_user_is_not_for_the_bot(webhook_event, webhook_body):
+    """Test that a body mentioning only other users passes the byte check but not the event filter."""
+    body = webhook_body(webhook_event("@alice hi", USER_MENTION))
+
+    assert may_mention_self(body)
+    assert not is_mention_event(parse_webhook_request(body).events[0])
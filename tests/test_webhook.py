@@ -37,43 +37,36 @@ def test_root():
     assert response.status_code == 200
     assert response.json() == {"status": "ok", "message": "Makkaizou-LINE Integration API"}
 
-def test_webhook_missing_signature():
+def test_webhook_missing_signature(webhook_event, webhook_body):
     """Test the webhook endpoint with missing signature."""
-    response = client.post("/webhook/line", json={})
+    response = client.post("/webhook", content=webhook_body(webhook_event()))
     assert response.status_code == 401
     assert "X-Line-Signature header is missing" in response.text
 
-def test_webhook_invalid_signature():
+def test_webhook_invalid_signature(webhook_event, webhook_body):
     """Test the webhook endpoint with invalid signature."""
-    body = json.dumps({"events": []}).encode('utf-8')
     response = client.post(
-        "/webhook/line",
+        "/webhook",
         headers={"X-Line-Signature": "invalid-signature"},
-        content=body
+        content=webhook_body(webhook_event())
     )
     assert response.status_code == 401
     assert "Invalid signature" in response.text
 
-def test_webhook_valid_signature():
+def test_webhook_valid_signature(webhook_event, webhook_body):
     """Test the webhook endpoint with valid signature."""
-    # Create a sample webhook event
-    webhook_event = {
-        "destination": "xxxxxxxxxx",
-        "events": []
-    }
-    
-    # Convert to JSON and then to bytes
-    body = json.dumps(webhook_event).encode('utf-8')
+    # Create a sample webhook request with one ordinary group message
+    body = webhook_body(webhook_event())
     
     # Generate a valid signature
     signature = generate_signature(body, settings.LINE_CHANNEL_SECRET)
     
     # Send the request
     response = client.post(
-        "/webhook/line",
+        "/webhook",
         headers={"X-Line-Signature": signature},
         content=body
     )
     
     # Check the response
-    assert response.status_code == 200 
\ No newline at end of file
+    assert response.status_code == 200
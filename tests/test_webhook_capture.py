@@ -0,0 +1,59 @@
+import json
+import pytest
+
+from app.utils.webhook_capture import Scrubber, WebhookRecorder, read_capture
+from tests.conftest import BOT_MENTION
+
+ALICE_MENTION = {"index": 5, "length": 6, "type": "user", "userId": "Ualice", "isSelf": False}
+
+def test_scrubber_removes_content_but_keeps_shape(webhook_event):
+    """Test that IDs and words are pseudonymized consistently while mentions of the bot are kept."""
+    scrubber = Scrubber("salt")
+    body = {"destination": "Ubot", "events": [webhook_event(
+        "@bot @alice call me at 090-1234-5678",
+        [BOT_MENTION, ALICE_MENTION],
+        group_id="C4af4980629",
+        user_id="U4af4980629"
+    )]}
+
+    event = scrubber.scrub(body)["events"][0]
+    again = scrubber.scrub(body)["events"][0]
+
+    assert event == again
+    assert event["source"]["userId"] != "U4af4980629"
+    assert event["source"]["userId"].startswith("U") and len(event["source"]["userId"]) == 11
+    assert event["source"]["groupId"].startswith("C")
+    assert event["replyToken"] != "reply-1"
+    assert event["timestamp"] == 1700000000000
+    assert event["deliveryContext"] == {"isRedelivery": False}
+
+    text = event["message"]["text"]
+    assert text.startswith("@bot ")
+    assert "alice" not in text and "090-1234-5678" not in text
+    assert [len(word) for word in text.split()] == [4, 6, 4, 2, 2, 13]
+    assert event["message"]["mention"]["mentionees"][0]["isSelf"] is True
+
+    assert Scrubber("other salt").scrub(body)["events"][0]["source"]["userId"] != event["source"]["userId"]
+
+@pytest.mark.asyncio
+async def test_recorder_appends_scrubbed_records(tmp_path, webhook_event, webhook_body):
+    """Test that recorded bodies are written on stop and read back, skipping invalid ones."""
+    path = str(tmp_path / "capture.jsonl.gz")
+
+    for texts in (["@bot hello"], ["@bot again", "not json"]):
+        recorder = WebhookRecorder(path, sample_rate=1.0, salt="salt", max_buffer=10, flush_interval=60)
+        await recorder.start()
+
+        for text in texts:
+            recorder.record(webhook_body(webhook_event(text, [BOT_MENTION])) if text != "not json" else b"not json")
+
+        await recorder.stop()
+
+    assert recorder.stats()["invalid"] == 1
+
+    records = list(read_capture(path))
+    texts = [record["body"]["events"][0]["message"]["text"] for record in records]
+
+    assert len(records) == 2
+    assert texts[0].startswith("@bot ") and "hello" not in texts[0]
+    assert records[0]["t"] <= records[1]["t"]